@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Exportação dos contornos do QLR sem QGIS (alternativa headless ao main.py)
+
+Lê o .qlr como XML (árvore de camadas e datasource de cada camada) e abre as
+fontes diretamente: camadas 'ogr' (shapefile, GeoPackage...) pelo pyogrio,
+sem geopandas, e camadas 'delimitedtext' com coluna WKT pelo pandas. A união
+das feições, a escolha da maior parte e a serialização em WKT são operações
+vetorizadas do shapely 2, e as camadas são lidas e unidas em paralelo
+(threads: leitura e GEOS liberam o GIL).
+
+Os contornos saem em GeoParquet (contornos.parquet: geometria WKB, coluna
+bbox, ana_code e smap_basin_id; ver contornos_geoparquet.py), lido direto pelo
+pesos_bacias.py. Com --formato wkt (ou ambos) também gera os arquivos do
+main.py: contornos_wkt_ec45.csv, contornos_wkt_outros.csv e
+contornos_wkt_outros.parquet. O exported_layers.txt é sempre gerado.
+
+Roda como módulo a partir da raiz do repositório (usa o contornos_geoparquet.py
+de lá); o bacias_codigos.json padrão é o desta pasta.
+
+Uso:
+    python -m CONTORNOS.export_headless --qlr CONTORNOS/Projeto_salvo2.qlr --grupo REMVIES --workers 8
+    python -m CONTORNOS.export_headless --formato ambos --geoparquet ./contornos.parquet --saida ./contornos_wkt.csv
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import parse_qs, unquote, urlparse
+import argparse
+import json
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from contornos_geoparquet import ATRIBUTOS, escrever_geoparquet
+
+
+PASTA_CONTORNOS = Path(__file__).resolve().parent
+
+
+class Camada(NamedTuple):
+    nome: str
+    bacia: str
+    provider: str
+    fonte: str
+
+
+def load_bacias_codigos(caminho="./bacias_codigos.json"):
+    """Dicionário {nome_bacia: {nome_item: {codigo, id}}} a partir do bacias_codigos.json"""
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            bacias_data = json.load(f)
+    except FileNotFoundError:
+        print("Arquivo bacias_codigos.json não encontrado")
+        bacias_data = {"bacias": []}
+
+    codigos_map = {}
+    for bacia in bacias_data.get("bacias", []):
+        bacia_nome = bacia.get("nome")
+        codigos_map[bacia_nome] = {}
+        for item in bacia.get("items", []):
+            item_nome = item.get("nome")
+            codigo = item.get("codigo")
+            item_id = item.get("id", "")
+            if item_nome and codigo:
+                codigos_map[bacia_nome][item_nome] = {"codigo": codigo, "id": item_id}
+    return codigos_map
+
+
+def parse_qlr(qlr_file):
+    """
+    Raiz da árvore de camadas e {id da camada: (nome, provider, datasource)} do .qlr
+    Caminhos relativos do datasource são resolvidos a partir da pasta do .qlr
+    """
+    raiz_xml = ET.parse(qlr_file).getroot()
+    base = Path(qlr_file).resolve().parent
+    fontes = {}
+    for maplayer in raiz_xml.iter("maplayer"):
+        camada_id = maplayer.findtext("id", "")
+        provider = maplayer.findtext("provider", "")
+        fonte = maplayer.findtext("datasource", "")
+        if provider == "ogr":
+            caminho, _, resto = fonte.partition("|")
+            if caminho and not Path(caminho).is_absolute():
+                caminho = str(base / caminho)
+            fonte = caminho + ("|" + resto if resto else "")
+        fontes[camada_id] = (maplayer.findtext("layername", ""), provider, fonte)
+    arvore = raiz_xml.find("layer-tree-group")
+    return (arvore if arvore is not None else raiz_xml), fontes, base
+
+
+def find_group(node, group_name):
+    """Primeiro grupo com o nome pedido (busca em profundidade), como QgsLayerTreeGroup.findGroup"""
+    for grupo in node.iter("layer-tree-group"):
+        if grupo is not node and grupo.get("name") == group_name:
+            return grupo
+    return None
+
+
+def walk_layers(node, fontes, bacia_nome="", base=Path(".")):
+    """Camadas do grupo, na ordem da árvore, com o nome do subgrupo (bacia) de cada uma"""
+    camadas = []
+    for child in node:
+        if child.tag == "layer-tree-layer":
+            nome, provider, fonte = fontes.get(child.get("id"), ("", child.get("providerKey", ""), ""))
+            if not fonte:
+                fonte = child.get("source", "")
+                if provider == "ogr" and fonte and not Path(fonte.split("|")[0]).is_absolute():
+                    fonte = str(base / fonte)
+            camadas.append(Camada(nome or child.get("name", ""), bacia_nome, provider, fonte))
+        elif child.tag == "layer-tree-group":
+            camadas.extend(walk_layers(child, fontes, child.get("name", ""), base))
+    return camadas
+
+
+def read_ogr(fonte):
+    """Geometrias de uma fonte ogr ('caminho|layername=x|subset=...') pelo pyogrio, sem geopandas"""
+    try:
+        from pyogrio.raw import read
+    except ImportError as e:
+        raise ImportError("camadas 'ogr' precisam do pyogrio (pip install pyogrio)") from e
+    caminho, *opcoes = fonte.split("|")
+    opcoes = dict(o.split("=", 1) for o in opcoes if "=" in o)
+    _, _, wkb, _ = read(caminho, layer=opcoes.get("layername") or opcoes.get("layerid"),
+                        where=opcoes.get("subset"), columns=[])
+    return shapely.from_wkb(wkb)
+
+
+def read_delimitedtext(fonte):
+    """Geometrias de uma camada 'delimitedtext' com coluna WKT (file:///x.csv?delimiter=;&wktField=geometry)"""
+    url = urlparse(fonte)
+    opcoes = {k: v[0] for k, v in parse_qs(url.query).items()}
+    if "wktField" not in opcoes:
+        raise ValueError("camada delimitedtext sem wktField")
+    separador = unquote(opcoes.get("delimiter", ","))
+    separador = {"\\t": "\t", "tab": "\t"}.get(separador, separador)
+    tabela = pd.read_csv(unquote(url.path), sep=separador, usecols=[opcoes["wktField"]], dtype=str)
+    return shapely.from_wkt(tabela[opcoes["wktField"]].dropna().to_numpy())
+
+
+LEITORES = {
+    "ogr": read_ogr,
+    "delimitedtext": read_delimitedtext,
+}
+
+
+def layer_union(camada):
+    """União de todas as feições da camada (None se a camada não tem geometria ou não é legível)"""
+    leitor = LEITORES.get(camada.provider)
+    if leitor is None:
+        print(f"Camada '{camada.nome}': provider '{camada.provider}' não suportado sem QGIS")
+        return None
+    try:
+        geoms = leitor(camada.fonte)
+    except Exception as e:
+        print(f"Camada '{camada.nome}': erro ao ler {camada.fonte}: {e}")
+        return None
+    geoms = geoms[~shapely.is_missing(geoms) & ~shapely.is_empty(geoms)]
+    if len(geoms) == 0:
+        return None
+    if len(geoms) == 1:
+        return geoms[0]
+    return shapely.union_all(geoms)
+
+
+def largest_parts(geoms):
+    """
+    Para cada geometria poligonal com várias partes, a parte de maior área (vetorizado)
+    Equivale ao to_single_polygon do main.py; outras geometrias passam inalteradas
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    resultado = geoms.copy()
+    presentes = ~shapely.is_missing(geoms)
+    poligonais = presentes & np.isin(shapely.get_type_id(np.where(presentes, geoms, None)), [3, 6])
+    indices = np.flatnonzero(poligonais)
+    if not len(indices):
+        return resultado
+    partes, origem = shapely.get_parts(geoms[indices], return_index=True)
+    areas = shapely.area(partes)
+    # Ordena por geometria de origem e área decrescente; a primeira de cada origem é a maior
+    ordem = np.lexsort((-areas, origem))
+    primeira = np.ones(len(ordem), dtype=bool)
+    primeira[1:] = origem[ordem][1:] != origem[ordem][:-1]
+    escolhidas = ordem[primeira]
+    resultado[indices[origem[escolhidas]]] = partes[escolhidas]
+    return resultado
+
+
+def group_contornos(camadas, codigos_map, workers=4):
+    """Atributos (basin_name, grupo, ana_code, smap_basin_id) e geometria final de cada camada"""
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        unioes = list(pool.map(layer_union, camadas))
+
+    linhas = []
+    for camada in camadas:
+        info = codigos_map.get(camada.bacia, {}).get(camada.nome, {}) if camada.bacia else {}
+        if isinstance(info, dict):
+            codigo, item_id = info.get("codigo", ""), info.get("id", "")
+        else:
+            codigo, item_id = info, ""
+        linhas.append({"basin_name": camada.nome, "grupo": camada.bacia,
+                       "ana_code": str(codigo), "smap_basin_id": str(item_id)})
+    atributos = pd.DataFrame(linhas, columns=list(ATRIBUTOS))
+    return atributos, largest_parts(np.array(unioes, dtype=object))
+
+
+def export_group_contornos_wkt(atributos, geoms, output_file="./contornos_wkt.csv"):
+    """Mesmos CSVs WKT do export_group_contornos_wkt do main.py (e o Parquet WKT dos outros)"""
+    wkts = np.full(len(geoms), "", dtype=object)
+    presentes = ~shapely.is_missing(geoms)
+    wkts[presentes] = shapely.to_wkt(geoms[presentes], rounding_precision=-1)
+
+    rows_ec45 = ["basin_name;ana_code;smap_basin_id;geometry"]
+    rows_outros = ["basin_name;ana_code;smap_basin_id;geometry"]
+    for nome, codigo, item_id, wkt in zip(atributos["basin_name"], atributos["ana_code"],
+                                          atributos["smap_basin_id"], wkts):
+        # Separar por nome começando com EC45-
+        if nome.startswith("EC45-"):
+            rows_ec45.append(f"{nome};{item_id};{wkt}")
+        else:
+            rows_outros.append(f"{nome};{codigo};{item_id};{wkt}")
+
+    ec45_file = output_file.replace(".csv", "_ec45.csv")
+    with open(ec45_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(rows_ec45))
+    print(f"Arquivo WKT EC45 salvo em {ec45_file}")
+
+    outros_file = output_file.replace(".csv", "_outros.csv")
+    with open(outros_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(rows_outros))
+    print(f"Arquivo WKT outros salvo em {outros_file}")
+
+    # Parquet WKT direto da memória, sem reler o CSV
+    outros = ~atributos["basin_name"].str.startswith("EC45-").to_numpy()
+    pd.DataFrame({
+        "basin_name": atributos["basin_name"][outros],
+        # Códigos como texto ("PSATFGOM"...); só o smap_basin_id é numérico
+        "ana_code": atributos["ana_code"][outros].replace("", None),
+        "smap_basin_id": pd.to_numeric(atributos["smap_basin_id"][outros], errors="coerce"),
+        "geometry": np.where(wkts[outros] == "", None, wkts[outros]),
+    }).to_parquet(outros_file.replace(".csv", ".parquet"), index=False)
+
+
+def group_listing(raiz, group_name, codigos_map, fontes):
+    """Linhas de print_root_groups e print_group_layers do main.py"""
+    linhas = []
+    grupos = [c.get("name", "") for c in raiz if c.tag == "layer-tree-group"]
+    if grupos:
+        linhas.append("Grupos no root:")
+        linhas.extend(f"- {g}" for g in grupos)
+    else:
+        linhas.append("Nenhum grupo encontrado em root.")
+
+    grupo = find_group(raiz, group_name)
+    if grupo is None:
+        linhas.append(f"Grupo '{group_name}' não encontrado.")
+        return linhas
+    linhas.append(f"Layers no grupo '{group_name}':")
+
+    def walk(node, indent="", bacia_nome=""):
+        for child in node:
+            if child.tag == "layer-tree-layer":
+                name = fontes.get(child.get("id"), (child.get("name", ""),))[0] or child.get("name", "")
+                info = codigos_map.get(bacia_nome, {}).get(name, {}) if bacia_nome else {}
+                codigo = info.get("codigo", "") if isinstance(info, dict) else info
+                linhas.append(f"{indent}- {name}\t{codigo}" if codigo else f"{indent}- {name}")
+            elif child.tag == "layer-tree-group":
+                linhas.append(f"{indent}[{child.get('name', '')}]")
+                walk(child, indent + "  ", child.get("name", ""))
+    walk(grupo)
+    return linhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta os contornos de um grupo do QLR em WKT, sem QGIS")
+    parser.add_argument("--qlr", default=os.environ.get("QLR_FILE", "./Projeto_salvo2.qlr"))
+    parser.add_argument("--grupo", default="REMVIES")
+    parser.add_argument("--codigos", default=str(PASTA_CONTORNOS / "bacias_codigos.json"))
+    parser.add_argument("--formato", choices=["geoparquet", "wkt", "ambos"], default="geoparquet",
+                        help="GeoParquet (WKB), os CSVs WKT do main.py ou os dois")
+    parser.add_argument("--geoparquet", default="./contornos.parquet")
+    parser.add_argument("--saida", default="./contornos_wkt.csv", help="Base dos CSVs WKT")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Camadas processadas em paralelo")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.qlr):
+        raise FileNotFoundError(f"QLR file not found: {args.qlr}")
+
+    codigos_map = load_bacias_codigos(args.codigos)
+    raiz, fontes, base = parse_qlr(args.qlr)
+    outputs = group_listing(raiz, args.grupo, codigos_map, fontes)
+    print("\n".join(outputs))
+
+    grupo = find_group(raiz, args.grupo)
+    if grupo is None:
+        print(f"Grupo '{args.grupo}' não encontrado para exportação.")
+        return
+    camadas = walk_layers(grupo, fontes, base=base)
+    atributos, geoms = group_contornos(camadas, codigos_map, args.workers)
+    if args.formato in ("geoparquet", "ambos"):
+        escrever_geoparquet(Path(args.geoparquet), atributos, geoms)
+        print(f"GeoParquet salvo em {args.geoparquet}")
+    if args.formato in ("wkt", "ambos"):
+        export_group_contornos_wkt(atributos, geoms, args.saida)
+
+    export_file = "./exported_layers.txt"
+    with open(export_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(outputs))
+    print(f"Resultado salvo em {export_file}")
+
+
+if __name__ == "__main__":
+    main()
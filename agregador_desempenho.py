@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""Desempenho TOK × ONS acumulado por estação e lead, atualizado a cada comparação.
+
+Cada comparação é dobrada em estatísticas suficientes por (estação, lead):
+contagem, médias de ONS e TOK, somas de quadrados dos desvios (M2) de cada
+fonte, co-momento e média de ``|TOK - ONS|``. As atualizações são as de
+Welford, na forma de combinação de dois grupos (Chan et al.), estáveis mesmo
+com anos de dados. Viés, MAE, RMSE e correlação saem dessas estatísticas,
+sem reler saídas antigas.
+
+As estatísticas ficam em blocos por dia de rodada, em um anel mapeado em
+memória de ``dias_max`` dias, mais um bloco com o total desde o início.
+Uma janela de N dias (30, 90, 365...) é a combinação dos blocos dos N dias
+até a data final. Só contam células em que as duas fontes têm valor. Os
+arquivos são criados esparsos (só as páginas dos dias gravados ocupam
+disco) e o eixo de leads é dimensionado pelos dados, crescendo quando uma
+rodada traz leads além dos atuais (arquivos regravados com um novo número
+de geração no nome, ``blocos.g<N>.f64``).
+
+Cada contribuição tem uma chave (por exemplo o rótulo do par) e uma
+impressão digital dos seus dados. Reacumular a mesma chave com os mesmos
+dados não faz nada; com dados diferentes, a contribuição anterior (guardada
+em ``contribuicoes/<dia>/``) é retirada do bloco e do total antes de a nova
+entrar. Quando o anel reaproveita a posição de um dia, as chaves e
+contribuições desse dia são descartadas; rodadas mais antigas que o dia que
+ocupa a sua posição no anel não são acumuladas. Gravações e leituras de
+vários processos são serializadas por um lock no diretório, como no
+``arquivo_historico``.
+
+Uso (relatório das janelas a partir do agregador):
+    python agregador_desempenho.py AGREGADOR --janelas 30 90 365 --saida desempenho.csv
+"""
+from pathlib import Path
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from escrita_saida import FORMATOS_SAIDA, escrever_atomico, escrever_tabela, nome_saida
+
+
+ARQUIVO_META = 'meta.json'
+PASTA_CONTRIBUICOES = 'contribuicoes'
+CAMPOS = ('n', 'media_ons', 'media_tok', 'm2_ons', 'm2_tok', 'comomento', 'media_abs')
+DIAS_MAX_PADRAO = 366
+JANELAS_PADRAO = (30, 90, 365)
+
+
+def estatisticas_lote(ons: np.ndarray, tok: np.ndarray) -> np.ndarray:
+    """Estatísticas suficientes de um lote ``(..., amostras)``; forma ``(..., len(CAMPOS))``.
+
+    Duas passadas (médias, depois desvios), só nas posições com as duas fontes.
+    Um array sem eixo de amostras (uma observação por célula) também é aceito.
+    """
+    ons = np.asarray(ons, dtype=np.float64)
+    tok = np.asarray(tok, dtype=np.float64)
+    if ons.ndim == 2:
+        ons, tok = ons[..., None], tok[..., None]
+    valido = ~np.isnan(ons) & ~np.isnan(tok)
+    n = valido.sum(axis=-1).astype(np.float64)
+    ons = np.where(valido, ons, 0)
+    tok = np.where(valido, tok, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media_ons = np.where(n > 0, ons.sum(axis=-1) / n, 0)
+        media_tok = np.where(n > 0, tok.sum(axis=-1) / n, 0)
+        media_abs = np.where(n > 0, np.abs(tok - ons).sum(axis=-1) / n, 0)
+    desvio_ons = np.where(valido, ons - media_ons[..., None], 0)
+    desvio_tok = np.where(valido, tok - media_tok[..., None], 0)
+    return np.stack([
+        n,
+        media_ons,
+        media_tok,
+        (desvio_ons ** 2).sum(axis=-1),
+        (desvio_tok ** 2).sum(axis=-1),
+        (desvio_ons * desvio_tok).sum(axis=-1),
+        media_abs,
+    ], axis=-1)
+
+
+def combinar(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Combina dois conjuntos de estatísticas (``(..., len(CAMPOS))``) como um único grupo."""
+    na, nb = a[..., 0], b[..., 0]
+    n = na + nb
+    with np.errstate(invalid='ignore', divide='ignore'):
+        peso = np.where(n > 0, nb / n, 0)
+        cruzado = np.where(n > 0, na * nb / n, 0)
+    delta_ons = b[..., 1] - a[..., 1]
+    delta_tok = b[..., 2] - a[..., 2]
+    return np.stack([
+        n,
+        a[..., 1] + delta_ons * peso,
+        a[..., 2] + delta_tok * peso,
+        a[..., 3] + b[..., 3] + delta_ons ** 2 * cruzado,
+        a[..., 4] + b[..., 4] + delta_tok ** 2 * cruzado,
+        a[..., 5] + b[..., 5] + delta_ons * delta_tok * cruzado,
+        a[..., 6] + (b[..., 6] - a[..., 6]) * peso,
+    ], axis=-1)
+
+
+def remover(c: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Inverso de ``combinar``: as estatísticas ``a`` tais que ``combinar(a, b) == c``."""
+    n, nb = c[..., 0], b[..., 0]
+    na = n - nb
+    restante = na > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media_ons = np.where(restante, (n * c[..., 1] - nb * b[..., 1]) / na, 0)
+        media_tok = np.where(restante, (n * c[..., 2] - nb * b[..., 2]) / na, 0)
+        media_abs = np.where(restante, (n * c[..., 6] - nb * b[..., 6]) / na, 0)
+        cruzado = np.where(restante, na * nb / n, 0)
+    delta_ons = b[..., 1] - media_ons
+    delta_tok = b[..., 2] - media_tok
+    return np.where(restante[..., None], np.stack([
+        na,
+        media_ons,
+        media_tok,
+        np.maximum(c[..., 3] - b[..., 3] - delta_ons ** 2 * cruzado, 0),
+        np.maximum(c[..., 4] - b[..., 4] - delta_tok ** 2 * cruzado, 0),
+        c[..., 5] - b[..., 5] - delta_ons * delta_tok * cruzado,
+        media_abs,
+    ], axis=-1), 0)
+
+
+def metricas(estatisticas: np.ndarray) -> dict:
+    """Viés (TOK - ONS), MAE, RMSE, correlação, médias e contagem a partir das estatísticas."""
+    n = estatisticas[..., 0]
+    media_ons, media_tok = estatisticas[..., 1], estatisticas[..., 2]
+    m2_ons, m2_tok, comomento = estatisticas[..., 3], estatisticas[..., 4], estatisticas[..., 5]
+    vies = media_tok - media_ons
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Σ(d - d̄)² = M2_tok + M2_ons - 2·C, e MSE = d̄² + Σ(d - d̄)²/n
+        var_dif = np.maximum(m2_ons + m2_tok - 2 * comomento, 0) / n
+        rmse = np.sqrt(vies ** 2 + var_dif)
+        correlacao = np.where((m2_ons > 0) & (m2_tok > 0), comomento / np.sqrt(m2_ons * m2_tok), np.nan)
+    vazio = n == 0
+    return {
+        'n': n.astype(np.int64),
+        'vies': np.where(vazio, np.nan, vies),
+        'mae': np.where(vazio, np.nan, estatisticas[..., 6]),
+        'rmse': np.where(vazio, np.nan, rmse),
+        'correlacao': correlacao,
+        'ONS_media': np.where(vazio, np.nan, media_ons),
+        'TOK_media': np.where(vazio, np.nan, media_tok),
+    }
+
+
+class AgregadorDesempenho:
+    """Estatísticas de desempenho por estação × lead em blocos diários e no total.
+
+    Abre o agregador em ``diretorio`` ou o cria com ``estacoes``. ``n_leads``
+    é só o tamanho inicial (em aberto, a primeira rodada o fixa) e
+    ``dias_max`` é a maior janela consultável. Em um agregador existente as
+    dimensões passadas são ignoradas.
+    """
+
+    def __init__(self, diretorio: Path, estacoes=None, n_leads: int | None = None,
+                 dias_max: int = DIAS_MAX_PADRAO):
+        self.diretorio = Path(diretorio)
+        meta = self._ler_meta()
+        if meta is None:
+            if estacoes is None:
+                raise ValueError(f"Agregador inexistente em {self.diretorio}; "
+                                 "informe estacoes para criá-lo")
+            self.diretorio.mkdir(parents=True, exist_ok=True)
+            with self._travado():
+                if self._ler_meta() is None:
+                    self._carregar({
+                        'versao': 1,
+                        'estacoes': [str(e) for e in estacoes],
+                        'n_leads': None,
+                        'dias_max': int(dias_max),
+                        'dias': [None] * int(dias_max),
+                        'chaves': {},
+                    })
+                    if n_leads:
+                        self._redimensionar(int(n_leads))
+                    else:
+                        self._gravar_meta(self._meta())
+                meta = self._ler_meta()
+        self._carregar(meta)
+
+    @property
+    def rodadas(self) -> pd.DatetimeIndex:
+        """Dias de rodada presentes no anel, em ordem."""
+        return pd.DatetimeIndex(sorted(pd.Timestamp(d) for d in self._dias if d is not None), name='rodada')
+
+    def acumular(self, rodada, estacoes, ons: np.ndarray, tok: np.ndarray, leads=None,
+                 chave: str | None = None) -> bool:
+        """Dobra uma comparação nos blocos da rodada e no total.
+
+        ``ons`` e ``tok`` têm forma ``(len(estacoes), len(leads))`` ou
+        ``(len(estacoes), len(leads), amostras)`` (membros, por exemplo), com
+        NaN onde não há valor. Estações fora do agregador são ignoradas;
+        ``leads`` padrão é ``0..n-1``. Com ``chave``, uma contribuição
+        anterior da mesma chave nesta rodada é substituída. Retorna False se
+        nada mudou: ``chave`` já acumulada com os mesmos dados, ou rodada
+        mais antiga que o dia que ocupa a sua posição no anel.
+        """
+        lote = estatisticas_lote(ons, tok)
+        leads = np.arange(lote.shape[1]) if leads is None else np.asarray(leads, dtype=np.int64)
+        posicoes = self._posicao.get_indexer(pd.Index(estacoes).astype(str)).astype(np.int64)
+        conhecidas = posicoes >= 0
+        posicoes, lote = posicoes[conhecidas], lote[conhecidas]
+        if len(leads) and leads.min() < 0:
+            raise ValueError(f"Leads negativos não cabem no agregador: {leads.min()}")
+        rodada = pd.Timestamp(rodada).normalize()
+        dia = rodada.strftime('%Y-%m-%d')
+        impressao = None if chave is None else _impressao(posicoes, leads, lote)
+
+        with self._travado():
+            self._carregar(self._ler_meta())
+            # O bloco do dia ocupa uma posição fixa do anel
+            slot = rodada.toordinal() % self.dias_max
+            ocupante = self._dias[slot]
+            if ocupante is not None and ocupante > dia:
+                return False
+            chaves = self._chaves.get(dia, {}) if ocupante == dia else {}
+            if chave is not None and chaves.get(chave) == impressao:
+                return False
+
+            n_leads = max(self.n_leads or 0, int(leads.max()) + 1 if len(leads) else 0)
+            if n_leads != self.n_leads:
+                self._redimensionar(n_leads)
+            total = self._abrir('total', 'r+')
+            blocos = self._abrir('blocos', 'r+')
+            if ocupante != dia:
+                if ocupante is not None:
+                    self._descartar_dia(ocupante)
+                blocos[slot] = 0
+                self._dias[slot] = dia
+            bloco = blocos[slot]
+
+            if chave in chaves:
+                antiga = self._ler_contribuicao(dia, chave)
+                celulas = (antiga['posicoes'][:, None], antiga['leads'][None, :])
+                total[celulas] = remover(total[celulas], antiga['lote'])
+                bloco[celulas] = remover(bloco[celulas], antiga['lote'])
+            celulas = (posicoes[:, None], leads[None, :])
+            total[celulas] = combinar(total[celulas], lote)
+            bloco[celulas] = combinar(bloco[celulas], lote)
+            total.flush()
+            blocos.flush()
+
+            if chave is not None:
+                self._gravar_contribuicao(dia, chave, posicoes, leads, lote)
+                chaves[chave] = impressao
+                self._chaves[dia] = chaves
+            self._gravar_meta(self._meta())
+        return True
+
+    def estatisticas(self, dias: int | None = None, fim=None) -> np.ndarray:
+        """Estatísticas ``(estacao, lead, campo)`` da janela de ``dias`` até ``fim`` (None: total).
+
+        ``fim`` padrão é a rodada mais recente; a janela cobre ``(fim - dias, fim]``.
+        """
+        with self._travado():
+            self._carregar(self._ler_meta())
+            vazio = np.zeros((len(self.estacoes), self.n_leads or 0, len(CAMPOS)))
+            if dias is None:
+                total = self._abrir('total', 'r')
+                return vazio if total is None else np.array(total)
+            if dias > self.dias_max:
+                raise ValueError(f"Janela de {dias} dias maior que a do agregador ({self.dias_max})")
+            rodadas = self.rodadas
+            fim = (rodadas.max() if len(rodadas) else pd.Timestamp.today()) if fim is None else pd.Timestamp(fim)
+            inicio = fim.normalize() - pd.Timedelta(days=dias)
+            blocos = self._abrir('blocos', 'r')
+            resultado = vazio
+            for slot, dia in enumerate(self._dias):
+                if dia is not None and inicio < pd.Timestamp(dia) <= fim:
+                    resultado = combinar(resultado, np.asarray(blocos[slot]))
+            return resultado
+
+    def desempenho(self, dias: int | None = None, fim=None) -> pd.DataFrame:
+        """Métricas por (estação, lead) da janela, só com células que têm dados."""
+        estatisticas = self.estatisticas(dias, fim)
+        indice = pd.MultiIndex.from_product([self.estacoes, np.arange(estatisticas.shape[1])],
+                                            names=['estacao', 'lead'])
+        tabela = pd.DataFrame({nome: valores.ravel()
+                               for nome, valores in metricas(estatisticas).items()}, index=indice)
+        return tabela[tabela['n'] > 0]
+
+    def relatorio(self, janelas=JANELAS_PADRAO, fim=None) -> pd.DataFrame:
+        """``desempenho`` de cada janela (e do total, janela vazia) em formato longo."""
+        partes = []
+        for dias in list(janelas) + [None]:
+            tabela = self.desempenho(dias, fim).reset_index()
+            tabela.insert(0, 'janela_dias', pd.array([dias] * len(tabela), dtype='Int64'))
+            partes.append(tabela)
+        return pd.concat(partes, ignore_index=True)
+
+    def _carregar(self, meta: dict) -> None:
+        self.estacoes = meta['estacoes']
+        self.n_leads = meta['n_leads']
+        self.dias_max = meta['dias_max']
+        self._geracao = meta.get('geracao', 0)
+        self._dias = meta['dias']
+        self._chaves = meta['chaves']
+        self._posicao = pd.Index(self.estacoes)
+
+    def _meta(self) -> dict:
+        return {
+            'versao': 1,
+            'estacoes': self.estacoes,
+            'n_leads': self.n_leads,
+            'dias_max': self.dias_max,
+            'geracao': self._geracao,
+            'dias': self._dias,
+            'chaves': self._chaves,
+        }
+
+    def _forma(self, nome: str) -> tuple:
+        forma = (len(self.estacoes), self.n_leads, len(CAMPOS))
+        return (self.dias_max,) + forma if nome == 'blocos' else forma
+
+    def _redimensionar(self, n_leads: int) -> None:
+        """Passa o eixo de leads para ``n_leads`` (chamado com o lock).
+
+        Os arquivos novos são esparsos e só recebem o total e os dias ocupados
+        do anel; o ``meta.json`` passa a apontar para eles antes de os antigos
+        serem apagados.
+        """
+        antigos = {nome: self._abrir(nome, 'r') for nome in ('total', 'blocos')}
+        geracao_antiga = self._geracao
+        self._geracao += 1
+        n_antigo = self.n_leads or 0
+        self.n_leads = n_leads
+        for nome, antigo in antigos.items():
+            forma = self._forma(nome)
+            with open(self._caminho(nome), 'wb') as f:
+                f.truncate(int(np.prod(forma)) * np.dtype(np.float64).itemsize)
+            if antigo is None:
+                continue
+            novo = np.memmap(self._caminho(nome), dtype=np.float64, mode='r+', shape=forma)
+            if nome == 'total':
+                novo[:, :n_antigo] = antigo
+            else:
+                for slot, dia in enumerate(self._dias):
+                    if dia is not None:
+                        novo[slot, :, :n_antigo] = antigo[slot]
+            novo.flush()
+            del novo
+        self._gravar_meta(self._meta())
+        for nome in antigos:
+            self._caminho(nome, geracao_antiga).unlink(missing_ok=True)
+
+    def _descartar_dia(self, dia: str) -> None:
+        """Esquece as chaves e contribuições de um dia que saiu do anel."""
+        self._chaves.pop(dia, None)
+        shutil.rmtree(self.diretorio / PASTA_CONTRIBUICOES / dia, ignore_errors=True)
+
+    def _caminho_contribuicao(self, dia: str, chave: str) -> Path:
+        nome = hashlib.blake2b(chave.encode('utf-8'), digest_size=8).hexdigest()
+        return self.diretorio / PASTA_CONTRIBUICOES / dia / f"{nome}.npz"
+
+    def _gravar_contribuicao(self, dia: str, chave: str, posicoes: np.ndarray, leads: np.ndarray,
+                             lote: np.ndarray) -> None:
+        caminho = self._caminho_contribuicao(dia, chave)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+
+        def escrever(tmp: Path) -> None:
+            with open(tmp, 'wb') as f:
+                np.savez(f, posicoes=posicoes, leads=leads, lote=lote)
+        escrever_atomico(caminho, escrever)
+
+    def _ler_contribuicao(self, dia: str, chave: str) -> dict:
+        with np.load(self._caminho_contribuicao(dia, chave)) as contribuicao:
+            return {nome: contribuicao[nome] for nome in ('posicoes', 'leads', 'lote')}
+
+    def _abrir(self, nome: str, modo: str) -> np.memmap | None:
+        if not self.n_leads:
+            return None
+        return np.memmap(self._caminho(nome), dtype=np.float64, mode=modo, shape=self._forma(nome))
+
+    def _caminho(self, nome: str, geracao: int | None = None) -> Path:
+        geracao = self._geracao if geracao is None else geracao
+        return self.diretorio / (f"{nome}.f64" if geracao == 0 else f"{nome}.g{geracao}.f64")
+
+    @contextlib.contextmanager
+    def _travado(self):
+        with open(self.diretorio / '.lock', 'a') as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def _ler_meta(self) -> dict | None:
+        try:
+            return json.loads((self.diretorio / ARQUIVO_META).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _gravar_meta(self, meta: dict) -> None:
+        escrever_atomico(self.diretorio / ARQUIVO_META,
+                         lambda tmp: tmp.write_text(json.dumps(meta), encoding='utf-8'))
+
+
+def _impressao(posicoes: np.ndarray, leads: np.ndarray, lote: np.ndarray) -> str:
+    """Impressão digital de uma contribuição (células e estatísticas)."""
+    h = hashlib.blake2b(digest_size=16)
+    for array in (posicoes, leads, lote):
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Relatório de desempenho por estação e lead a partir do agregador')
+    parser.add_argument('diretorio', help='Diretório do agregador')
+    parser.add_argument('--janelas', type=int, nargs='+', default=list(JANELAS_PADRAO), help='Janelas em dias')
+    parser.add_argument('--fim', default=None, help='Data final das janelas (padrão: rodada mais recente)')
+    parser.add_argument('--saida', default=None, help='Arquivo do relatório (padrão: só o resumo na tela)')
+    parser.add_argument('--output-format', choices=FORMATOS_SAIDA, default='csv')
+    args = parser.parse_args()
+
+    agregador = AgregadorDesempenho(args.diretorio)
+    rodadas = agregador.rodadas
+    if len(rodadas):
+        print(f"{len(rodadas)} rodada(s) no anel: {rodadas.min():%Y-%m-%d} a {rodadas.max():%Y-%m-%d}")
+    relatorio = agregador.relatorio(args.janelas, args.fim)
+    resumo = relatorio.groupby('janela_dias', dropna=False)[['n', 'vies', 'mae', 'rmse', 'correlacao']].agg(
+        {'n': 'sum', 'vies': 'mean', 'mae': 'mean', 'rmse': 'mean', 'correlacao': 'mean'})
+    print(resumo.round(3).to_string())
+    if args.saida:
+        saida = Path(args.saida)
+        saida = saida.with_name(nome_saida(saida.stem, args.output_format))
+        escrever_tabela(relatorio, saida, args.output_format)
+        print(f"Relatório salvo em: {saida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""Arquivo histórico ONS/TOK em arrays mapeados em memória.
+
+Cada fonte fica em um arquivo binário ``<fonte>.f32`` com forma fixa por
+rodada ``(estacao, lead, membro)`` em float32, e as rodadas são anexadas ao
+final do arquivo. Posições sem dado ficam NaN. O ``meta.json`` guarda o eixo
+de estações (códigos da ``base_de_estacoes.csv``), o número de leads e de
+membros e as datas das rodadas na ordem em que foram anexadas.
+
+Os eixos de lead e de membro crescem sob demanda: uma gravação com lead ou
+membro além dos atuais regrava os arquivos na forma maior (NaN nas posições
+novas) com um novo número de geração no nome (``<fonte>.g<N>.f32``), troca o
+``meta.json`` e só então apaga os arquivos antigos.
+
+Consultas abrem os arquivos com ``np.memmap`` e leem apenas as rodadas e
+estações pedidas. Gravações e consultas (de qualquer processo) são
+serializadas por um lock no diretório; os dados são gravados antes do
+``meta.json``, então uma rodada ou uma forma nova só passam a existir depois
+de gravadas por inteiro.
+"""
+from pathlib import Path
+import contextlib
+import fcntl
+import json
+
+import numpy as np
+import pandas as pd
+
+from escrita_saida import escrever_atomico
+
+
+ARQUIVO_META = 'meta.json'
+FONTES = ('ons', 'tok')
+
+
+class ArquivoHistorico:
+    """Séries ONS e TOK por estação × rodada × lead × membro.
+
+    Abre o arquivo em ``diretorio`` ou o cria com ``estacoes``. ``n_membros``
+    e ``n_leads`` são só os tamanhos iniciais (em aberto, o primeiro dado os
+    fixa); os dois eixos crescem quando uma gravação vai além deles.
+    """
+
+    def __init__(self, diretorio: Path, estacoes=None, n_membros: int | None = None, n_leads: int | None = None):
+        self.diretorio = Path(diretorio)
+        meta = self._ler_meta()
+        if meta is None:
+            if estacoes is None:
+                raise ValueError(f"Arquivo histórico inexistente em {self.diretorio}; "
+                                 "informe estacoes para criá-lo")
+            meta = {
+                'versao': 1,
+                'estacoes': [str(e) for e in estacoes],
+                'n_leads': None if n_leads is None else int(n_leads),
+                'n_membros': int(n_membros or 0),
+                'rodadas': [],
+            }
+            self.diretorio.mkdir(parents=True, exist_ok=True)
+            with self._travado():
+                if self._ler_meta() is None:
+                    self._gravar_meta(meta)
+                meta = self._ler_meta()
+        self._carregar(meta)
+
+    @property
+    def rodadas(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self._rodadas, name='rodada')
+
+    @property
+    def forma_rodada(self) -> tuple[int, int, int]:
+        return len(self.estacoes), self.n_leads or 0, self.n_membros
+
+    def gravar(self, rodada, fonte: str, estacoes, valores: np.ndarray, membro: int | None = None,
+               leads=None) -> None:
+        """Grava valores de uma fonte em uma rodada, criando a rodada se preciso.
+
+        ``valores`` tem forma ``(len(estacoes), len(leads))`` para um único
+        ``membro`` ou ``(len(estacoes), len(leads), membros)`` sem membro
+        (membros ``0..membros-1``). Estações fora da base são ignoradas;
+        ``leads`` padrão é ``0..n-1``. Leads ou membros além dos eixos atuais
+        fazem o arquivo crescer.
+        """
+        if fonte not in FONTES:
+            raise ValueError(f"Fonte desconhecida: {fonte!r} (use {' ou '.join(FONTES)})")
+        valores = np.asarray(valores, dtype=np.float32)
+        leads = np.arange(valores.shape[1]) if leads is None else np.asarray(leads, dtype=np.int64)
+        posicoes = self._indices_estacoes(estacoes)
+        conhecidas = posicoes >= 0
+        posicoes, valores = posicoes[conhecidas], valores[conhecidas]
+
+        if len(leads) and leads.min() < 0:
+            raise ValueError(f"Leads negativos não cabem no arquivo histórico: {leads.min()}")
+        if membro is not None and membro < 0:
+            raise ValueError(f"Membro negativo não cabe no arquivo histórico: {membro}")
+
+        with self._travado():
+            self._carregar(self._ler_meta())
+            n_leads = max(self.n_leads or 0, int(leads.max()) + 1 if len(leads) else 0)
+            n_membros = max(self.n_membros, membro + 1 if membro is not None else valores.shape[2])
+            if n_leads != self.n_leads or n_membros != self.n_membros:
+                self._redimensionar(n_leads, n_membros)
+
+            r = self._alocar_rodada(pd.Timestamp(rodada).normalize())
+            dados = self._abrir(fonte, 'r+')
+            if membro is None:
+                dados[r, posicoes[:, None], leads[None, :], :valores.shape[2]] = valores
+            else:
+                dados[r, posicoes[:, None], leads[None, :], membro] = valores
+            dados.flush()
+
+    def consultar(self, estacoes=None, inicio=None, fim=None, ultimas: int | None = None,
+                  membros=None, leads=None, fontes=FONTES) -> dict:
+        """Fatia do arquivo, lendo só as rodadas e estações pedidas.
+
+        As rodadas saem em ordem de data, filtradas por ``inicio``/``fim``
+        (inclusivos) e limitadas às ``ultimas`` N. Retorna um dicionário com
+        ``rodadas``, ``estacoes``, ``leads``, ``membros`` e um array
+        ``(rodada, estacao, lead, membro)`` por fonte.
+        """
+        with self._travado():
+            self._carregar(self._ler_meta())
+            return self._consultar(estacoes, inicio, fim, ultimas, membros, leads, fontes)
+
+    def _consultar(self, estacoes, inicio, fim, ultimas, membros, leads, fontes) -> dict:
+        rodadas = self.rodadas
+        ordem = np.argsort(rodadas.to_numpy(), kind='stable')
+        datas = rodadas[ordem]
+        selecao = np.ones(len(ordem), dtype=bool)
+        if inicio is not None:
+            selecao &= datas >= pd.Timestamp(inicio)
+        if fim is not None:
+            selecao &= datas <= pd.Timestamp(fim)
+        ordem = ordem[selecao]
+        if ultimas is not None:
+            ordem = ordem[len(ordem) - min(ultimas, len(ordem)):]
+
+        if estacoes is None:
+            posicoes = np.arange(len(self.estacoes))
+        else:
+            posicoes = self._indices_estacoes(estacoes)
+            if (posicoes < 0).any():
+                faltando = [e for e, i in zip(estacoes, posicoes) if i < 0]
+                raise KeyError(f"Estações fora do arquivo histórico: {faltando}")
+        leads = np.arange(self.n_leads or 0) if leads is None else np.asarray(leads, dtype=np.int64)
+        membros = np.arange(self.n_membros) if membros is None else np.asarray(membros, dtype=np.int64)
+
+        resultado = {
+            'rodadas': rodadas[ordem],
+            'estacoes': np.asarray(self.estacoes, dtype=object)[posicoes],
+            'leads': leads,
+            'membros': membros,
+        }
+        for fonte in fontes:
+            dados = self._abrir(fonte, 'r')
+            if dados is None:
+                resultado[fonte] = np.full((len(ordem), len(posicoes), len(leads), len(membros)), np.nan,
+                                           dtype=np.float32)
+                continue
+            resultado[fonte] = np.asarray(dados[np.ix_(ordem, posicoes, leads, membros)])
+        return resultado
+
+    def consultar_tabela(self, **filtros) -> pd.DataFrame:
+        """``consultar`` em formato longo (rodada, estacao, lead, membro, ons, tok), sem linhas vazias."""
+        fatia = self.consultar(**filtros)
+        indice = pd.MultiIndex.from_product(
+            [fatia['rodadas'], fatia['estacoes'], fatia['leads'], fatia['membros']],
+            names=['rodada', 'estacao', 'lead', 'membro'])
+        tabela = pd.DataFrame({fonte: fatia[fonte].ravel() for fonte in FONTES if fonte in fatia}, index=indice)
+        return tabela.dropna(how='all').reset_index()
+
+    def _carregar(self, meta: dict) -> None:
+        self.estacoes = meta['estacoes']
+        self.n_leads = meta['n_leads']
+        self.n_membros = meta['n_membros']
+        self._geracao = meta.get('geracao', 0)
+        self._rodadas = [pd.Timestamp(r) for r in meta['rodadas']]
+        self._posicao = pd.Index(self.estacoes)
+
+    def _meta(self) -> dict:
+        return {
+            'versao': 1,
+            'estacoes': self.estacoes,
+            'n_leads': self.n_leads,
+            'n_membros': self.n_membros,
+            'geracao': self._geracao,
+            'rodadas': [r.strftime('%Y-%m-%d') for r in self._rodadas],
+        }
+
+    def _redimensionar(self, n_leads: int, n_membros: int) -> None:
+        """Passa os eixos de lead e membro para os novos tamanhos (chamado com o lock)."""
+        antigos = {fonte: self._abrir(fonte, 'r') for fonte in FONTES}
+        geracao_antiga = self._geracao
+        self._geracao += 1
+        forma_antiga = self.forma_rodada
+        self.n_leads, self.n_membros = n_leads, n_membros
+        for fonte, antigo in antigos.items():
+            if not self._rodadas:
+                continue
+            # Nova geração gravada por inteiro antes do meta.json apontar para ela
+            novo = np.memmap(self._caminho(fonte), dtype=np.float32, mode='w+',
+                             shape=(len(self._rodadas),) + self.forma_rodada)
+            for r in range(len(self._rodadas)):
+                novo[r] = np.nan
+                if antigo is not None:
+                    novo[r, :, :forma_antiga[1], :forma_antiga[2]] = antigo[r]
+            novo.flush()
+            del novo
+        self._gravar_meta(self._meta())
+        for fonte in FONTES:
+            self._caminho(fonte, geracao_antiga).unlink(missing_ok=True)
+
+    def _indices_estacoes(self, estacoes) -> np.ndarray:
+        return self._posicao.get_indexer(pd.Index(estacoes).astype(str)).astype(np.int64)
+
+    def _alocar_rodada(self, rodada: pd.Timestamp) -> int:
+        if rodada in self._rodadas:
+            return self._rodadas.index(rodada)
+        r = len(self._rodadas)
+        vazio = np.full(self.forma_rodada, np.nan, dtype=np.float32)
+        tamanho = vazio.nbytes
+        for fonte in FONTES:
+            with open(self._caminho(fonte), 'ab+') as f:
+                # Descarta restos de uma gravação interrompida antes do meta
+                f.truncate(r * tamanho)
+                vazio.tofile(f)
+        self._rodadas.append(rodada)
+        self._gravar_meta(self._meta())
+        return r
+
+    def _abrir(self, fonte: str, modo: str) -> np.memmap | None:
+        if not self._rodadas or not self.n_leads or not self.n_membros:
+            return None
+        forma = (len(self._rodadas),) + self.forma_rodada
+        return np.memmap(self._caminho(fonte), dtype=np.float32, mode=modo, shape=forma)
+
+    def _caminho(self, fonte: str, geracao: int | None = None) -> Path:
+        geracao = self._geracao if geracao is None else geracao
+        return self.diretorio / (f"{fonte}.f32" if geracao == 0 else f"{fonte}.g{geracao}.f32")
+
+    @contextlib.contextmanager
+    def _travado(self):
+        with open(self.diretorio / '.lock', 'a') as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def _ler_meta(self) -> dict | None:
+        try:
+            return json.loads((self.diretorio / ARQUIVO_META).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _gravar_meta(self, meta: dict) -> None:
+        escrever_atomico(self.diretorio / ARQUIVO_META,
+                         lambda tmp: tmp.write_text(json.dumps(meta), encoding='utf-8'))
+
+
+def estacoes_base(caminho: Path) -> list[str]:
+    """Eixo de estações do arquivo: códigos ``ana_code`` da base de estações, em ordem."""
+    return pd.read_csv(caminho, usecols=['ana_code'])['ana_code'].astype(str).drop_duplicates().tolist()
+
+
+def gravar_compacto(historico: ArquivoHistorico, dados: pd.DataFrame, fonte: str, membro: int,
+                    rodada=None) -> None:
+    """Grava um frame compacto (ponto, dia, precipitacao_mm) de passo diário.
+
+    A rodada padrão é a data base do frame e o lead é o próprio ``dia``.
+    Pontos sem estação na base (rótulos ``"lat,lon"``) ficam de fora.
+    """
+    if dados.empty:
+        return
+    rodada = dados.attrs['data_base'] if rodada is None else pd.Timestamp(rodada)
+    deslocamento = (dados.attrs['data_base'] - pd.Timestamp(rodada).normalize()) // dados.attrs['passo']
+    codigos = dados['ponto'].cat.codes.to_numpy()
+    leads = dados['dia'].to_numpy(dtype=np.int64) + deslocamento
+    usados, linha = np.unique(codigos, return_inverse=True)
+    dias, coluna = np.unique(leads, return_inverse=True)
+    matriz = np.full((len(usados), len(dias)), np.nan, dtype=np.float32)
+    matriz[linha, coluna] = dados['precipitacao_mm'].to_numpy()
+    historico.gravar(rodada, fonte, dados['ponto'].cat.categories[usados], matriz, membro=membro, leads=dias)
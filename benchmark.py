@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""Benchmark por estágio de compara_chuva_diaria e compara_hindcast.
+
+Gera entradas sintéticas nos formatos reais (.dat de grade "lon lat precip"
+para o diário; .dat de estações e .csv por basin para o hindcast) na escala
+pedida, mede tempo e memória de cada estágio e anexa o resultado a um
+histórico JSON. Cada execução é comparada com a última de mesmos parâmetros,
+para que regressões entre versões fiquem visíveis.
+
+Uso:
+    python benchmark.py --pontos 5000 --horizonte 45 --pastas 4 --membros 20
+
+Opções:
+    --pontos     pontos de grade por .dat (diário) e estações ONS (hindcast) (padrão: 2000)
+    --horizonte  arquivos .dat por pasta (diário) e leads por membro (hindcast) (padrão: 45)
+    --pastas     número de pares rodada_N / cN+1 no diário (padrão: 3)
+    --membros    membros do hindcast (padrão: 10)
+    --repeticoes execuções cronometradas por estágio; vale a menor (padrão: 3)
+    --formato    formato do estágio de gravação: csv, parquet, feather ou arrow (padrão: csv)
+    --apenas     roda só o pipeline diario, hindcast ou inicializacao
+    --historico  arquivo JSON do histórico (padrão: benchmark_historico.json)
+    --diretorio  onde gerar as entradas (padrão: diretório temporário, removido ao final)
+
+Para cada estágio são gravados o menor tempo e a média (parede e CPU), o pico
+de memória alocada no estágio (tracemalloc, em uma execução separada da
+cronometragem) e o RSS máximo do processo até ali.
+
+O pipeline ``inicializacao`` mede, em subprocessos, o custo de subir os
+scripts: ``--help`` de cada um, ``import compara_chuva_diaria`` e uma execução
+do diário em que nada mudou desde a anterior. Tempos acima de
+``ORCAMENTO_INICIALIZACAO_S`` são listados ao final (ali o pico de memória
+não é medido).
+"""
+from pathlib import Path
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import compara_chuva_diaria as diaria
+import compara_hindcast as hindcast
+from escrita_saida import FORMATOS_SAIDA, abrir_tabela, escrever_atomico, escrever_tabela, nome_saida
+from ingestao import associar_estacoes, ler_bloco_dat
+from matriz_comparacao import ComparacaoAlinhada
+from tipos_compactos import alinhar
+
+
+RAIZ = Path(__file__).resolve().parent
+ESTACOES_PATH = RAIZ / 'base_de_estacoes.csv'
+DATA_RODADA = pd.Timestamp('2026-01-21')
+
+# Orçamento (s) de cada medida do pipeline de inicialização.
+ORCAMENTO_INICIALIZACAO_S = {
+    'ajuda_diaria': 0.3,
+    'ajuda_hindcast': 0.3,
+    'import_diaria': 0.3,
+    'sem_alteracoes': 0.5,
+}
+
+
+def _estacoes_validas() -> pd.DataFrame:
+    estacoes = pd.read_csv(ESTACOES_PATH)
+    return estacoes[(estacoes['lat'] != 0) | (estacoes['lon'] != 0)].reset_index(drop=True)
+
+
+def _coordenadas(n_pontos: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Estações da base primeiro (para haver casamento), depois pontos aleatórios de grade."""
+    estacoes = _estacoes_validas().head(n_pontos)
+    extras = n_pontos - len(estacoes)
+    lat = np.concatenate([estacoes['lat'].to_numpy(), rng.uniform(-33, 5, extras).round(2)])
+    lon = np.concatenate([estacoes['lon'].to_numpy(), rng.uniform(-74, -34, extras).round(2)])
+    return lat, lon
+
+
+def gerar_diario(base: Path, n_pontos: int, horizonte: int, n_pastas: int, seed: int = 0) -> None:
+    """Estrutura ONS/rodada_N e TOK/ECENS_cN+1 com um .dat por dia de horizonte."""
+    rng = np.random.default_rng(seed)
+    lat, lon = _coordenadas(n_pontos, rng)
+    for k in range(1, n_pastas + 1):
+        for fonte, pasta in (('ONS', f'rodada_{k}'), ('TOK', f'ECENS_c{k + 1}')):
+            destino = base / fonte / pasta
+            destino.mkdir(parents=True, exist_ok=True)
+            for dia in range(horizonte):
+                data = DATA_RODADA + pd.Timedelta(days=dia)
+                valores = np.column_stack([lon, lat, rng.gamma(2, 5, n_pontos).round(1)])
+                np.savetxt(destino / f"PREC_p{DATA_RODADA:%d%m%y}a{data:%d%m%y}.dat", valores,
+                           fmt='%8.2f%8.2f%8.1f')
+
+
+def gerar_hindcast(base: Path, n_pontos: int, horizonte: int, n_membros: int, seed: int = 1) -> None:
+    """Arquivos ONS (estação lat lon valores...) e TOK (smap_basin_id, valores...) por membro."""
+    rng = np.random.default_rng(seed)
+    estacoes = _estacoes_validas()
+    lat, lon = _coordenadas(n_pontos, rng)
+    codigos = np.concatenate([estacoes['ana_code'].to_numpy(dtype=object)[:n_pontos],
+                              [f"SINT{i:05d}" for i in range(max(n_pontos - len(estacoes), 0))]])
+    (base / 'ONS').mkdir(parents=True, exist_ok=True)
+    (base / 'TOK').mkdir(parents=True, exist_ok=True)
+    for p in range(n_membros):
+        valores = rng.gamma(2, 4, (n_pontos, horizonte)).round(1)
+        linhas = (f"{c} {la + rng.normal(0, .05):.2f} {lo + rng.normal(0, .05):.2f} " + " ".join(map(str, v))
+                  for c, la, lo, v in zip(codigos, lat, lon, valores.tolist()))
+        (base / 'ONS' / f"ECMWFf_m_{DATA_RODADA:%d%m%y}_p{p}.dat").write_text("\n".join(linhas) + "\n")
+        tok = pd.DataFrame(rng.gamma(2, 4, (len(estacoes), horizonte)).round(2),
+                           columns=[f"d{i}" for i in range(horizonte)])
+        tok.insert(0, 'smap_basin_id', estacoes['smap_basin_id'].to_numpy())
+        tok.to_csv(base / 'TOK' / f"EC45_m{p}.csv", index=False)
+
+
+def medir(funcao, repeticoes: int):
+    """Executa ``funcao`` ``repeticoes`` vezes cronometrando e mais uma sob tracemalloc."""
+    paredes, cpus = [], []
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        resultado = funcao()
+        paredes.append(time.perf_counter() - inicio)
+        cpus.append(time.process_time() - inicio_cpu)
+    del resultado
+    gc.collect()
+    tracemalloc.start()
+    try:
+        resultado = funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resultado, {
+        'tempo_s': round(min(paredes), 4),
+        'tempo_medio_s': round(float(np.mean(paredes)), 4),
+        'cpu_s': round(min(cpus), 4),
+        'pico_mb': round(pico / 2**20, 2),
+        'rss_max_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def benchmark_diario(base: Path, repeticoes: int, formato: str) -> dict:
+    pares = [(pasta, base / 'TOK' / f"ECENS_c{int(pasta.name.split('_')[-1]) + 1}")
+             for pasta in sorted((base / 'ONS').iterdir())]
+    saida = base / 'Output'
+    saida.mkdir(exist_ok=True)
+    resultados = {}
+
+    def leitura():
+        return [(ler_bloco_dat(sorted(ons.glob('*.dat'))), ler_bloco_dat(sorted(tok.glob('*.dat'))))
+                for ons, tok in pares]
+
+    def estacoes():
+        indice = diaria.carregar_base_estacoes(ESTACOES_PATH)
+        return [(associar_estacoes(ons, indice), associar_estacoes(tok, indice)) for ons, tok in blocos]
+
+    def comparacao():
+        alinhadas = [ComparacaoAlinhada.de_compactos(*alinhar(ons, tok)) for ons, tok in compactos]
+        return [(a, a.tabela_longa(), a.matriz_diferencas()) for a in alinhadas]
+
+    def estatisticas():
+        return [(a.estatisticas_por_ponto().round(2), a.acumulados()) for a, _, _ in comparados]
+
+    def gravacao():
+        for i, ((_, longa, matriz), (stats, acumulados)) in enumerate(zip(comparados, tabelas)):
+            for nome, tabela, index in (('comparacao', longa, False), ('estatisticas', stats, True),
+                                        ('acumulados', acumulados, True), ('matriz', matriz, True)):
+                with abrir_tabela(saida / nome_saida(f"{nome}_{i}", formato), formato, index=index) as escritor:
+                    escritor.escrever(tabela)
+
+    def total():
+        indice = diaria.carregar_base_estacoes(ESTACOES_PATH)
+        with contextlib.redirect_stdout(None):
+            for ons, tok in pares:
+                diaria.processar_par(ons, tok, saida, indice, formato=formato)
+
+    blocos, resultados['leitura'] = medir(leitura, repeticoes)
+    compactos, resultados['estacoes'] = medir(estacoes, repeticoes)
+    comparados, resultados['comparacao'] = medir(comparacao, repeticoes)
+    tabelas, resultados['estatisticas'] = medir(estatisticas, repeticoes)
+    _, resultados['gravacao'] = medir(gravacao, repeticoes)
+    _, resultados['total'] = medir(total, repeticoes)
+    return resultados
+
+
+def benchmark_hindcast(base: Path, n_membros: int, repeticoes: int, formato: str) -> dict:
+    hindcast.ONS_DIR = base / 'ONS'
+    hindcast.TOK_DIR = base / 'TOK'
+    hindcast.ESTACOES_FILE = ESTACOES_PATH
+    hindcast.OUTPUT_DIR = base / 'Output'
+    hindcast.OUTPUT_DIR.mkdir(exist_ok=True)
+    mapping = hindcast.load_estacoes()
+    membros = range(n_membros)
+    resultados = {}
+
+    def leitura():
+        return [(p, hindcast.parse_ons_file(ons), hindcast.parse_tok_file(tok))
+                for p, (ons, tok) in ((p, hindcast.member_files(p)) for p in membros)]
+
+    def estacoes():
+        indice = hindcast.BasinIndex(mapping)
+        for _, ons_data, tok_data in lidos:
+            disponiveis = [b for b in tok_data if b in mapping]
+            indice.restrict(disponiveis).query(np.array([s['lat'] for s in ons_data]),
+                                               np.array([s['lon'] for s in ons_data]))
+        return indice
+
+    def comparacao():
+        return [hindcast.compare_hindcasts(ons_data, tok_data, mapping, f'p{p}', indice)
+                for p, ons_data, tok_data in lidos]
+
+    def cubo():
+        return hindcast.load_ensemble_cube(membros, mapping, indice)
+
+    def estatisticas():
+        return hindcast.ensemble_metrics(dados_cubo['ons'], dados_cubo['tok'])
+
+    def gravacao():
+        for p, comparacao_p in enumerate(comparacoes):
+            escrever_tabela(comparacao_p, hindcast.OUTPUT_DIR / nome_saida(f"comparacao_p{p}", formato), formato)
+
+    lidos, resultados['leitura'] = medir(leitura, repeticoes)
+    indice, resultados['estacoes'] = medir(estacoes, repeticoes)
+    comparacoes, resultados['comparacao'] = medir(comparacao, repeticoes)
+    dados_cubo, resultados['cubo'] = medir(cubo, repeticoes)
+    _, resultados['estatisticas'] = medir(estatisticas, repeticoes)
+    _, resultados['gravacao'] = medir(gravacao, repeticoes)
+    return resultados
+
+
+def medir_processo(comando: list[str], repeticoes: int) -> dict:
+    """Executa ``comando`` ``repeticoes`` vezes; tempo de parede e CPU do filho.
+
+    O RSS máximo do filho não é registrado: no Linux ele herda o do processo
+    do benchmark no fork, o que o torna inútil aqui.
+    """
+    paredes, cpus = [], []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        processo = subprocess.Popen(comando, cwd=RAIZ, stdout=subprocess.DEVNULL)
+        _, status, uso = os.wait4(processo.pid, 0)
+        paredes.append(time.perf_counter() - inicio)
+        processo.returncode = os.waitstatus_to_exitcode(status)
+        if processo.returncode:
+            raise subprocess.CalledProcessError(processo.returncode, comando)
+        cpus.append(uso.ru_utime + uso.ru_stime)
+    return {
+        'tempo_s': round(min(paredes), 4),
+        'tempo_medio_s': round(float(np.mean(paredes)), 4),
+        'cpu_s': round(min(cpus), 4),
+        'pico_mb': None,
+        'rss_max_mb': None,
+    }
+
+
+def benchmark_inicializacao(base: Path, repeticoes: int) -> dict:
+    """Custo de subir os scripts: --help, import e execução diária sem alterações."""
+    diario = [sys.executable, str(RAIZ / 'compara_chuva_diaria.py'), '--base-dir', str(base), '--sem-cache']
+    # Primeira execução grava o manifesto; as cronometradas não têm o que recalcular.
+    subprocess.run(diario, cwd=RAIZ, stdout=subprocess.DEVNULL, check=True)
+    comandos = {
+        'ajuda_diaria': [sys.executable, str(RAIZ / 'compara_chuva_diaria.py'), '--help'],
+        'ajuda_hindcast': [sys.executable, str(RAIZ / 'compara_hindcast.py'), '--help'],
+        'import_diaria': [sys.executable, '-c', 'import compara_chuva_diaria'],
+        'sem_alteracoes': diario,
+    }
+    return {nome: medir_processo(comando, repeticoes) for nome, comando in comandos.items()}
+
+
+def acima_do_orcamento(medidas: dict) -> dict:
+    """Medidas de inicialização cujo menor tempo passou de ``ORCAMENTO_INICIALIZACAO_S``."""
+    return {nome: (m['tempo_s'], ORCAMENTO_INICIALIZACAO_S[nome]) for nome, m in medidas.items()
+            if nome in ORCAMENTO_INICIALIZACAO_S and m['tempo_s'] > ORCAMENTO_INICIALIZACAO_S[nome]}
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _ler_historico(caminho: Path) -> list:
+    try:
+        return json.loads(caminho.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return []
+
+
+def imprimir(registro: dict, anterior: dict | None) -> None:
+    for pipeline, estagios in registro['resultados'].items():
+        print(f"\n{pipeline}")
+        print(f"  {'estágio':<14}{'tempo (s)':>11}{'cpu (s)':>10}{'pico (MB)':>11}{'anterior (s)':>14}{'variação':>10}")
+        for estagio, medidas in estagios.items():
+            antes = (anterior or {}).get('resultados', {}).get(pipeline, {}).get(estagio)
+            coluna_antes, variacao = '-', '-'
+            if antes:
+                coluna_antes = f"{antes['tempo_s']:.4f}"
+                if antes['tempo_s'] > 0:
+                    variacao = f"{(medidas['tempo_s'] / antes['tempo_s'] - 1) * 100:+.1f}%"
+            pico = '-' if medidas['pico_mb'] is None else f"{medidas['pico_mb']:.2f}"
+            print(f"  {estagio:<14}{medidas['tempo_s']:>11.4f}{medidas['cpu_s']:>10.4f}"
+                  f"{pico:>11}{coluna_antes:>14}{variacao:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark por estágio dos pipelines diário e hindcast')
+    parser.add_argument('--pontos', type=int, default=2000)
+    parser.add_argument('--horizonte', type=int, default=45)
+    parser.add_argument('--pastas', type=int, default=3)
+    parser.add_argument('--membros', type=int, default=10)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--formato', choices=FORMATOS_SAIDA, default='csv')
+    parser.add_argument('--apenas', choices=['diario', 'hindcast', 'inicializacao'], default=None)
+    parser.add_argument('--historico', default='benchmark_historico.json')
+    parser.add_argument('--diretorio', default=None)
+    args = parser.parse_args()
+
+    parametros = {k: getattr(args, k) for k in ('pontos', 'horizonte', 'pastas', 'membros', 'repeticoes', 'formato')}
+    registro = {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'maquina': platform.node(),
+        'parametros': parametros,
+        'resultados': {},
+    }
+
+    with contextlib.ExitStack() as pilha:
+        if args.diretorio:
+            raiz = Path(args.diretorio)
+        else:
+            raiz = Path(pilha.enter_context(tempfile.TemporaryDirectory(prefix='benchmark-compara-chuva-')))
+        if args.apenas in (None, 'diario'):
+            print(f"Gerando diário: {args.pastas} pares × {args.horizonte} arquivos × {args.pontos} pontos")
+            gerar_diario(raiz / 'diario', args.pontos, args.horizonte, args.pastas)
+            registro['resultados']['diario'] = benchmark_diario(raiz / 'diario', args.repeticoes, args.formato)
+        if args.apenas in (None, 'hindcast'):
+            print(f"Gerando hindcast: {args.membros} membros × {args.pontos} estações × {args.horizonte} leads")
+            gerar_hindcast(raiz / 'hindcast', args.pontos, args.horizonte, args.membros)
+            registro['resultados']['hindcast'] = benchmark_hindcast(raiz / 'hindcast', args.membros,
+                                                                    args.repeticoes, args.formato)
+        if args.apenas in (None, 'inicializacao'):
+            print("Medindo inicialização dos scripts")
+            gerar_diario(raiz / 'inicializacao', min(args.pontos, 200), min(args.horizonte, 5), 1)
+            registro['resultados']['inicializacao'] = benchmark_inicializacao(raiz / 'inicializacao',
+                                                                              args.repeticoes)
+
+    caminho_historico = Path(args.historico)
+    historico = _ler_historico(caminho_historico)
+    anterior = next((r for r in reversed(historico) if r.get('parametros') == parametros), None)
+    imprimir(registro, anterior)
+    excedidos = acima_do_orcamento(registro['resultados'].get('inicializacao', {}))
+    for nome, (tempo, orcamento) in excedidos.items():
+        print(f"Aviso: inicialização '{nome}' levou {tempo:.3f} s (orçamento: {orcamento:.3f} s)")
+
+    historico.append(registro)
+    escrever_atomico(caminho_historico, lambda tmp: tmp.write_text(json.dumps(historico, indent=1),
+                                                                    encoding='utf-8'))
+    print(f"\nHistórico atualizado: {caminho_historico}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Cache persistente em Parquet das entradas já interpretadas (.dat, .csv, .xlsx).
+
+Cada entrada é identificada pelo caminho do arquivo, pela função leitora e
+pela versão do leitor (``versao``, a ser incrementada quando o formato lido
+ou a interpretação mudam) e do próprio cache (``VERSAO_CACHE``): entradas de
+versões antigas deixam de ser encontradas. Se tamanho e mtime não mudaram, a
+tabela guardada é lida direto. Se mudaram, o conteúdo é comparado pelo hash
+antes de reinterpretar (um ``touch`` ou uma cópia idêntica não invalidam o
+cache). A impressão digital (stat e hash) é tomada antes da leitura, então um
+arquivo alterado durante a leitura fica com a impressão antiga e é relido na
+próxima vez. O diretório tem tamanho máximo e as
+entradas usadas há mais tempo são removidas primeiro (LRU).
+
+O diretório padrão é ``$COMPARA_CHUVA_CACHE`` ou ``~/.cache/compara-chuva``.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable
+import hashlib
+import json
+import os
+
+from escrita_saida import escrever_atomico
+from importacao_tardia import modulo_tardio
+
+pd = modulo_tardio('pandas')
+
+
+TAMANHO_MAX_PADRAO_MB = 1024
+VERSAO_CACHE = 2
+
+
+def diretorio_padrao() -> Path:
+    return Path(os.environ.get('COMPARA_CHUVA_CACHE', Path.home() / '.cache' / 'compara-chuva'))
+
+
+def hash_arquivo(caminho: Path, tamanho_bloco: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(caminho, 'rb') as f:
+        while bloco := f.read(tamanho_bloco):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+class CacheIngestao:
+    """Guarda em Parquet o resultado de ``leitor(caminho)`` para cada arquivo de entrada."""
+
+    def __init__(self, diretorio: Path | None = None, tamanho_max_mb: float = TAMANHO_MAX_PADRAO_MB):
+        self.diretorio = Path(diretorio) if diretorio is not None else diretorio_padrao()
+        self.tamanho_max = int(tamanho_max_mb * 1024 * 1024)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self._aplicar_limite()
+
+    def ler(self, caminho: Path, leitor: Callable[[Path], pd.DataFrame], versao: int = 1) -> pd.DataFrame:
+        caminho = Path(caminho).resolve()
+        nome_leitor = f"{leitor.__module__}.{leitor.__qualname__}"
+        identificacao = f"{caminho}|{nome_leitor}|{versao}|{VERSAO_CACHE}"
+        chave = hashlib.blake2b(identificacao.encode(), digest_size=16).hexdigest()
+        arquivo_meta = self.diretorio / f"{chave}.json"
+        arquivo_tabela = self.diretorio / f"{chave}.parquet"
+
+        stat = caminho.stat()
+        hash_conteudo = None
+        meta = self._ler_meta(arquivo_meta)
+        if meta is not None and arquivo_tabela.exists():
+            mesmo_stat = meta['tamanho'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns
+            if not mesmo_stat and meta['tamanho'] == stat.st_size:
+                hash_conteudo = hash_arquivo(caminho)
+            if mesmo_stat or hash_conteudo == meta['hash']:
+                tabela = pd.read_parquet(arquivo_tabela)
+                if not mesmo_stat:
+                    self._gravar_meta(arquivo_meta, caminho, nome_leitor, stat, meta['hash'])
+                os.utime(arquivo_tabela)  # marca o último acesso para o LRU
+                return tabela
+
+        # Impressão digital antes de ler: se o arquivo mudar durante a leitura,
+        # a entrada fica com a impressão antiga e não casa na próxima execução.
+        if hash_conteudo is None:
+            hash_conteudo = hash_arquivo(caminho)
+        tabela = leitor(caminho)
+        try:
+            escrever_atomico(arquivo_tabela, lambda tmp: tabela.to_parquet(tmp))
+        except (ValueError, TypeError, NotImplementedError, ImportError):
+            # Tabela sem representação em Parquet (ex.: colunas com tipos
+            # mistos vindas do Excel): segue sem cache para este arquivo.
+            return tabela
+        self._gravar_meta(arquivo_meta, caminho, nome_leitor, stat, hash_conteudo)
+        self._aplicar_limite()
+        return tabela
+
+    def limpar(self) -> None:
+        for arquivo in self.diretorio.glob('*'):
+            if arquivo.suffix in ('.json', '.parquet'):
+                arquivo.unlink(missing_ok=True)
+
+    @staticmethod
+    def _ler_meta(arquivo_meta: Path) -> dict | None:
+        try:
+            return json.loads(arquivo_meta.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _gravar_meta(self, arquivo_meta: Path, caminho: Path, nome_leitor: str, stat, hash_conteudo: str) -> None:
+        meta = {
+            'caminho': str(caminho),
+            'leitor': nome_leitor,
+            'tamanho': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'hash': hash_conteudo,
+        }
+        escrever_atomico(arquivo_meta, lambda tmp: tmp.write_text(json.dumps(meta), encoding='utf-8'))
+
+    def _aplicar_limite(self) -> None:
+        tabelas = []
+        for arquivo in self.diretorio.glob('*.parquet'):
+            try:
+                stat = arquivo.stat()
+            except FileNotFoundError:
+                continue
+            tabelas.append((stat.st_mtime, stat.st_size, arquivo))
+        total = sum(tamanho for _, tamanho, _ in tabelas)
+        for _, tamanho, arquivo in sorted(tabelas, key=lambda t: t[0]):
+            if total <= self.tamanho_max:
+                break
+            arquivo.unlink(missing_ok=True)
+            arquivo.with_suffix('.json').unlink(missing_ok=True)
+            total -= tamanho
+
+
+def ler_com_cache(caminho: Path, leitor: Callable[[Path], pd.DataFrame],
+                  cache: CacheIngestao | None = None, versao: int = 1) -> pd.DataFrame:
+    """Lê ``caminho`` com ``leitor`` passando pelo cache; sem cache, lê direto."""
+    if cache is None:
+        return leitor(Path(caminho))
+    return cache.ler(caminho, leitor, versao)
@@ -8,15 +8,55 @@ Opções:
     --base-dir   Diretório base com subpastas ONS/ e TOK/ (padrão: COMPARAR_CHUVA_DIARIA)
     --date       (opcional) subpasta de data dentro do base-dir
     --horizonte  horizonte em dias (apenas para gerar dados de exemplo)
+    --workers    número de processos para comparar os pares em paralelo (padrão: 1)
+    --tolerancia tolerância em graus para casar pontos de grade com estações (padrão: 0)
+    --cache-dir  diretório do cache Parquet das entradas (padrão: $COMPARA_CHUVA_CACHE ou ~/.cache/compara-chuva)
+    --cache-max-mb tamanho máximo do cache em MB (padrão: 1024)
+    --sem-cache  reinterpreta todos os arquivos .dat sem usar o cache
+    --forcar     recalcula todos os pares, ignorando o manifesto da pasta Output
+    --memoria-max-mb orçamento de memória da comparação; processa os pontos em blocos
+    --output-format formato das saídas: csv (padrão), parquet, feather ou arrow
+    --arquivo-historico diretório do arquivo histórico mapeado em memória onde anexar ONS/TOK
+    --agregador  diretório do agregador de desempenho (viés, MAE, RMSE, correlação por estação e lead)
+    --limiares   limiares em mm (ex.: 1 5 10 25 50) para a verificação categórica (POD, FAR, CSI, ETS, viés)
+    --metricas   arquivo JSON lines com tempo, CPU, linhas, bytes e RSS de cada estágio por par
+    --perfil-estagio estágio (leitura, estacoes, comparacao, estatisticas, categorica, gravacao, par) a perfilar
+    --perfil     cprofile (padrão) ou tracemalloc para o --perfil-estagio
 """
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING
+import contextlib
+import io
 import re
-import pandas as pd
-import numpy as np
 import argparse
 
-
-def carregar_base_estacoes(caminho: Path) -> pd.DataFrame:
+from cache_ingestao import TAMANHO_MAX_PADRAO_MB, CacheIngestao
+from escrita_saida import FORMATOS_SAIDA, abrir_tabela, nome_saida
+from importacao_tardia import modulo_tardio
+from instrumentacao import PERFIS, configuracao, configurar, estagio
+from manifesto import Manifesto, impressao_digital
+
+# pandas, NumPy e os módulos que dependem deles só são importados quando há
+# par a comparar: --help e execuções sem alterações não pagam esse custo.
+pd = modulo_tardio('pandas')
+np = modulo_tardio('numpy')
+agregador_desempenho = modulo_tardio('agregador_desempenho')
+arquivo_historico = modulo_tardio('arquivo_historico')
+indice_estacoes = modulo_tardio('indice_estacoes')
+ingestao = modulo_tardio('ingestao')
+matriz_comparacao = modulo_tardio('matriz_comparacao')
+tipos_compactos = modulo_tardio('tipos_compactos')
+
+if TYPE_CHECKING:
+    from agregador_desempenho import AgregadorDesempenho
+    from arquivo_historico import ArquivoHistorico
+    from indice_estacoes import IndiceEstacoes
+
+
+def carregar_base_estacoes(caminho: Path, tolerancia: float = 0.0) -> IndiceEstacoes:
     estacoes = pd.read_csv(caminho)
     if 'ana_code' in estacoes.columns:
         estacoes['ponto'] = estacoes['ana_code']
@@ -24,61 +64,39 @@ def carregar_base_estacoes(caminho: Path) -> pd.DataFrame:
         estacoes['ponto'] = estacoes['smap_basin_id'].astype(str)
     else:
         estacoes['ponto'] = estacoes.index.astype(str)
-    estacoes['lat_round'] = estacoes['lat'].round(2)
-    estacoes['lon_round'] = estacoes['lon'].round(2)
-    return estacoes[['ponto', 'lat_round', 'lon_round']]
+    return indice_estacoes.IndiceEstacoes(estacoes['ponto'].to_numpy(), estacoes['lat'].to_numpy(),
+                          estacoes['lon'].to_numpy(), tolerancia=tolerancia)
 
 
-def extrair_data_arquivo(nome_arquivo: str) -> pd.Timestamp | None:
-    base = Path(nome_arquivo).stem
-    try:
-        token = base.split('_')[-1].split('a')[-1].split('.')[0]
-        if len(token) != 6:
-            return None
-        return pd.to_datetime(token, format='%d%m%y')
-    except Exception:
-        return None
-
-
-def montar_df_arquivo_dat(arquivo: Path, estacoes: pd.DataFrame) -> pd.DataFrame:
-    data = pd.read_csv(
-        arquivo,
-        sep=r'\s+',
-        header=None,
-        names=['lon', 'lat', 'precipitacao_mm']
-    )
-    data['lat_round'] = data['lat'].round(2)
-    data['lon_round'] = data['lon'].round(2)
-    data = data.merge(estacoes, on=['lat_round', 'lon_round'], how='left')
-    data['ponto'] = data['ponto'].fillna(
-        data['lat_round'].astype(str) + ',' + data['lon_round'].astype(str)
-    )
-
-    data_arquivo = extrair_data_arquivo(arquivo.name)
-    if data_arquivo is None:
-        return pd.DataFrame(columns=['ponto', 'data', 'precipitacao_mm'])
+def montar_df_arquivo_dat(arquivo: Path, estacoes: IndiceEstacoes,
+                          cache: CacheIngestao | None = None) -> pd.DataFrame:
+    return ingestao.associar_estacoes(ingestao.ler_bloco_dat([arquivo], cache), estacoes)
 
-    data['data'] = data_arquivo
-    return data[['ponto', 'data', 'precipitacao_mm']]
 
+def carregar_dados_fonte(caminho: Path, fonte: str, estacoes: IndiceEstacoes,
+                         cache: CacheIngestao | None = None) -> pd.DataFrame:
+    """Carrega todos os arquivos .dat da subpasta em um único bloco e associa as estações.
 
-def carregar_dados_fonte(caminho: Path, fonte: str, estacoes: pd.DataFrame) -> pd.DataFrame:
-    """Carrega todos os arquivos .dat da subpasta e concatena em um DataFrame."""
+    Arquivos .zip/.tar.gz da subpasta têm os .dat lidos direto do pacote, sem extração.
+    """
     arquivos = sorted(caminho.glob("*.dat"))
-    if not arquivos:
+    compactados = sorted(p for p in caminho.iterdir() if p.is_file() and ingestao.eh_compactado(p))
+    if not arquivos and not compactados:
         print(f"Nenhum arquivo .dat encontrado em {caminho} para {fonte}")
         return pd.DataFrame(columns=['ponto', 'data', 'precipitacao_mm'])
 
-    frames = []
-    for arquivo in arquivos:
-        df = montar_df_arquivo_dat(arquivo, estacoes)
-        if not df.empty:
-            frames.append(df)
-
-    if not frames:
+    with estagio('leitura', pasta=caminho.name, fonte=fonte) as medida:
+        bloco = ingestao.ler_bloco_dat(arquivos, cache)
+        if compactados:
+            bloco = np.concatenate([bloco, ingestao.ler_bloco_compactado(compactados, cache=cache)])
+        medida.linhas = len(bloco)
+    if len(bloco) == 0:
         return pd.DataFrame(columns=['ponto', 'data', 'precipitacao_mm'])
 
-    return pd.concat(frames, ignore_index=True)
+    with estagio('estacoes', pasta=caminho.name, fonte=fonte) as medida:
+        dados = ingestao.associar_estacoes(bloco, estacoes)
+        medida.linhas = len(dados)
+    return dados
 
 
 def gerar_dados_exemplo(fonte: str, horizonte: int = 45) -> pd.DataFrame:
@@ -94,6 +112,8 @@ def gerar_dados_exemplo(fonte: str, horizonte: int = 45) -> pd.DataFrame:
 
 
 def padronizar_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    if tipos_compactos.eh_compacto(df):
+        return df
     df2 = df.copy()
     lower = [c.lower() for c in df2.columns]
     rename = {}
@@ -111,43 +131,222 @@ def padronizar_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     return df2
 
 
-def comparar(dados_ons: pd.DataFrame, dados_tok: pd.DataFrame, caminho_output: Path, data_label: str):
-    dados_ons = padronizar_dataframe(dados_ons)
-    dados_tok = padronizar_dataframe(dados_tok)
+# Memória de pico por linha do formato longo (ponto × data) de um bloco:
+# matrizes alinhadas, tabela longa, matriz de diferenças, estatísticas e a
+# gravação. Medido com tracemalloc em _comparar_bloco seguido da gravação
+# (csv e parquet), com dados sintéticos de 1000-5000 pontos e 45-200 dias:
+# 125-127 bytes por linha. 200 deixa margem para o interpretador e para os
+# buffers dos escritores, que o tracemalloc não vê por inteiro. (Os 400 bytes
+# da primeira versão valiam para o merge em formato longo, antes dos tipos
+# compactos e das matrizes alinhadas.)
+BYTES_POR_LINHA_COMPARACAO = 200
+
+
+def _comparar_bloco(dados_ons: pd.DataFrame, dados_tok: pd.DataFrame, dias: np.ndarray, contexto: dict,
+                    limiares=None):
+    """Todas as tabelas de saída para um conjunto de pontos (frames compactos e alinhados)."""
+    with estagio('comparacao', **contexto) as medida:
+        alinhada = matriz_comparacao.ComparacaoAlinhada.de_compactos(dados_ons, dados_tok, dias)
+        dados, dados_comparados = alinhada.tabela_longa(), alinhada.matriz_diferencas()
+        medida.linhas = len(dados)
+    with estagio('estatisticas', **contexto) as medida:
+        stats = alinhada.estatisticas_por_ponto()[
+            ['ONS_media', 'ONS_total', 'TOK_media', 'TOK_total', 'Dif_media', 'Dif_total', 'Dif_std']
+        ].round(2)
+        acumulados = alinhada.acumulados()
+        medida.linhas = len(stats)
+    if limiares is None:
+        return dados, stats, acumulados, dados_comparados
+    with estagio('categorica', **contexto) as medida:
+        categorica = alinhada.categorica(limiares)
+        medida.linhas = len(categorica)
+    return dados, stats, acumulados, dados_comparados, categorica
+
+
+def _blocos_de_pontos(dados_ons: pd.DataFrame, dados_tok: pd.DataFrame, pontos_por_bloco: int):
+    """Fatias (ONS, TOK) com os mesmos pontos, em ordem de ponto."""
+    codigos_ons = dados_ons['ponto'].cat.codes.to_numpy()
+    codigos_tok = dados_tok['ponto'].cat.codes.to_numpy()
+    ordem_ons = np.argsort(codigos_ons, kind='stable')
+    ordem_tok = np.argsort(codigos_tok, kind='stable')
+    codigos_ons, codigos_tok = codigos_ons[ordem_ons], codigos_tok[ordem_tok]
+    pontos = np.union1d(codigos_ons, codigos_tok)
+    for inicio in range(0, len(pontos), pontos_por_bloco):
+        primeiro = pontos[inicio]
+        ultimo = pontos[min(inicio + pontos_por_bloco, len(pontos)) - 1]
+        fatia_ons = ordem_ons[np.searchsorted(codigos_ons, primeiro, 'left'):np.searchsorted(codigos_ons, ultimo, 'right')]
+        fatia_tok = ordem_tok[np.searchsorted(codigos_tok, primeiro, 'left'):np.searchsorted(codigos_tok, ultimo, 'right')]
+        yield dados_ons.iloc[fatia_ons], dados_tok.iloc[fatia_tok]
+
+
+def comparar(dados_ons: pd.DataFrame, dados_tok: pd.DataFrame, caminho_output: Path, data_label: str,
+             memoria_max_mb: float | None = None, formato: str = 'csv', limiares=None) -> list[str]:
+    """Compara as duas fontes e grava as saídas; retorna os nomes dos arquivos gravados.
+
+    Os dados são comparados na forma compacta (ponto categórico, dia int16 ou int32,
+    precipitação float32), alinhados em matrizes densas ponto × data
+    (``ComparacaoAlinhada``) e convertidos para rótulos e datas só na gravação.
+    Com ``memoria_max_mb``, os pontos são processados em blocos cujo formato
+    longo cabe no orçamento, e cada bloco é anexado aos arquivos de saída. Como
+    todas as estatísticas são por ponto, o resultado é idêntico ao de uma
+    passada única. ``formato`` escolhe o escritor das saídas (ver
+    ``escrita_saida.EscritorTabela``). Com ``limiares`` (mm), grava também a
+    verificação categórica por ponto e limiar (``categorica_<par>``).
+    """
+    dados_ons, dados_tok = tipos_compactos.alinhar(tipos_compactos.compactar(padronizar_dataframe(dados_ons)),
+                                                   tipos_compactos.compactar(padronizar_dataframe(dados_tok)))
+    dias = np.union1d(dados_ons['dia'].unique(), dados_tok['dia'].unique())
+
+    pontos_por_bloco = max(len(dados_ons['ponto'].cat.categories), 1)
+    if memoria_max_mb is not None:
+        linhas = memoria_max_mb * 1024 * 1024 / BYTES_POR_LINHA_COMPARACAO
+        pontos_por_bloco = max(int(linhas // max(len(dias), 1)), 1)
+
+    # (nome, índice como coluna, float_format do CSV), na ordem de _comparar_bloco
+    tabelas = [
+        (f"comparacao_{data_label}", False, '%.2f'),
+        (f"estatisticas_por_ponto_{data_label}", True, None),
+        (f"acumulados_{data_label}", True, '%.2f'),
+        (f"comparacao_matriz_{data_label}", True, '%.2f'),
+    ]
+    if limiares is not None:
+        tabelas.append((f"categorica_{data_label}", True, None))
+    saidas = [nome_saida(nome, formato) for nome, _, _ in tabelas]
+    caminho_output.mkdir(parents=True, exist_ok=True)
+    with contextlib.ExitStack() as pilha:
+        escritores = [
+            pilha.enter_context(abrir_tabela(caminho_output / arquivo, formato, index=index, float_format=float_format))
+            for arquivo, (_, index, float_format) in zip(saidas, tabelas)
+        ]
+        for i, (ons, tok) in enumerate(_blocos_de_pontos(dados_ons, dados_tok, pontos_por_bloco)):
+            contexto = {'par': data_label, 'bloco': i}
+            tabelas_bloco = _comparar_bloco(ons, tok, dias, contexto, limiares)
+            with estagio('gravacao', **contexto) as medida:
+                for escritor, tabela in zip(escritores, tabelas_bloco):
+                    escritor.escrever(tabela)
+                medida.linhas = len(tabelas_bloco[0])
+
+    print(f"Resultados salvos em: {caminho_output}")
+    return saidas
+
 
-    dados_comparados = dados_tok.pivot(index='ponto', columns="data", values="precipitacao_mm") - dados_ons.pivot(index='ponto', columns="data", values="precipitacao_mm")
+def processar_par(pasta_ons: Path, pasta_tok: Path, caminho_output: Path, estacoes: IndiceEstacoes,
+                  cache: CacheIngestao | None = None, memoria_max_mb: float | None = None,
+                  formato: str = 'csv', historico: ArquivoHistorico | None = None,
+                  agregador: AgregadorDesempenho | None = None, limiares=None) -> list[str]:
+    """Carrega e compara um par; retorna os arquivos gravados.
 
-    dados = pd.merge(dados_ons, dados_tok, on=['ponto', 'data'], how='outer', suffixes=('_ons', '_tok'))
-    dados = dados.fillna(0)
-    dados['diferenca'] = dados['precipitacao_mm_tok'] - dados['precipitacao_mm_ons']
-    dados['diferenca_abs'] = dados['diferenca'].abs()
-    dados['diferenca_pct'] = np.where(dados['precipitacao_mm_ons'] != 0,
-                                      dados['diferenca'] / dados['precipitacao_mm_ons'] * 100, 0)
+    Com ``historico``, as duas fontes também são anexadas ao arquivo
+    histórico, no membro dado pelo número da pasta TOK. Com ``agregador``,
+    a comparação é acumulada nas estatísticas de desempenho por estação e lead.
+    Retorna vazio se faltaram dados ou se o par não entrou no arquivo
+    histórico ou no agregador, para que ele não seja registrado no manifesto
+    e seja refeito na próxima execução.
+    """
+    print(f"Comparando {pasta_ons.name} vs {pasta_tok.name}")
+    rotulo = rotulo_par(pasta_ons, pasta_tok)
 
-    caminho_output.mkdir(parents=True, exist_ok=True)
-    (caminho_output / f"comparacao_{data_label}.csv").write_text(dados.to_csv(index=False, float_format='%.2f'))
-
-    # Estatísticas por ponto
-    stats = dados.groupby('ponto').agg({
-        'precipitacao_mm_ons': ['mean', 'sum'],
-        'precipitacao_mm_tok': ['mean', 'sum'],
-        'diferenca': ['mean', 'sum', 'std']
-    }).round(2)
-    stats.columns = ['ONS_media', 'ONS_total', 'TOK_media', 'TOK_total', 'Dif_media', 'Dif_total', 'Dif_std']
-    stats.to_csv(caminho_output / f"estatisticas_por_ponto_{data_label}.csv")
-
-    # Acumulados
-    dif_pos = dados[dados['diferenca'] > 0].groupby('ponto')['diferenca'].sum()
-    dif_neg = dados[dados['diferenca'] < 0].groupby('ponto')['diferenca'].sum()
-    acumulados = pd.DataFrame({
-        'Acumulado_Positivo_mm': dif_pos,
-        'Acumulado_Negativo_mm': dif_neg,
-    }).fillna(0).round(2)
-    acumulados['Total_Liquido_mm'] = acumulados['Acumulado_Positivo_mm'] + acumulados['Acumulado_Negativo_mm']
-    acumulados.to_csv(caminho_output / f"acumulados_{data_label}.csv", float_format='%.2f')
-    dados_comparados.to_csv(caminho_output / f"comparacao_matriz_{data_label}.csv", float_format='%.2f')
+    with estagio('par', par=rotulo):
+        dados_ons = carregar_dados_fonte(pasta_ons, 'ONS', estacoes, cache)
+        dados_tok = carregar_dados_fonte(pasta_tok, 'TOK', estacoes, cache)
 
-    print(f"Resultados salvos em: {caminho_output}")
+        if dados_ons.empty:
+            print(f"Dados ONS insuficientes em {pasta_ons.name}")
+            return []
+        if dados_tok.empty:
+            print(f"Dados TOK insuficientes em {pasta_tok.name}")
+            return []
+
+        completo = True
+        if historico is not None:
+            with estagio('historico', par=rotulo):
+                completo &= arquivar_par(historico, dados_ons, dados_tok, pasta_tok)
+
+        if agregador is not None:
+            with estagio('agregador', par=rotulo):
+                completo &= agregar_par(agregador, dados_ons, dados_tok, rotulo)
+
+        saidas = comparar(dados_ons, dados_tok, caminho_output, rotulo, memoria_max_mb, formato, limiares)
+        if not completo:
+            print(f"Par não registrado no manifesto (será refeito na próxima execução): {rotulo}")
+            return []
+        return saidas
+
+
+def arquivar_par(historico: ArquivoHistorico, dados_ons: pd.DataFrame, dados_tok: pd.DataFrame,
+                 pasta_tok: Path) -> bool:
+    """Anexa ONS e TOK do par ao arquivo histórico (rodada = primeira data do par); False se falhou."""
+    dados_ons = tipos_compactos.compactar(padronizar_dataframe(dados_ons))
+    dados_tok = tipos_compactos.compactar(padronizar_dataframe(dados_tok))
+    rodada = min(dados_ons.attrs['data_base'], dados_tok.attrs['data_base'])
+    membro = int(re.search(r'c(\d+)$', pasta_tok.name, re.IGNORECASE).group(1))
+    try:
+        arquivo_historico.gravar_compacto(historico, dados_ons, 'ons', membro, rodada)
+        arquivo_historico.gravar_compacto(historico, dados_tok, 'tok', membro, rodada)
+    except ValueError as e:
+        print(f"Aviso: par não anexado ao arquivo histórico: {e}")
+        return False
+    return True
+
+
+def agregar_par(agregador: AgregadorDesempenho, dados_ons: pd.DataFrame, dados_tok: pd.DataFrame,
+                rotulo: str) -> bool:
+    """Acumula o par no agregador de desempenho (rodada = primeira data do par, lead em dias); False se falhou."""
+    dados_ons, dados_tok = tipos_compactos.alinhar(tipos_compactos.compactar(padronizar_dataframe(dados_ons)),
+                                                   tipos_compactos.compactar(padronizar_dataframe(dados_tok)))
+    alinhada = matriz_comparacao.ComparacaoAlinhada.de_compactos(dados_ons, dados_tok)
+    rodada = dados_ons.attrs['data_base']
+    try:
+        agregador.acumular(rodada, alinhada.pontos,
+                           np.where(alinhada.valido_ons, alinhada.ons, np.nan),
+                           np.where(alinhada.valido_tok, alinhada.tok, np.nan),
+                           leads=(alinhada.datas - rodada).days, chave=rotulo)
+    except ValueError as e:
+        print(f"Aviso: par não acumulado no agregador de desempenho: {e}")
+        return False
+    return True
+
+
+def rotulo_par(pasta_ons: Path, pasta_tok: Path) -> str:
+    return f"{pasta_ons.name}_vs_{pasta_tok.name}"
+
+
+# Base de estações e cache abertos uma única vez por processo do pool.
+_estacoes_worker: IndiceEstacoes | None = None
+_cache_worker: CacheIngestao | None = None
+_memoria_max_mb_worker: float | None = None
+_formato_worker: str = 'csv'
+_historico_worker: ArquivoHistorico | None = None
+_agregador_worker: AgregadorDesempenho | None = None
+_limiares_worker: list[float] | None = None
+
+
+def _iniciar_worker(estacoes_path: Path, tolerancia: float, cache: CacheIngestao | None,
+                    memoria_max_mb: float | None, formato: str = 'csv',
+                    historico: ArquivoHistorico | None = None,
+                    config_instrumentacao: dict | None = None,
+                    agregador: AgregadorDesempenho | None = None, limiares: list[float] | None = None) -> None:
+    global _estacoes_worker, _cache_worker, _memoria_max_mb_worker, _formato_worker, _historico_worker
+    global _agregador_worker, _limiares_worker
+    if config_instrumentacao is not None:
+        configurar(**config_instrumentacao)
+    _estacoes_worker = carregar_base_estacoes(estacoes_path, tolerancia)
+    _cache_worker = cache
+    _memoria_max_mb_worker = memoria_max_mb
+    _formato_worker = formato
+    _historico_worker = historico
+    _agregador_worker = agregador
+    _limiares_worker = limiares
+
+
+def _processar_par_worker(pasta_ons: Path, pasta_tok: Path, caminho_output: Path) -> tuple[str, list[str]]:
+    """Executa ``processar_par`` no worker; devolve o texto que seria impresso e as saídas."""
+    saida = io.StringIO()
+    with contextlib.redirect_stdout(saida):
+        saidas = processar_par(pasta_ons, pasta_tok, caminho_output, _estacoes_worker, _cache_worker,
+                               _memoria_max_mb_worker, _formato_worker, _historico_worker, _agregador_worker,
+                               _limiares_worker)
+    return saida.getvalue(), saidas
 
 
 def main():
@@ -155,8 +354,35 @@ def main():
     parser.add_argument('--base-dir', default='COMPARAR_CHUVA_DIARIA', help='Diretório base com ONS/ e TOK/')
     parser.add_argument('--date', default=None, help='(opcional) subpasta de data')
     parser.add_argument('--horizonte', type=int, default=43)
+    parser.add_argument('--workers', type=int, default=1, help='Processos para comparar pares em paralelo')
+    parser.add_argument('--tolerancia', type=float, default=0.0,
+                        help='Tolerância em graus para casar pontos de grade com estações')
+    parser.add_argument('--cache-dir', default=None, help='Diretório do cache Parquet das entradas')
+    parser.add_argument('--cache-max-mb', type=float, default=TAMANHO_MAX_PADRAO_MB,
+                        help='Tamanho máximo do cache em MB')
+    parser.add_argument('--sem-cache', action='store_true', help='Não usar o cache de entradas')
+    parser.add_argument('--forcar', action='store_true',
+                        help='Recalcula todos os pares, mesmo os inalterados desde a última execução')
+    parser.add_argument('--memoria-max-mb', type=float, default=None,
+                        help='Orçamento de memória (MB) da comparação; processa os pontos em blocos')
+    parser.add_argument('--output-format', choices=FORMATOS_SAIDA, default='csv',
+                        help='Formato dos arquivos de saída (parquet/feather/arrow: colunares, comprimidos)')
+    parser.add_argument('--arquivo-historico', default=None,
+                        help='Diretório do arquivo histórico (estação × rodada × lead × membro) onde anexar os dados')
+    parser.add_argument('--agregador', default=None,
+                        help='Diretório do agregador de desempenho por estação e lead (janelas de 30/90/365 dias)')
+    parser.add_argument('--limiares', type=float, nargs='+', default=None,
+                        help='Limiares em mm da verificação categórica (ex.: 1 5 10 25 50)')
+    parser.add_argument('--metricas', default=None,
+                        help='Arquivo JSON lines com as medidas de cada estágio (tempo, CPU, linhas, bytes, RSS)')
+    parser.add_argument('--perfil-estagio', default=None,
+                        help='Estágio a perfilar (leitura, estacoes, comparacao, estatisticas, categorica, gravacao, par)')
+    parser.add_argument('--perfil', choices=PERFIS, default='cprofile',
+                        help='Perfilador do --perfil-estagio')
     args = parser.parse_args()
 
+    configurar(args.metricas, 'compara_chuva_diaria', args.perfil_estagio, args.perfil)
+
     base = Path(args.base_dir)
     if args.date:
         base = base / args.date
@@ -170,7 +396,7 @@ def main():
 
     caminho_output = base / 'Output'
     estacoes_path = Path(__file__).resolve().parent / 'base_de_estacoes.csv'
-    estacoes = carregar_base_estacoes(estacoes_path)
+    cache = None if args.sem_cache else CacheIngestao(args.cache_dir, args.cache_max_mb)
 
     ons_pastas = {}
     for pasta in caminho_ons.iterdir() if caminho_ons.exists() else []:
@@ -186,28 +412,84 @@ def main():
             if match:
                 tok_pastas[int(match.group(1))] = pasta
 
+    manifesto = Manifesto(caminho_output)
+    impressao_estacoes = impressao_digital(estacoes_path)
+    entradas_par = {}
+
+    pares = []
     for tok_num in sorted(tok_pastas.keys()):
         ons_num = tok_num - 1
         if ons_num not in ons_pastas:
-            print(f"Sem pasta ONS equivalente para TOK c{tok_num}")
-            continue
-
-        pasta_ons = ons_pastas[ons_num]
-        pasta_tok = tok_pastas[tok_num]
-        print(f"Comparando {pasta_ons.name} vs {pasta_tok.name}")
-
-        dados_ons = carregar_dados_fonte(pasta_ons, 'ONS', estacoes)
-        dados_tok = carregar_dados_fonte(pasta_tok, 'TOK', estacoes)
-
-        if dados_ons.empty:
-            print(f"Dados ONS insuficientes em {pasta_ons.name}")
+            pares.append(f"Sem pasta ONS equivalente para TOK c{tok_num}")
             continue
-        if dados_tok.empty:
-            print(f"Dados TOK insuficientes em {pasta_tok.name}")
+        pasta_ons, pasta_tok = ons_pastas[ons_num], tok_pastas[tok_num]
+        rotulo = rotulo_par(pasta_ons, pasta_tok)
+        entradas_par[rotulo] = {
+            'ons': impressao_digital(pasta_ons),
+            'tok': impressao_digital(pasta_tok),
+            'estacoes': impressao_estacoes,
+            'tolerancia': args.tolerancia,
+            'formato': args.output_format,
+            'historico': str(Path(args.arquivo_historico).resolve()) if args.arquivo_historico else None,
+        }
+        # Opções mais novas só entram quando usadas, para não invalidar manifestos antigos
+        if args.agregador:
+            entradas_par[rotulo]['agregador'] = str(Path(args.agregador).resolve())
+        if args.limiares:
+            entradas_par[rotulo]['limiares'] = args.limiares
+        if not args.forcar and manifesto.atualizado(rotulo, entradas_par[rotulo]):
+            pares.append(f"Sem alterações desde a última execução: {rotulo}")
             continue
-
-        data_label = f"{pasta_ons.name}_vs_{pasta_tok.name}"
-        comparar(dados_ons, dados_tok, caminho_output, data_label)
+        pares.append((pasta_ons, pasta_tok))
+
+    if all(isinstance(par, str) for par in pares):
+        # Nada a comparar: sai sem importar pandas nem abrir o arquivo histórico ou o agregador.
+        for par in pares:
+            print(par)
+        return
+
+    historico = None
+    if args.arquivo_historico:
+        # Leads e membros dimensionados pelos dados; o arquivo cresce se vierem maiores
+        historico = arquivo_historico.ArquivoHistorico(
+            args.arquivo_historico, arquivo_historico.estacoes_base(estacoes_path),
+            n_membros=max(tok_pastas, default=0) + 1)
+
+    agregador = None
+    if args.agregador:
+        agregador = agregador_desempenho.AgregadorDesempenho(
+            args.agregador, arquivo_historico.estacoes_base(estacoes_path))
+
+    def registrar(par, saidas):
+        if saidas:
+            manifesto.registrar(rotulo_par(*par), entradas_par[rotulo_par(*par)], saidas)
+
+    if args.workers <= 1:
+        estacoes = carregar_base_estacoes(estacoes_path, args.tolerancia)
+        for par in pares:
+            if isinstance(par, str):
+                print(par)
+                continue
+            registrar(par, processar_par(*par, caminho_output, estacoes, cache, args.memoria_max_mb,
+                                            args.output_format, historico, agregador, args.limiares))
+        return
+
+    # Relatório impresso na ordem dos pares, independente da ordem de término.
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_iniciar_worker,
+                             initargs=(estacoes_path, args.tolerancia, cache, args.memoria_max_mb,
+                                       args.output_format, historico, configuracao(), agregador,
+                                       args.limiares)) as pool:
+        resultados = [
+            par if isinstance(par, str) else pool.submit(_processar_par_worker, *par, caminho_output)
+            for par in pares
+        ]
+        for par, resultado in zip(pares, resultados):
+            if isinstance(resultado, str):
+                print(resultado)
+                continue
+            texto, saidas = resultado.result()
+            print(texto, end='')
+            registrar(par, saidas)
 
 
 if __name__ == '__main__':
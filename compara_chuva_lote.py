@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""Executa o pipeline do notebook compara_chuva.ipynb em lote, sem Jupyter.
+
+Para cada (modelo, rodada): baixa o zip do ONS e o tar.gz do TOK (ver
+``download``), monta ``precipitacao_ons.csv`` e ``precipitacao_tok.csv`` como a
+seção 1.1 do notebook, compara as duas fontes e grava em
+``<diretorio-base>/<modelo>/<rodada>/Output`` as mesmas tabelas, figuras e o
+relatório consolidado do notebook.
+
+Imports e tabela de estações são carregados uma vez por processo; rodadas
+independentes rodam em paralelo em um pool de processos. As figuras são
+desenhadas por ``renderizacao``, que também pode dividir as partes de cada
+figura entre processos (``--workers-graficos``).
+
+Uso:
+    python compara_chuva_lote.py --modelos ECMWF GEFS --inicio 20260101 --fim 20260131 --workers 4
+
+Opções:
+    --modelos        modelos a processar (padrão: ECMWF)
+    --inicio, --fim  intervalo de rodadas (YYYYMMDD, inclusivo; --fim padrão = --inicio)
+    --datas          lista explícita de rodadas (no lugar de --inicio/--fim)
+    --horizonte      horizonte de previsão informado no relatório (padrão: 15)
+    --diretorio-base raiz com as pastas <modelo>/<rodada> (padrão: diretório atual)
+    --workers        rodadas processadas em paralelo (padrão: 1)
+    --workers-download transferências simultâneas (padrão: 4)
+    --sem-download   usa apenas os arquivos já presentes nas pastas ONS/TOK
+    --local          raiz local que substitui o Google Storage no download (testes)
+    --sem-graficos   grava só as tabelas e o relatório
+    --workers-graficos processos que desenham as partes das figuras de cada rodada (padrão: 1)
+    --metricas       arquivo JSON lines com as medidas de cada estágio por rodada
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import traceback
+
+import pandas as pd
+
+from cache_ingestao import CacheIngestao
+from compara_chuva_diaria import padronizar_dataframe
+from download import (BUCKET_ONS, BUCKET_TOK, ArmazenamentoGoogle, ArmazenamentoLocal, baixar_todos,
+                      transferencias_rodada)
+from escrita_saida import escrever_atomico
+from ingestao import ler_bloco_compactado, membros_dat
+from instrumentacao import configuracao, configurar, estagio
+from matriz_comparacao import ComparacaoAlinhada
+from renderizacao import partes_acumulados, partes_heatmap, partes_histograma_boxplot, renderizar
+
+
+ARQUIVO_ESTACOES = Path(__file__).resolve().parent / 'base_de_estacoes.csv'
+
+# Estado carregado uma vez por processo (ver ``iniciar``)
+_base_estacoes: pd.DataFrame | None = None
+_cache: CacheIngestao | None = None
+_graficos = True
+_workers_graficos = 1
+
+
+def iniciar(graficos: bool = True, config_instrumentacao: dict | None = None, workers_graficos: int = 1) -> None:
+    """Prepara o processo: tabela de estações, cache de entradas e opções das figuras."""
+    global _base_estacoes, _cache, _graficos, _workers_graficos
+    _graficos = graficos
+    _workers_graficos = workers_graficos
+    if config_instrumentacao is not None:
+        configurar(**config_instrumentacao)
+    _base_estacoes = pd.read_csv(ARQUIVO_ESTACOES, sep=",")
+    _cache = CacheIngestao()
+
+
+def caminhos_rodada(diretorio_base: Path, nome_modelo: str, data_rodada: str) -> tuple[Path, Path, Path]:
+    """Pastas ONS, TOK e Output de uma rodada, como na seção 1 do notebook."""
+    caminho_input = Path(diretorio_base) / nome_modelo / data_rodada
+    return caminho_input / 'ONS', caminho_input / 'TOK', caminho_input / 'Output'
+
+
+def montar_csv_ons(arquivo_zip: Path, nome_modelo: str, data_rodada: str) -> pd.DataFrame:
+    """Lê o ``<modelo>_m_<ddmmyy>.dat`` direto do zip e monta o formato longo (ponto, data, precipitacao_mm)."""
+    rodada = datetime.strptime(data_rodada, '%Y%m%d')
+    arquivo_m = f"{nome_modelo}_m_{rodada:%d%m%y}.dat"
+    ons_data = None
+    for _, fluxo in membros_dat(arquivo_zip, [arquivo_m]):
+        ons_data = pd.read_csv(fluxo, header=None, sep='\\s+')
+    if ons_data is None:
+        raise FileNotFoundError(f"{arquivo_m} não encontrado em {arquivo_zip}")
+    ons_data.columns = ['psat', 'lat', 'lon'] + [f'{rodada + timedelta(1 + i):%Y-%m-%d}'
+                                                 for i in range(len(ons_data.columns) - 3)]
+    ons_data = ons_data.drop(columns=['lat', 'lon'])
+    ons_data = pd.melt(ons_data, id_vars=['psat'], var_name='data', value_name='precipitacao_mm')
+    ons_data.columns = ['ponto', 'data', 'precipitacao_mm']
+    return ons_data
+
+
+def montar_csv_tok(arquivo_tar: Path) -> pd.DataFrame:
+    """Lê os .dat direto do tar.gz e associa as estações por lat/lon."""
+    bloco_tok = ler_bloco_compactado([arquivo_tar])
+    tok_data = pd.DataFrame({
+        'lon': bloco_tok['lon'],
+        'lat': bloco_tok['lat'],
+        'data': pd.to_datetime(bloco_tok['data'], unit='D').strftime('%Y-%m-%d'),
+        'precipitacao_mm': bloco_tok['precipitacao_mm'],
+    })
+    tok_data = pd.merge(_base_estacoes.rename(columns={'ana_code': 'ponto'}), tok_data, on=['lat', 'lon'],
+                        how="right")
+    return tok_data[['ponto', 'data', 'precipitacao_mm']]
+
+
+def preparar_entradas(diretorio_base: Path, nome_modelo: str, data_rodada: str) -> None:
+    """Converte os arquivos baixados nos CSVs lidos pela comparação e remove os pacotes."""
+    caminho_ons, caminho_tok, _ = caminhos_rodada(diretorio_base, nome_modelo, data_rodada)
+    arquivo_ons, arquivo_tok = (t.destino for t in transferencias_rodada(nome_modelo, data_rodada, diretorio_base))
+    if arquivo_ons.exists():
+        ons_data = montar_csv_ons(arquivo_ons, nome_modelo, data_rodada)
+        escrever_atomico(caminho_ons / "precipitacao_ons.csv", lambda tmp: ons_data.to_csv(tmp, index=False))
+        arquivo_ons.unlink()
+    if arquivo_tok.exists():
+        tok_data = montar_csv_tok(arquivo_tok)
+        escrever_atomico(caminho_tok / "precipitacao_tok.csv", lambda tmp: tok_data.to_csv(tmp, index=False))
+        arquivo_tok.unlink()
+
+
+def carregar_fonte(caminho: Path, fonte: str) -> pd.DataFrame:
+    """Primeiro CSV, Excel ou Parquet da pasta, como ``carregar_dados_fonte`` do notebook."""
+    arquivos_csv = sorted(caminho.glob("*.csv"))
+    arquivos_excel = sorted(caminho.glob("*.xlsx")) + sorted(caminho.glob("*.xls"))
+    arquivos_parquet = sorted(caminho.glob("*.parquet"))
+    if arquivos_csv:
+        return _cache.ler(arquivos_csv[0], pd.read_csv)
+    if arquivos_excel:
+        return _cache.ler(arquivos_excel[0], pd.read_excel)
+    if arquivos_parquet:
+        return pd.read_parquet(arquivos_parquet[0])
+    raise FileNotFoundError(f"Nenhum arquivo de dados {fonte} encontrado em {caminho}")
+
+
+def _lista(serie: pd.Series) -> str:
+    return "\n".join([f"  - {idx}: {val:.2f} mm" for idx, val in serie.items()])
+
+
+def montar_relatorio(nome_modelo: str, horizonte: int, data_rodada: str, dados_comparacao: pd.DataFrame,
+                     stats_por_ponto: pd.DataFrame, acumulados: pd.DataFrame, top_n: int = 10) -> str:
+    """Texto do relatório consolidado (seção 13 do notebook, que também usa esta função)."""
+    dif_total_ordenado = stats_por_ponto['Dif_total'].sort_values(ascending=False)
+    acum_ordenado = acumulados['Total_Liquido_mm'].sort_values(ascending=False)
+    diferenca = dados_comparacao['diferenca']
+    return f"""
+{'='*80}
+RELATÓRIO DE COMPARAÇÃO DE PRECIPITAÇÃO - ONS vs TOK
+{'='*80}
+Modelo: {nome_modelo}
+Horizonte: {horizonte}
+Data da Rodada: {data_rodada}
+
+{'='*80}
+ESTATÍSTICAS GERAIS
+{'='*80}
+
+Total de registros comparados: {dados_comparacao.shape[0]}
+Número de pontos de interesse: {dados_comparacao['ponto'].nunique()}
+Período analisado: {dados_comparacao['data'].min()} a {dados_comparacao['data'].max()}
+
+Precipitação Total ONS: {dados_comparacao['precipitacao_mm_ons'].sum():.2f} mm
+Precipitação Total TOK: {dados_comparacao['precipitacao_mm_tok'].sum():.2f} mm
+
+{'='*80}
+ANÁLISE DAS DIFERENÇAS
+{'='*80}
+
+Diferença Média: {diferenca.mean():.2f} mm
+Desvio Padrão das Diferenças: {diferenca.std():.2f} mm
+Diferença Mínima: {diferenca.min():.2f} mm
+Diferença Máxima: {diferenca.max():.2f} mm
+
+Acumulado de Diferenças Positivas: {acumulados['Acumulado_Positivo_mm'].sum():.2f} mm
+Acumulado de Diferenças Negativas: {acumulados['Acumulado_Negativo_mm'].sum():.2f} mm
+Diferença Líquida Total: {acumulados['Total_Liquido_mm'].sum():.2f} mm
+
+Percentual de registros com ONS > TOK: {(diferenca > 0).sum() / len(dados_comparacao) * 100:.1f}%
+Percentual de registros com ONS < TOK: {(diferenca < 0).sum() / len(dados_comparacao) * 100:.1f}%
+Percentual de registros com ONS = TOK: {(diferenca == 0).sum() / len(dados_comparacao) * 100:.1f}%
+
+{'='*80}
+PONTOS COM MAIORES E MENORES DIFERENÇAS (Dif_total)
+{'='*80}
+
+Maiores diferenças (top {top_n}):
+{_lista(dif_total_ordenado.head(top_n))}
+
+Menores diferenças (bottom {top_n}):
+{_lista(dif_total_ordenado.tail(top_n).sort_values())}
+
+Máximo entre pontos: {dif_total_ordenado.max():.2f} mm
+Mínimo entre pontos: {dif_total_ordenado.min():.2f} mm
+
+{'='*80}
+PONTOS COM MAIORES E MENORES DIFERENÇAS ACUMULADAS (Total_Liquido_mm)
+{'='*80}
+
+Maiores acumuladas (top {top_n}):
+{_lista(acum_ordenado.head(top_n))}
+
+Menores acumuladas (bottom {top_n}):
+{_lista(acum_ordenado.tail(top_n).sort_values())}
+
+Máximo entre pontos: {acum_ordenado.max():.2f} mm
+Mínimo entre pontos: {acum_ordenado.min():.2f} mm
+...
+"""
+
+
+def processar_rodada(diretorio_base: Path, nome_modelo: str, data_rodada: str, horizonte: int = 15) -> list[Path]:
+    """Pipeline completo do notebook para uma rodada; retorna os arquivos gravados em Output."""
+    if _base_estacoes is None:
+        iniciar()
+    contexto = {'modelo': nome_modelo, 'rodada': data_rodada}
+    caminho_ons, caminho_tok, caminho_output = caminhos_rodada(diretorio_base, nome_modelo, data_rodada)
+    caminho_output.mkdir(parents=True, exist_ok=True)
+
+    with estagio('leitura', **contexto) as medida:
+        preparar_entradas(diretorio_base, nome_modelo, data_rodada)
+        dados_ons = padronizar_dataframe(carregar_fonte(caminho_ons, 'ONS'))
+        dados_tok = padronizar_dataframe(carregar_fonte(caminho_tok, 'TOK'))
+        medida.linhas = len(dados_ons) + len(dados_tok)
+
+    with estagio('comparacao', **contexto) as medida:
+        comparacao = ComparacaoAlinhada.de_frames(dados_ons, dados_tok, diferenca='ons-tok')
+        dados_comparacao = comparacao.tabela_longa()
+        stats_por_ponto = comparacao.estatisticas_por_ponto().round(2)
+        stats_por_ponto = stats_por_ponto.rename(columns={'Dif_std': 'Dif_desvio_padrao'})
+        acumulados = comparacao.acumulados()
+        tabela_desvios = pd.DataFrame({'Desvio_Padrao_mm': stats_por_ponto['Dif_desvio_padrao']})
+        dados_comparacao['data'] = dados_comparacao['data'].dt.strftime('%Y-%m-%d')
+        matriz_diferencas = dados_comparacao.pivot_table(index='ponto', columns='data', values='diferenca',
+                                                         aggfunc='mean').fillna(0)
+        medida.linhas = len(dados_comparacao)
+
+    subtitulo = f"{nome_modelo} - {data_rodada}"
+    gravados = []
+    with estagio('gravacao', **contexto):
+        tabelas = {
+            f"estatisticas_por_ponto_{data_rodada}.csv": stats_por_ponto,
+            f"acumulados_diferencas_{data_rodada}.csv": acumulados,
+            f"desvio_padrao_diferencas_{data_rodada}.csv": tabela_desvios,
+            f"matriz_diferencas_{data_rodada}.csv": matriz_diferencas,
+        }
+        for nome, tabela in tabelas.items():
+            tabela.to_csv(caminho_output / nome)
+            gravados.append(caminho_output / nome)
+        arquivo_relatorio = caminho_output / f"relatorio_consolidado_{nome_modelo}_{data_rodada}.txt"
+        arquivo_relatorio.write_text(montar_relatorio(nome_modelo, horizonte, data_rodada, dados_comparacao,
+                                                      stats_por_ponto, acumulados), encoding='utf-8')
+        gravados.append(arquivo_relatorio)
+
+    if _graficos:
+        with estagio('graficos', **contexto):
+            matriz_dif_abs = dados_comparacao.pivot_table(index='ponto', columns='data', values='diferenca_abs',
+                                                          aggfunc='mean').fillna(0)
+            figuras = {
+                caminho_output / f"heatmap_diferencas_{data_rodada}.png": partes_heatmap(
+                    matriz_diferencas, f'Heatmap de Diferenças (ONS - TOK)\n{subtitulo}', 'Diferença (mm)',
+                    cmap='bwr', vmin=-50, vmax=50),
+                caminho_output / f"heatmap_diferencas_absolutas_{data_rodada}.png": partes_heatmap(
+                    matriz_dif_abs, f'Heatmap de Diferenças Absolutas (|ONS - TOK|)\n{subtitulo}',
+                    'Diferença Absoluta (mm)', cmap='Reds', vmin=0, vmax=50),
+                caminho_output / f"graficos_acumulados_{data_rodada}.png": partes_acumulados(
+                    acumulados, tabela_desvios['Desvio_Padrao_mm'], subtitulo),
+                caminho_output / f"histograma_boxplot_diferencas_{data_rodada}.png": partes_histograma_boxplot(
+                    dados_comparacao, subtitulo),
+            }
+            gravados.extend(renderizar(figuras, _workers_graficos))
+    return gravados
+
+
+def _processar(tarefa: tuple) -> tuple[str, str, int, str | None]:
+    diretorio_base, nome_modelo, data_rodada, horizonte = tarefa
+    try:
+        gravados = processar_rodada(diretorio_base, nome_modelo, data_rodada, horizonte)
+        return nome_modelo, data_rodada, len(gravados), None
+    except Exception:
+        return nome_modelo, data_rodada, 0, traceback.format_exc()
+
+
+def rodadas_pedidas(inicio: str | None, fim: str | None, datas: list[str] | None) -> list[str]:
+    if datas:
+        return sorted(set(datas))
+    if inicio is None:
+        raise ValueError("Informe --inicio/--fim ou --datas")
+    return [f"{d:%Y%m%d}" for d in pd.date_range(pd.to_datetime(inicio, format='%Y%m%d'),
+                                                   pd.to_datetime(fim or inicio, format='%Y%m%d'), freq='D')]
+
+
+def baixar_pendentes(diretorio_base: Path, tarefas: list[tuple[str, str]], local: str | None = None,
+                     workers: int = 4) -> list:
+    """Baixa os pacotes das rodadas cujo CSV ainda não foi montado."""
+    transferencias = []
+    for nome_modelo, data_rodada in tarefas:
+        caminho_ons, caminho_tok, _ = caminhos_rodada(diretorio_base, nome_modelo, data_rodada)
+        ons, tok = transferencias_rodada(nome_modelo, data_rodada, diretorio_base)
+        if not (caminho_ons / "precipitacao_ons.csv").exists():
+            transferencias.append(ons)
+        if not (caminho_tok / "precipitacao_tok.csv").exists():
+            transferencias.append(tok)
+    if not transferencias:
+        return []
+    if local:
+        armazenamentos = {b: ArmazenamentoLocal(local, b) for b in (BUCKET_ONS, BUCKET_TOK)}
+    else:
+        armazenamentos = {b: ArmazenamentoGoogle(b) for b in (BUCKET_ONS, BUCKET_TOK)}
+    return baixar_todos(transferencias, armazenamentos, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pipeline do notebook compara_chuva em lote, por modelo e rodada')
+    parser.add_argument('--modelos', nargs='+', default=['ECMWF'])
+    parser.add_argument('--inicio', default=None, help='Primeira rodada (YYYYMMDD)')
+    parser.add_argument('--fim', default=None, help='Última rodada (YYYYMMDD, padrão: --inicio)')
+    parser.add_argument('--datas', nargs='+', default=None, help='Rodadas avulsas (YYYYMMDD)')
+    parser.add_argument('--horizonte', type=int, default=15)
+    parser.add_argument('--diretorio-base', default='.')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--workers-download', type=int, default=4)
+    parser.add_argument('--sem-download', action='store_true')
+    parser.add_argument('--local', default=None, help='Raiz local que substitui o Google Storage')
+    parser.add_argument('--sem-graficos', action='store_true')
+    parser.add_argument('--workers-graficos', type=int, default=1)
+    parser.add_argument('--metricas', default=None, help='Arquivo JSON lines com as medidas por estágio')
+    args = parser.parse_args()
+
+    try:
+        rodadas = rodadas_pedidas(args.inicio, args.fim, args.datas)
+    except ValueError as e:
+        parser.error(str(e))
+    diretorio_base = Path(args.diretorio_base)
+    configurar(args.metricas, 'compara_chuva_lote')
+    pares = [(modelo, rodada) for modelo in args.modelos for rodada in rodadas]
+
+    if not args.sem_download:
+        with estagio('download', rodadas=len(pares)):
+            falhas = [r for r in baixar_pendentes(diretorio_base, pares, args.local, args.workers_download)
+                      if r.status == 'falha']
+        for falha in falhas:
+            print(f"  ✗ download {falha.transferencia.origem}: {falha.erro}")
+
+    tarefas = [(diretorio_base, modelo, rodada, args.horizonte) for modelo, rodada in pares]
+    erros = 0
+    if args.workers > 1 and len(tarefas) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=iniciar,
+                                 initargs=(not args.sem_graficos, configuracao(), args.workers_graficos)) as pool:
+            for resultado in pool.map(_processar, tarefas):
+                erros += _relatar(*resultado)
+    else:
+        iniciar(not args.sem_graficos, workers_graficos=args.workers_graficos)
+        for tarefa in tarefas:
+            erros += _relatar(*_processar(tarefa))
+
+    print(f"{len(tarefas) - erros}/{len(tarefas)} rodadas processadas")
+    if erros:
+        raise SystemExit(1)
+
+
+def _relatar(nome_modelo: str, data_rodada: str, n_arquivos: int, erro: str | None) -> int:
+    if erro is None:
+        print(f"  ✓ {nome_modelo} {data_rodada}: {n_arquivos} arquivos")
+        return 0
+    print(f"  ✗ {nome_modelo} {data_rodada}:\n{erro}")
+    return 1
+
+
+if __name__ == '__main__':
+    main()
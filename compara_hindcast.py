@@ -3,26 +3,61 @@
 Script para comparar dados de hindcast ONS vs TOK
 Mapeia dados TOK (smap_basin_id) com dados ONS (estações com lat/lon)
 Gera arquivo de saída com apenas lat, lon e valores de comparação
+
+Cada (data de hindcast, membro) é uma tarefa independente; as tarefas rodam
+em um pool de processos e cada uma concluída é registrada no manifesto da
+pasta de saída da data, então uma execução interrompida continua de onde
+parou. Exemplo, dois anos de hindcasts com 8 processos:
+
+    python compara_hindcast.py --inicio 20240101 --fim 20251231 --membros 0-100 --workers 8 \
+        --ons-dir HINDCAST/ONS --tok-dir HINDCAST/TOK --output-dir COMPARACAO_HINDCAST
+
+Arquivos de entrada de uma data DDMMAA:
+    ONS: <ons-dir>/ECMWFf_m_DDMMAA_p{membro}.dat
+    TOK: <tok-dir>/DDMMAA/EC45_m{membro}.csv (ou <tok-dir>/EC45_m{membro}.csv, se a subpasta não existir)
+Saídas em <output-dir>/DDMMAA/.
 """
 
-import pandas as pd
-import numpy as np
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from typing import NamedTuple
+import argparse
+import contextlib
+import hashlib
+import io
+import re
 import warnings
 warnings.filterwarnings('ignore')
 
+from escrita_saida import FORMATOS_SAIDA, escrever_tabela, nome_saida
+from importacao_tardia import modulo_tardio
+from instrumentacao import PERFIS, configuracao, configurar, estagio
+from manifesto import Manifesto, impressao_digital
+
+# Importados só no primeiro uso, para que --help responda sem carregar pandas/SciPy.
+pd = modulo_tardio('pandas')
+np = modulo_tardio('numpy')
+scipy = modulo_tardio('scipy')
+arquivo_historico = modulo_tardio('arquivo_historico')
+verificacao_categorica = modulo_tardio('verificacao_categorica')
+
 # Configurações
 ONS_DIR = Path('/media/HD/PROJETOS/GITHUB/compara-chuva/COMPARAR_HINDCAST/ONS')
 TOK_DIR = Path('/media/HD/PROJETOS/GITHUB/compara-chuva/COMPARAR_HINDCAST/TOK')
 ESTACOES_FILE = Path('/media/HD/PROJETOS/GITHUB/compara-chuva/base_de_estacoes.csv')
 OUTPUT_DIR = Path('/media/HD/PROJETOS/GITHUB/compara-chuva/COMPARACAO_HINDCAST')
 
-# Criar diretório de saída
-OUTPUT_DIR.mkdir(exist_ok=True)
+N_MEMBROS = 102
+DATA_PADRAO = '210126'
+
+# Raio médio da Terra (km), usado para converter distâncias na esfera
+RAIO_TERRA_KM = 6371.0088
 
-def load_estacoes():
+def load_estacoes(caminho=None):
     """Carrega arquivo de estações e cria mapping smap_basin_id -> lat/lon"""
-    estacoes = pd.read_csv(ESTACOES_FILE)
+    estacoes = pd.read_csv(caminho or ESTACOES_FILE)
     # Criar dicionário: smap_basin_id -> (lat, lon, ana_code)
     mapping = {}
     for _, row in estacoes.iterrows():
@@ -74,131 +109,624 @@ def parse_tok_file(filepath):
     
     return data
 
-def compare_hindcasts(ons_data, tok_data, estacoes_mapping, prefix_p):
+def _unit_vectors(lat, lon):
+    """Converte lat/lon (graus) em vetores unitários 3D na esfera"""
+    lat_r = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_r = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat_r)
+    return np.column_stack([cos_lat * np.cos(lon_r), cos_lat * np.sin(lon_r), np.sin(lat_r)])
+
+
+class BasinIndex:
+    """
+    Índice espacial (KD-tree) sobre as coordenadas das bacias
+    Consulta o basin mais próximo de vários pontos de uma vez; a distância
+    em linha reta entre vetores unitários é convertida para km no grande círculo
+    """
+
+    def __init__(self, estacoes_mapping, basin_ids=None):
+        if basin_ids is None:
+            basin_ids = estacoes_mapping.keys()
+        self.basin_ids = np.array(sorted(basin_ids), dtype=np.int64)
+        lats = [estacoes_mapping[b]['lat'] for b in self.basin_ids]
+        lons = [estacoes_mapping[b]['lon'] for b in self.basin_ids]
+        self._mapping = estacoes_mapping
+        self._tree = scipy.spatial.cKDTree(_unit_vectors(lats, lons))
+        self._restricted = {}
+
+    def restrict(self, basin_ids):
+        """Índice apenas com os basins informados (reaproveitado entre membros)"""
+        key = frozenset(int(b) for b in basin_ids)
+        if key == frozenset(self.basin_ids.tolist()):
+            return self
+        if key not in self._restricted:
+            self._restricted[key] = BasinIndex(self._mapping, key)
+        return self._restricted[key]
+
+    def query(self, lats, lons):
+        """Retorna (basin_ids, distancias_km) do basin mais próximo de cada ponto"""
+        corda, pos = self._tree.query(_unit_vectors(lats, lons))
+        distancia_km = 2 * RAIO_TERRA_KM * np.arcsin(np.clip(corda / 2, 0, 1))
+        return self.basin_ids[pos], distancia_km
+
+
+def match_basins(ons_data, tok_data, estacoes_mapping, basin_index=None):
+    """
+    Basin TOK mais próximo de cada estação ONS, entre os basins com coordenadas conhecidas
+    Retorna (basin_ids, distancias_km), ou None se não houver o que comparar
+    """
+    # Basins do TOK com coordenadas conhecidas
+    disponiveis = [basin_id for basin_id in tok_data if basin_id in estacoes_mapping]
+    if not ons_data or not disponiveis:
+        return None
+
+    if basin_index is None:
+        basin_index = BasinIndex(estacoes_mapping)
+    basin_index = basin_index.restrict(disponiveis)
+
+    # Basin mais próximo de todas as estações ONS em uma única consulta
+    lats = np.array([ons_station['lat'] for ons_station in ons_data])
+    lons = np.array([ons_station['lon'] for ons_station in ons_data])
+    return basin_index.query(lats, lons)
+
+def compare_hindcasts(ons_data, tok_data, estacoes_mapping, prefix_p, basin_index=None):
     """
     Compara dados ONS com TOK
     Retorna DataFrame com: [lat, lon, estacao, diferenca_media, rmse, correlacao]
     """
     resultados = []
-    
-    # Para cada estação ONS
-    for ons_station in ons_data:
+
+    casamento = match_basins(ons_data, tok_data, estacoes_mapping, basin_index)
+    if casamento is None:
+        return pd.DataFrame(resultados)
+    basin_ids, distancias_km = casamento
+
+    for ons_station, basin_id, distancia_km in zip(ons_data, basin_ids.tolist(), distancias_km):
         estacao = ons_station['estacao']
-        lat = ons_station['lat']
-        lon = ons_station['lon']
         ons_valores = ons_station['valores']
-        
-        # Encontrar correspondência no arquivo TOK
-        # A correspondência é feita por posição/ordem na lista
-        station_idx = ons_data.index(ons_station)
-        
-        # TOK tem basin IDs 1-11, deve haver correspondência
-        # Vamos procurar o basin_id que melhor corresponde
-        best_match = None
-        best_distance = float('inf')
-        
-        for basin_id, tok_valores in tok_data.items():
-            # Pegar coordenadas do basin_id
-            if basin_id in estacoes_mapping:
-                mapping_info = estacoes_mapping[basin_id]
-                basin_lat = mapping_info['lat']
-                basin_lon = mapping_info['lon']
-                
-                # Calcular distância
-                distance = np.sqrt((lat - basin_lat)**2 + (lon - basin_lon)**2)
-                
-                if distance < best_distance:
-                    best_distance = distance
-                    best_match = (basin_id, tok_valores, basin_lat, basin_lon)
-        
-        if best_match is not None:
-            basin_id, tok_valores, basin_lat, basin_lon = best_match
-            
-            # Calcular estatísticas
-            # Usar o menor tamanho para evitar erros
-            min_len = min(len(ons_valores), len(tok_valores))
-            ons_sub = ons_valores[:min_len]
-            tok_sub = tok_valores[:min_len]
-            
-            # Diferença média
-            diff_media = np.mean(np.abs(ons_sub - tok_sub))
-            
-            # RMSE
-            rmse = np.sqrt(np.mean((ons_sub - tok_sub)**2))
-            
-            # Correlação
-            if np.std(ons_sub) > 0 and np.std(tok_sub) > 0:
-                correlacao = np.corrcoef(ons_sub, tok_sub)[0, 1]
-            else:
-                correlacao = np.nan
-            
-            resultados.append({
-                'lat': lat,
-                'lon': lon,
-                'estacao_ons': estacao,
-                'basin_id_tok': basin_id,
-                'estacao_tok': estacoes_mapping[basin_id]['ana_code'],
-                'diferenca_media': diff_media,
-                'rmse': rmse,
-                'correlacao': correlacao,
-                'distancia_km': best_distance
-            })
-    
+        tok_valores = tok_data[basin_id]
+
+        # Calcular estatísticas
+        # Usar o menor tamanho para evitar erros
+        min_len = min(len(ons_valores), len(tok_valores))
+        ons_sub = ons_valores[:min_len]
+        tok_sub = tok_valores[:min_len]
+
+        # Diferença média
+        diff_media = np.mean(np.abs(ons_sub - tok_sub))
+
+        # RMSE
+        rmse = np.sqrt(np.mean((ons_sub - tok_sub)**2))
+
+        # Correlação
+        if np.std(ons_sub) > 0 and np.std(tok_sub) > 0:
+            correlacao = np.corrcoef(ons_sub, tok_sub)[0, 1]
+        else:
+            correlacao = np.nan
+
+        resultados.append({
+            'lat': ons_station['lat'],
+            'lon': ons_station['lon'],
+            'estacao_ons': estacao,
+            'basin_id_tok': basin_id,
+            'estacao_tok': estacoes_mapping[basin_id]['ana_code'],
+            'diferenca_media': diff_media,
+            'rmse': rmse,
+            'correlacao': correlacao,
+            'distancia_km': distancia_km
+        })
+
     return pd.DataFrame(resultados)
 
-def main():
-    print("=== Comparação de Hindcast ONS vs TOK ===\n")
-    
-    # Carregar mapping de estações
-    print("1. Carregando arquivo base_de_estacoes.csv...")
-    estacoes_mapping = load_estacoes()
-    print(f"   - Encontrados {len(estacoes_mapping)} basin IDs\n")
-    
-    # Processar cada arquivo pX
-    for p in range(102):
-        print(f"2.{p} Processando arquivo p{p}...")
-        
-        ons_file = ONS_DIR / f'ECMWFf_m_210126_p{p}.dat'
-        tok_file = TOK_DIR / f'EC45_m{p}.csv'
-        output_file = OUTPUT_DIR / f'comparacao_p{p}.csv'
-        
+def categorical_hindcasts(ons_data, tok_data, estacoes_mapping, limiares=None, basin_index=None):
+    """
+    Verificação categórica por estação e limiar (POD, FAR, CSI, ETS, viés de frequência)
+    Usa o mesmo casamento estação-basin e os mesmos leads (o menor tamanho) de compare_hindcasts
+    Todos os limiares e estações são contados de uma vez sobre a matriz estação × lead
+    Sem limiares, usa verificacao_categorica.LIMIARES_PADRAO
+    """
+    if limiares is None:
+        limiares = verificacao_categorica.LIMIARES_PADRAO
+    casamento = match_basins(ons_data, tok_data, estacoes_mapping, basin_index)
+    if casamento is None:
+        return pd.DataFrame()
+    basin_ids = casamento[0].tolist()
+
+    n_leads = max(len(s['valores']) for s in ons_data)
+    ons = np.full((len(ons_data), n_leads), np.nan, dtype=np.float32)
+    tok = np.full((len(ons_data), n_leads), np.nan, dtype=np.float32)
+    for i, (ons_station, basin_id) in enumerate(zip(ons_data, basin_ids)):
+        min_len = min(len(ons_station['valores']), len(tok_data[basin_id]))
+        ons[i, :min_len] = ons_station['valores'][:min_len]
+        tok[i, :min_len] = tok_data[basin_id][:min_len]
+
+    tabela = verificacao_categorica.tabela_categorica(
+        ons, tok, limiares, eixos=1, grupos={'estacao_ons': [s['estacao'] for s in ons_data]})
+    tabela = tabela.reset_index()
+    tabela.insert(1, 'estacao_tok', np.repeat([estacoes_mapping[b]['ana_code'] for b in basin_ids],
+                                              len(limiares)))
+    return tabela
+
+def member_files(p, data=DATA_PADRAO, ons_dir=None, tok_dir=None):
+    """
+    Arquivos ONS e TOK do membro p na data DDMMAA
+    O TOK fica em <tok_dir>/<data>/ quando essa subpasta existe; senão, direto em tok_dir
+    """
+    ons_dir = Path(ons_dir or ONS_DIR)
+    tok_dir = Path(tok_dir or TOK_DIR)
+    if (tok_dir / data).is_dir():
+        tok_dir = tok_dir / data
+    return ons_dir / f'ECMWFf_m_{data}_p{p}.dat', tok_dir / f'EC45_m{p}.csv'
+
+def hindcast_dates(ons_dir=None, inicio=None, fim=None):
+    """Datas DDMMAA com arquivo ONS em ons_dir, em ordem cronológica (opcionalmente entre inicio e fim)"""
+    datas = {}
+    for arquivo in Path(ons_dir or ONS_DIR).glob('ECMWFf_m_*_p*.dat'):
+        rodada = rodada_hindcast(arquivo)
+        if rodada is not None:
+            datas[arquivo.stem.split('_')[-2]] = rodada
+    return [data for data, rodada in sorted(datas.items(), key=lambda item: item[1])
+            if (inicio is None or rodada >= inicio) and (fim is None or rodada <= fim)]
+
+def parse_dates(textos):
+    """Datas DDMMAA a partir de YYYYMMDD ou DDMMAA"""
+    return [pd.to_datetime(t, format='%Y%m%d').strftime('%d%m%y') if len(t) == 8 else t for t in textos]
+
+def parse_members(texto):
+    """Membros a partir de '0-101', '0,5,7' ou combinações ('0-10,20')"""
+    membros = []
+    for parte in texto.split(','):
+        inicio, _, fim = parte.strip().partition('-')
+        membros.extend(range(int(inicio), int(fim or inicio) + 1))
+    return list(dict.fromkeys(membros))
+
+def rodada_hindcast(ons_file):
+    """Data da rodada no nome do arquivo ONS (..._DDMMAA_pN.dat)"""
+    match = re.search(r'_(\d{6})_p\d+$', Path(ons_file).stem)
+    return pd.to_datetime(match.group(1), format='%d%m%y') if match else None
+
+def archive_member(historico, ons_file, p, ons_data, tok_data, estacoes_mapping):
+    """
+    Anexa um membro ao arquivo histórico: ONS pela estação, TOK pelo ana_code do basin
+    As duas fontes são gravadas com o mesmo número de leads
+    Retorna False se o membro não foi arquivado
+    """
+    rodada = rodada_hindcast(ons_file)
+    if rodada is None:
+        print(f"   ✗ Data da rodada não encontrada em {ons_file.name}; membro não arquivado")
+        return False
+    basins = [basin_id for basin_id in tok_data if basin_id in estacoes_mapping]
+    series = {
+        'ons': ([s['estacao'] for s in ons_data], [s['valores'] for s in ons_data]),
+        'tok': ([estacoes_mapping[b]['ana_code'] for b in basins], [tok_data[b] for b in basins]),
+    }
+    n_leads = max([len(v) for _, valores in series.values() for v in valores], default=0)
+    try:
+        for fonte, (estacoes, valores) in series.items():
+            matriz = np.full((len(valores), n_leads), np.nan, dtype=np.float32)
+            for i, v in enumerate(valores):
+                matriz[i, :len(v)] = v
+            historico.gravar(rodada, fonte, estacoes, matriz, membro=p)
+    except ValueError as e:
+        print(f"   ✗ Membro p{p} não arquivado: {e}")
+        return False
+    return True
+
+def load_ensemble_cube(membros, estacoes_mapping, basin_index, historico=None, data=DATA_PADRAO,
+                       ons_dir=None, tok_dir=None):
+    """
+    Carrega todos os membros em cubos float32 (membro × estação × lead)
+    ONS e TOK ficam alinhados pela estação ONS e pelo lead; posições sem dado ficam NaN
+    Cada estação recebe o basin TOK mais próximo, como em compare_hindcasts
+    Com historico, cada membro lido também é anexado ao arquivo histórico
+    (cubo['arquivado'] é False se algum não entrou)
+    """
+    lidos = []
+    arquivado = True
+    for p in membros:
+        ons_file, tok_file = member_files(p, data, ons_dir, tok_dir)
         if not ons_file.exists():
             print(f"   ✗ Arquivo ONS não encontrado: {ons_file}")
             continue
-        
         if not tok_file.exists():
             print(f"   ✗ Arquivo TOK não encontrado: {tok_file}")
             continue
-        
-        try:
-            # Parsear arquivos
+        lidos.append((p, parse_ons_file(ons_file), parse_tok_file(tok_file)))
+        if historico is not None:
+            arquivado &= archive_member(historico, ons_file, *lidos[-1], estacoes_mapping)
+
+    # Eixo de estações: todas as estações ONS, na ordem em que aparecem
+    estacoes = list(dict.fromkeys(s['estacao'] for _, ons_data, _ in lidos for s in ons_data))
+    posicao = {estacao: i for i, estacao in enumerate(estacoes)}
+    n_leads = max([len(s['valores']) for _, ons_data, _ in lidos for s in ons_data]
+                  + [len(v) for _, _, tok_data in lidos for v in tok_data.values()], default=0)
+
+    forma = (len(lidos), len(estacoes))
+    cubo = {
+        'membros': np.array([p for p, _, _ in lidos], dtype=np.int64),
+        'estacoes': np.array(estacoes, dtype=object),
+        'lat': np.full(forma, np.nan),
+        'lon': np.full(forma, np.nan),
+        'basin_id': np.full(forma, -1, dtype=np.int64),
+        'distancia_km': np.full(forma, np.nan),
+        'ons': np.full(forma + (n_leads,), np.nan, dtype=np.float32),
+        'tok': np.full(forma + (n_leads,), np.nan, dtype=np.float32),
+        'arquivado': arquivado,
+    }
+
+    for m, (_, ons_data, tok_data) in enumerate(lidos):
+        disponiveis = [basin_id for basin_id in tok_data if basin_id in estacoes_mapping]
+        if not ons_data or not disponiveis:
+            continue
+        lats = np.array([s['lat'] for s in ons_data])
+        lons = np.array([s['lon'] for s in ons_data])
+        basin_ids, distancias_km = basin_index.restrict(disponiveis).query(lats, lons)
+        idx = np.array([posicao[s['estacao']] for s in ons_data])
+        cubo['lat'][m, idx] = lats
+        cubo['lon'][m, idx] = lons
+        cubo['basin_id'][m, idx] = basin_ids
+        cubo['distancia_km'][m, idx] = distancias_km
+        for i, ons_station, basin_id in zip(idx, ons_data, basin_ids.tolist()):
+            ons_valores = ons_station['valores']
+            tok_valores = tok_data[basin_id]
+            cubo['ons'][m, i, :len(ons_valores)] = ons_valores
+            cubo['tok'][m, i, :len(tok_valores)] = tok_valores
+
+    return cubo
+
+def ensemble_metrics(ons_cube, tok_cube):
+    """
+    MAE, RMSE e correlação para todos os membros e estações de uma vez
+    As reduções são feitas no eixo de lead, apenas onde ONS e TOK têm valor
+    Retorna (diferenca_media, rmse, correlacao, n_leads), cada um membro × estação
+    """
+    valido = ~np.isnan(ons_cube) & ~np.isnan(tok_cube)
+    n = valido.sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ons = np.where(valido, ons_cube, 0).astype(np.float64)
+        tok = np.where(valido, tok_cube, 0).astype(np.float64)
+        dif = ons - tok
+
+        diff_media = np.abs(dif).sum(axis=2) / n
+        rmse = np.sqrt((dif ** 2).sum(axis=2) / n)
+
+        ons_anom = np.where(valido, ons - (ons.sum(axis=2) / n)[..., None], 0)
+        tok_anom = np.where(valido, tok - (tok.sum(axis=2) / n)[..., None], 0)
+        var_ons = (ons_anom ** 2).sum(axis=2)
+        var_tok = (tok_anom ** 2).sum(axis=2)
+        correlacao = (ons_anom * tok_anom).sum(axis=2) / np.sqrt(var_ons * var_tok)
+        correlacao = np.where((var_ons > 0) & (var_tok > 0), correlacao, np.nan)
+
+    return diff_media, rmse, correlacao, n
+
+def run_cube(estacoes_mapping, basin_index, membros, formato='csv', historico=None, data=DATA_PADRAO,
+             output_dir=None, ons_dir=None, tok_dir=None, limiares=None):
+    """
+    Modo cubo: todos os membros de uma data em uma passada, saída única com coluna membro
+    Com limiares, grava também a verificação categórica por membro, estação e limiar
+    Retorna os nomes dos arquivos gravados em output_dir (vazio se houve erro ou se algum
+    membro não entrou no arquivo histórico, para que a data seja refeita)
+    """
+    output_dir = Path(output_dir or OUTPUT_DIR)
+    try:
+        print("2. Carregando todos os membros no cubo...")
+        with estagio('cubo', data=data) as medida:
+            cubo = load_ensemble_cube(membros, estacoes_mapping, basin_index, historico, data, ons_dir, tok_dir)
+            medida.linhas = int(np.prod(cubo['ons'].shape[:2]))
+        print(f"   - Cubo: {cubo['ons'].shape[0]} membros × {cubo['ons'].shape[1]} estações × "
+              f"{cubo['ons'].shape[2]} leads\n")
+
+        print("3. Calculando métricas vetorizadas...")
+        with estagio('estatisticas', data=data) as medida:
+            diff_media, rmse, correlacao, n = ensemble_metrics(cubo['ons'], cubo['tok'])
+            medida.linhas = int(n.size)
+
+        m, i = np.nonzero((cubo['basin_id'] >= 0) & (n > 0))
+        basin_ids = cubo['basin_id'][m, i]
+        output_df = pd.DataFrame({
+            'membro': cubo['membros'][m],
+            'lat': cubo['lat'][m, i],
+            'lon': cubo['lon'][m, i],
+            'estacao_ons': cubo['estacoes'][i],
+            'estacao_tok': [estacoes_mapping[b]['ana_code'] for b in basin_ids.tolist()],
+            'diferenca_media': diff_media[m, i],
+            'rmse': rmse[m, i],
+            'correlacao': correlacao[m, i],
+            'distancia_km': cubo['distancia_km'][m, i],
+        })
+        output_df = output_df.sort_values(by=['membro', 'diferenca_media'], ascending=[True, False], kind='stable')
+
+        output_file = output_dir / nome_saida('comparacao_ensemble', formato)
+        with estagio('gravacao', data=data) as medida:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            escrever_tabela(output_df, output_file, formato)
+            medida.linhas = len(output_df)
+        print(f"   ✓ Arquivo consolidado salvo: {output_file}")
+        print(f"     {len(output_df)} linhas de comparação\n")
+        saidas = [output_file.name] if cubo['arquivado'] else []
+        if limiares is None:
+            return saidas
+
+        print("4. Verificação categórica (todos os membros e limiares de uma vez)...")
+        with estagio('categorica', data=data) as medida:
+            # Estações sem basin casado no membro ficam fora (todas as posições NaN)
+            com_basin = (cubo['basin_id'] >= 0)[..., None]
+            categorica = verificacao_categorica.tabela_categorica(
+                np.where(com_basin, cubo['ons'], np.nan), np.where(com_basin, cubo['tok'], np.nan), limiares,
+                eixos=2, grupos={'membro': cubo['membros'], 'estacao_ons': cubo['estacoes']})
+            categorica = categorica.reset_index()
+            categorica = categorica[categorica[['acertos', 'perdas', 'falsos_alarmes', 'negativos_corretos']]
+                                    .sum(axis=1) > 0]
+            medida.linhas = len(categorica)
+        categorica_file = output_dir / nome_saida('categorica_ensemble', formato)
+        with estagio('gravacao', data=data) as medida:
+            escrever_tabela(categorica, categorica_file, formato)
+            medida.linhas = len(categorica)
+        print(f"   ✓ Verificação categórica salva: {categorica_file}\n")
+        return saidas + [categorica_file.name] if saidas else []
+
+    except Exception as e:
+        print(f"   ✗ Erro ao processar cubo {data}: {str(e)}\n")
+        return []
+
+
+def process_member(p, data, estacoes_mapping, basin_index, output_dir, formato='csv', historico=None,
+                   ons_dir=None, tok_dir=None, limiares=None):
+    """
+    Compara o membro p da data DDMMAA e grava comparacao_p{p} em output_dir
+    Com limiares, grava também categorica_p{p} (contingência e índices por estação e limiar)
+    Retorna os nomes dos arquivos gravados (vazio se faltou entrada, houve erro ou o
+    membro não entrou no arquivo histórico, para que seja refeito)
+    """
+    print(f"2.{p} Processando arquivo p{p} ({data})...")
+
+    output_dir = Path(output_dir)
+    ons_file, tok_file = member_files(p, data, ons_dir, tok_dir)
+    output_file = output_dir / nome_saida(f'comparacao_p{p}', formato)
+
+    if not ons_file.exists():
+        print(f"   ✗ Arquivo ONS não encontrado: {ons_file}")
+        return []
+
+    if not tok_file.exists():
+        print(f"   ✗ Arquivo TOK não encontrado: {tok_file}")
+        return []
+
+    try:
+        # Parsear arquivos
+        with estagio('leitura', data=data, membro=p) as medida:
             print(f"   - Lendo arquivo ONS...")
             ons_data = parse_ons_file(ons_file)
             print(f"     {len(ons_data)} estações encontradas")
-            
+
             print(f"   - Lendo arquivo TOK...")
             tok_data = parse_tok_file(tok_file)
             print(f"     {len(tok_data)} basins encontrados")
-            
-            # Comparar
-            print(f"   - Comparando dados...")
-            comparacao = compare_hindcasts(ons_data, tok_data, estacoes_mapping, f'p{p}')
-            
-            # Selecionar apenas lat e lon para saída, conforme requisito
-            output_df = comparacao[['lat', 'lon', 'estacao_ons', 'estacao_tok', 
-                                    'diferenca_media', 'rmse', 'correlacao', 'distancia_km']]
-            
-            # Salvar
-            output_df.sort_values(by='diferenca_media', inplace=True, ascending=False)
-            output_df.to_csv(output_file, index=False, float_format='%.2f')
-            print(f"   ✓ Arquivo de comparação salvo: {output_file}")
-            print(f"     {len(output_df)} linhas de comparação\n")
-            
-        except Exception as e:
-            print(f"   ✗ Erro ao processar p{p}: {str(e)}\n")
-    
+            medida.linhas = len(ons_data) + len(tok_data)
+
+        arquivado = True
+        if historico is not None:
+            with estagio('historico', data=data, membro=p):
+                arquivado = archive_member(historico, ons_file, p, ons_data, tok_data, estacoes_mapping)
+
+        # Comparar
+        print(f"   - Comparando dados...")
+        with estagio('comparacao', data=data, membro=p) as medida:
+            comparacao = compare_hindcasts(ons_data, tok_data, estacoes_mapping, f'p{p}', basin_index)
+            medida.linhas = len(comparacao)
+
+        # Selecionar apenas lat e lon para saída, conforme requisito
+        output_df = comparacao[['lat', 'lon', 'estacao_ons', 'estacao_tok',
+                                'diferenca_media', 'rmse', 'correlacao', 'distancia_km']]
+
+        # Salvar
+        output_df = output_df.sort_values(by='diferenca_media', ascending=False)
+        with estagio('gravacao', data=data, membro=p) as medida:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            escrever_tabela(output_df, output_file, formato)
+            medida.linhas = len(output_df)
+        print(f"   ✓ Arquivo de comparação salvo: {output_file}")
+        print(f"     {len(output_df)} linhas de comparação\n")
+        saidas = [output_file.name] if arquivado else []
+        if limiares is None:
+            return saidas
+
+        with estagio('categorica', data=data, membro=p) as medida:
+            categorica = categorical_hindcasts(ons_data, tok_data, estacoes_mapping, limiares, basin_index)
+            medida.linhas = len(categorica)
+        categorica_file = output_dir / nome_saida(f'categorica_p{p}', formato)
+        with estagio('gravacao', data=data, membro=p) as medida:
+            escrever_tabela(categorica, categorica_file, formato)
+            medida.linhas = len(categorica)
+        print(f"   ✓ Verificação categórica salva: {categorica_file}\n")
+        return saidas + [categorica_file.name] if saidas else []
+
+    except Exception as e:
+        print(f"   ✗ Erro ao processar p{p}: {str(e)}\n")
+        return []
+
+class Tarefa(NamedTuple):
+    """Uma data de hindcast e um membro (membro None: o ensemble inteiro, no modo cubo)"""
+    data: str
+    membro: int | None
+
+    @property
+    def rotulo(self):
+        return 'ensemble' if self.membro is None else f'p{self.membro}'
+
+def build_tasks(datas, membros, modo='membro'):
+    """Grafo de tarefas: (data, membro) no modo membro; uma tarefa por data no modo cubo"""
+    if modo == 'cubo':
+        return [Tarefa(data, None) for data in datas]
+    return [Tarefa(data, p) for data in datas for p in membros]
+
+def task_inputs(tarefa, membros, ons_dir=None, tok_dir=None):
+    """Arquivos de entrada da tarefa (os de todos os membros, no modo cubo)"""
+    ps = membros if tarefa.membro is None else [tarefa.membro]
+    return [f for p in ps for f in member_files(p, tarefa.data, ons_dir, tok_dir)]
+
+def inputs_fingerprint(arquivos):
+    """Impressão digital única dos arquivos de entrada existentes (nome, tamanho e mtime)"""
+    h = hashlib.blake2b(digest_size=16)
+    for arquivo in arquivos:
+        if arquivo.exists():
+            h.update(f"{arquivo}\0{impressao_digital(arquivo)}\n".encode())
+    return h.hexdigest()
+
+class Contexto(NamedTuple):
+    """Parâmetros comuns a todas as tarefas de uma execução"""
+    membros: list
+    output_dir: Path
+    ons_dir: Path
+    tok_dir: Path
+    formato: str = 'csv'
+    limiares: tuple | None = None
+
+def run_task(tarefa, contexto, estacoes_mapping, basin_index, historico=None):
+    """Executa uma tarefa; retorna os arquivos gravados em <output_dir>/<data>"""
+    output_dir = contexto.output_dir / tarefa.data
+    if tarefa.membro is None:
+        print(f"=== Cubo {tarefa.data} ===")
+        return run_cube(estacoes_mapping, basin_index, contexto.membros, contexto.formato, historico,
+                        tarefa.data, output_dir, contexto.ons_dir, contexto.tok_dir, contexto.limiares)
+    return process_member(tarefa.membro, tarefa.data, estacoes_mapping, basin_index, output_dir,
+                          contexto.formato, historico, contexto.ons_dir, contexto.tok_dir, contexto.limiares)
+
+# Estações, índice espacial e arquivo histórico abertos uma única vez por processo do pool
+_estado_worker = {}
+
+def _iniciar_worker(estacoes_file, contexto, historico=None, config_instrumentacao=None):
+    if config_instrumentacao is not None:
+        configurar(**config_instrumentacao)
+    mapping = load_estacoes(estacoes_file)
+    _estado_worker.update(mapping=mapping, basin_index=BasinIndex(mapping), contexto=contexto,
+                          historico=historico)
+
+def _run_task_worker(tarefa):
+    """Executa run_task no worker; devolve o texto que seria impresso e as saídas"""
+    saida = io.StringIO()
+    with contextlib.redirect_stdout(saida):
+        saidas = run_task(tarefa, _estado_worker['contexto'], _estado_worker['mapping'],
+                          _estado_worker['basin_index'], _estado_worker['historico'])
+    return saida.getvalue(), saidas
+
+def main():
+    parser = argparse.ArgumentParser(description='Comparação de hindcast ONS vs TOK')
+    parser.add_argument('--modo', choices=['membro', 'cubo'], default='membro',
+                        help='membro: um CSV por membro; cubo: todos os membros em um único array e CSV')
+    parser.add_argument('--datas', nargs='+', default=None,
+                        help='Datas de hindcast (YYYYMMDD ou DDMMAA); padrão: todas as de --ons-dir')
+    parser.add_argument('--inicio', default=None, help='Primeira data (YYYYMMDD) das encontradas em --ons-dir')
+    parser.add_argument('--fim', default=None, help='Última data (YYYYMMDD) das encontradas em --ons-dir')
+    parser.add_argument('--membros', default=f'0-{N_MEMBROS - 1}', help="Membros: '0-101', '0,5,7' ou '0-10,20'")
+    parser.add_argument('--ons-dir', default=str(ONS_DIR), help='Diretório dos arquivos ONS')
+    parser.add_argument('--tok-dir', default=str(TOK_DIR),
+                        help='Diretório dos arquivos TOK (com ou sem subpasta por data)')
+    parser.add_argument('--output-dir', default=str(OUTPUT_DIR), help='Diretório de saída (uma subpasta por data)')
+    parser.add_argument('--estacoes', default=str(ESTACOES_FILE), help='Arquivo base_de_estacoes.csv')
+    parser.add_argument('--workers', type=int, default=1, help='Processos para executar as tarefas em paralelo')
+    parser.add_argument('--forcar', action='store_true',
+                        help='Refaz todas as tarefas, mesmo as já concluídas com as mesmas entradas')
+    parser.add_argument('--output-format', choices=FORMATOS_SAIDA, default='csv',
+                        help='Formato dos arquivos de saída (parquet/feather/arrow: colunares, comprimidos)')
+    parser.add_argument('--arquivo-historico', default=None,
+                        help='Diretório do arquivo histórico (estação × rodada × lead × membro) onde anexar os membros')
+    parser.add_argument('--limiares', type=float, nargs='+', default=None,
+                        help='Limiares em mm da verificação categórica (ex.: 1 5 10 25 50)')
+    parser.add_argument('--metricas', default=None,
+                        help='Arquivo JSON lines com as medidas de cada estágio (tempo, CPU, linhas, bytes, RSS)')
+    parser.add_argument('--perfil-estagio', default=None,
+                        help='Estágio a perfilar (leitura, historico, comparacao, categorica, gravacao; cubo, estatisticas)')
+    parser.add_argument('--perfil', choices=PERFIS, default='cprofile',
+                        help='Perfilador do --perfil-estagio')
+    args = parser.parse_args()
+
+    configurar(args.metricas, 'compara_hindcast', args.perfil_estagio, args.perfil)
+
+    membros = parse_members(args.membros)
+    contexto = Contexto(membros, Path(args.output_dir), Path(args.ons_dir), Path(args.tok_dir), args.output_format,
+                        tuple(args.limiares) if args.limiares else None)
+    estacoes_file = Path(args.estacoes)
+
+    if args.datas:
+        datas = parse_dates(args.datas)
+    else:
+        datas = hindcast_dates(contexto.ons_dir,
+                               pd.to_datetime(args.inicio, format='%Y%m%d') if args.inicio else None,
+                               pd.to_datetime(args.fim, format='%Y%m%d') if args.fim else None)
+    tarefas = build_tasks(datas, membros, args.modo)
+
+    print("=== Comparação de Hindcast ONS vs TOK ===\n")
+    print(f"{len(datas)} data(s) × {len(membros)} membro(s): {len(tarefas)} tarefa(s) no modo {args.modo}\n")
+
+    # Checkpoint por tarefa: manifesto na pasta de saída de cada data
+    manifestos = {data: Manifesto(contexto.output_dir / data) for data in datas}
+    impressao_estacoes = impressao_digital(estacoes_file)
+    entradas = {}
+    pendentes = []
+    for tarefa in tarefas:
+        entradas[tarefa] = {
+            'entradas': inputs_fingerprint(task_inputs(tarefa, membros, contexto.ons_dir, contexto.tok_dir)),
+            'membros': membros if tarefa.membro is None else None,
+            'estacoes': impressao_estacoes,
+            'formato': args.output_format,
+            'historico': str(Path(args.arquivo_historico).resolve()) if args.arquivo_historico else None,
+        }
+        if args.limiares:
+            entradas[tarefa]['limiares'] = args.limiares
+        if not args.forcar and manifestos[tarefa.data].atualizado(tarefa.rotulo, entradas[tarefa]):
+            continue
+        pendentes.append(tarefa)
+    if len(pendentes) < len(tarefas):
+        print(f"{len(tarefas) - len(pendentes)} tarefa(s) já concluída(s) com as mesmas entradas; "
+              f"{len(pendentes)} pendente(s)\n")
+    if not pendentes:
+        return
+
+    historico = None
+    if args.arquivo_historico:
+        historico = arquivo_historico.ArquivoHistorico(
+            args.arquivo_historico, arquivo_historico.estacoes_base(estacoes_file),
+            n_membros=max(N_MEMBROS, max(membros, default=0) + 1))
+
+    def registrar(tarefa, saidas):
+        if saidas:
+            manifestos[tarefa.data].registrar(tarefa.rotulo, entradas[tarefa], saidas)
+
+    if args.workers <= 1:
+        # Carregar mapping de estações
+        print("1. Carregando arquivo base_de_estacoes.csv...")
+        estacoes_mapping = load_estacoes(estacoes_file)
+        print(f"   - Encontrados {len(estacoes_mapping)} basin IDs\n")
+
+        # Índice espacial construído uma vez e reutilizado por todos os membros
+        basin_index = BasinIndex(estacoes_mapping)
+        for tarefa in pendentes:
+            registrar(tarefa, run_task(tarefa, contexto, estacoes_mapping, basin_index, historico))
+    else:
+        # Cada tarefa é registrada assim que termina, para que uma interrupção preserve o que já foi feito;
+        # o relatório é impresso na ordem das tarefas, independente da ordem de término.
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_iniciar_worker,
+                                 initargs=(estacoes_file, contexto, historico, configuracao())) as pool:
+            futuros = {pool.submit(_run_task_worker, tarefa): i for i, tarefa in enumerate(pendentes)}
+            textos = [None] * len(pendentes)
+            proximo = 0
+            for futuro in as_completed(futuros):
+                i = futuros[futuro]
+                try:
+                    textos[i], saidas = futuro.result()
+                except Exception as e:
+                    # Falha fora do tratamento da tarefa (worker encerrado, erro de pickle...):
+                    # a tarefa não é registrada e as demais seguem
+                    textos[i] = f"   ✗ Erro na tarefa {pendentes[i].data} {pendentes[i].rotulo}: {str(e)}\n\n"
+                    continue
+                registrar(pendentes[i], saidas)
+                while proximo < len(textos) and textos[proximo] is not None:
+                    print(textos[proximo], end='')
+                    proximo += 1
+
     print("=== Comparação Concluída ===")
-    print(f"Arquivos salvos em: {OUTPUT_DIR}")
+    print(f"Arquivos salvos em: {contexto.output_dir}")
 
 if __name__ == '__main__':
     main()
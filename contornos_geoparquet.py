@@ -0,0 +1,112 @@
+"""Contornos de bacias em GeoParquet (geometria WKB + coluna bbox).
+
+Substitui o CSV/Parquet WKT do ``CONTORNOS/main.py``: a geometria é gravada
+em WKB (binário, sem o texto enorme das bacias de alta resolução), com os
+atributos ``basin_name``, ``grupo``, ``ana_code`` e ``smap_basin_id`` e uma
+coluna ``bbox`` (struct xmin/ymin/xmax/ymax), seguindo o GeoParquet 1.1
+(metadado ``geo`` com a ``covering`` da bbox). As coordenadas são gravadas
+como estão nas camadas, sem reprojeção (CRS omitido = OGC:CRS84, lon/lat).
+
+Cada bacia fica em um row group próprio, então ``ler_geoparquet`` com
+``bacias`` ou ``bbox`` descarta os demais pelas estatísticas do arquivo e só
+decodifica as geometrias pedidas.
+"""
+from pathlib import Path
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import shapely
+
+from escrita_saida import escrever_atomico
+
+
+VERSAO_GEOPARQUET = '1.1.0'
+ATRIBUTOS = ('basin_name', 'grupo', 'ana_code', 'smap_basin_id')
+LIMITES = ('xmin', 'ymin', 'xmax', 'ymax')
+
+
+def eh_geoparquet(caminho: Path) -> bool:
+    """Se o Parquet tem o metadado ``geo`` (GeoParquet)."""
+    metadados = pq.read_schema(caminho).metadata or {}
+    return b'geo' in metadados
+
+
+def escrever_geoparquet(destino: Path, atributos: pd.DataFrame, geometrias: np.ndarray) -> None:
+    """Grava os contornos (uma linha por bacia) em GeoParquet.
+
+    ``atributos`` tem as colunas de ``ATRIBUTOS`` (as ausentes ficam vazias) e
+    ``geometrias`` os objetos shapely na mesma ordem; linhas sem geometria são
+    gravadas com geometria nula.
+    """
+    geometrias = np.asarray(geometrias, dtype=object)
+    presentes = ~shapely.is_missing(geometrias)
+    caixas = np.full((len(geometrias), 4), np.nan)
+    if presentes.any():
+        caixas[presentes] = shapely.bounds(geometrias[presentes])
+    tipos = sorted(set(shapely.get_type_id(geometrias[presentes]).tolist()))
+    nomes_tipos = {0: 'Point', 1: 'LineString', 3: 'Polygon', 4: 'MultiPoint',
+                   5: 'MultiLineString', 6: 'MultiPolygon', 7: 'GeometryCollection'}
+
+    colunas = {nome: pa.array(atributos[nome].fillna('').astype(str) if nome in atributos
+                              else [''] * len(geometrias), pa.string())
+               for nome in ATRIBUTOS}
+    colunas['bbox'] = pa.StructArray.from_arrays(
+        [pa.array(caixas[:, i], pa.float64(), mask=~presentes) for i in range(4)],
+        names=list(LIMITES), mask=pa.array(~presentes))
+    wkb = np.full(len(geometrias), None, dtype=object)
+    wkb[presentes] = shapely.to_wkb(geometrias[presentes])
+    colunas['geometry'] = pa.array(wkb, pa.binary())
+
+    geo = {
+        'version': VERSAO_GEOPARQUET,
+        'primary_column': 'geometry',
+        'columns': {'geometry': {
+            'encoding': 'WKB',
+            'geometry_types': [nomes_tipos[t] for t in tipos if t in nomes_tipos],
+            'bbox': ([float(np.nanmin(caixas[:, 0])), float(np.nanmin(caixas[:, 1])),
+                      float(np.nanmax(caixas[:, 2])), float(np.nanmax(caixas[:, 3]))]
+                     if presentes.any() else []),
+            'covering': {'bbox': {limite: ['bbox', limite] for limite in LIMITES}},
+        }},
+    }
+    tabela = pa.table(colunas).replace_schema_metadata({'geo': json.dumps(geo)})
+    escrever_atomico(destino, lambda tmp: pq.write_table(
+        tabela, tmp, compression='zstd', row_group_size=1, write_statistics=True))
+
+
+def _filtro(bacias=None, bbox=None):
+    filtro = None
+    if bacias is not None:
+        bacias = [str(b) for b in bacias]
+        filtro = pc.field('basin_name').isin(bacias) | pc.field('ana_code').isin(bacias)
+    if bbox is not None:
+        xmin, ymin, xmax, ymax = bbox
+        caixa = ((pc.field('bbox', 'xmax') >= xmin) & (pc.field('bbox', 'xmin') <= xmax)
+                 & (pc.field('bbox', 'ymax') >= ymin) & (pc.field('bbox', 'ymin') <= ymax))
+        filtro = caixa if filtro is None else filtro & caixa
+    return filtro
+
+
+def ler_geoparquet(caminho: Path, bacias=None, bbox=None) -> pd.DataFrame:
+    """Contornos do GeoParquet: atributos e ``geometry`` (shapely), uma linha por bacia.
+
+    ``bacias`` filtra por nome ou ``ana_code``; ``bbox`` (xmin, ymin, xmax, ymax)
+    mantém só as bacias cuja caixa intercepta a janela. Linhas sem geometria
+    são descartadas.
+    """
+    tabela = pq.read_table(caminho, filters=_filtro(bacias, bbox))
+    tabela = tabela.filter(pc.is_valid(tabela['geometry']))
+    contornos = tabela.drop_columns(['geometry', 'bbox']).to_pandas()
+    contornos['geometry'] = shapely.from_wkb(tabela['geometry'].to_numpy(zero_copy_only=False))
+    return contornos
+
+
+def contornos_por_chave(contornos: pd.DataFrame) -> dict[str, shapely.Geometry]:
+    """{chave: geometria}, com ``ana_code`` como chave quando houver, senão o nome."""
+    codigos = contornos['ana_code'].fillna('').astype(str)
+    chaves = codigos.where(codigos != '', contornos['basin_name'].astype(str))
+    return dict(zip(chaves, contornos['geometry']))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""Download concorrente dos arquivos ONS (zip) e TOK (tar.gz) de várias rodadas.
+
+Cada (modelo, rodada) gera duas transferências com os mesmos caminhos do
+notebook: o zip do ONS no bucket ``tok_webhook`` e o tar.gz do TOK em
+``storage.tempook.com``, salvos em ``<diretorio-base>/<modelo>/<rodada>/ONS``
+e ``.../TOK``. As transferências rodam em um pool limitado de threads, com
+novas tentativas (espera exponencial) e arquivo parcial ``.part``: quando o
+armazenamento aceita leitura a partir de um deslocamento, uma nova tentativa
+continua de onde parou. Arquivos já baixados são pulados.
+
+Uso:
+    python download.py --modelos ECMWF GEFS --inicio 20260101 --fim 20260131 --workers 8
+
+Opções:
+    --modelos        modelos a baixar (padrão: ECMWF)
+    --inicio, --fim  intervalo de rodadas (YYYYMMDD, inclusivo; --fim padrão = --inicio)
+    --diretorio-base raiz local dos dados (padrão: diretório atual)
+    --workers        transferências simultâneas (padrão: 4)
+    --tentativas     tentativas por arquivo (padrão: 4)
+    --local          usa ``<local>/<bucket>/<caminho>`` no lugar do Google Storage (testes)
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+import argparse
+import os
+import random
+import shutil
+import sys
+import time
+
+import pandas as pd
+
+
+BUCKET_ONS = 'tok_webhook'
+BUCKET_TOK = 'storage.tempook.com'
+NOME_MODELO_TOK = {
+    'ECMWF': 'ECENS',
+    'GEFS': 'GEFS',
+}
+TAMANHO_BLOCO = 1 << 20
+
+
+class Transferencia(NamedTuple):
+    bucket: str
+    origem: str
+    destino: Path
+
+
+class Resultado(NamedTuple):
+    transferencia: Transferencia
+    status: str  # 'baixado', 'existente' ou 'falha'
+    tentativas: int
+    bytes: int
+    erro: str | None = None
+
+
+class ArmazenamentoLocal:
+    """Armazenamento em disco com a mesma interface do Google Storage (para testes).
+
+    ``<raiz>/<bucket>/<origem>`` faz o papel do objeto remoto. Aceita retomar
+    a leitura de um deslocamento, como um download com ``Range``.
+    """
+
+    retomavel = True
+
+    def __init__(self, raiz: Path, bucket: str):
+        self.raiz = Path(raiz) / bucket
+
+    def tamanho(self, origem: str) -> int | None:
+        return (self.raiz / origem).stat().st_size
+
+    def baixar(self, origem: str, destino: Path, inicio: int = 0) -> None:
+        """Grava o objeto a partir de ``inicio`` no fim de ``destino``."""
+        with open(self.raiz / origem, 'rb') as fonte, open(destino, 'ab') as saida:
+            fonte.seek(inicio)
+            shutil.copyfileobj(fonte, saida, TAMANHO_BLOCO)
+
+
+class ArmazenamentoGoogle:
+    """``tok_gcp_tools.storage.GoogleStorage`` (importado só quando usado).
+
+    O ``download_file`` do pacote baixa o objeto inteiro, então uma nova
+    tentativa recomeça o arquivo parcial do zero.
+    """
+
+    retomavel = False
+
+    def __init__(self, bucket: str):
+        from tok_gcp_tools.storage import GoogleStorage
+
+        self._storage = GoogleStorage(bucket)
+
+    def tamanho(self, origem: str) -> int | None:
+        return None
+
+    def baixar(self, origem: str, destino: Path, inicio: int = 0) -> None:
+        self._storage.download_file(str(origem), str(destino))
+
+
+def transferencias_rodada(nome_modelo: str, data_rodada: str, diretorio_base: Path) -> list[Transferencia]:
+    """Zip do ONS e tar.gz do TOK de uma rodada, nos caminhos usados pelo notebook."""
+    modelo_tok = NOME_MODELO_TOK.get(nome_modelo, nome_modelo)
+    data = pd.to_datetime(data_rodada, format='%Y%m%d')
+    pasta = Path(diretorio_base) / nome_modelo / data_rodada
+
+    arquivo_ons = f"modelo_{nome_modelo.lower()}_{data_rodada}.zip"
+    arquivo_tok = f"PMEDIA_{modelo_tok}av_precip_{data_rodada}.tar.gz"
+    return [
+        Transferencia(BUCKET_ONS, f"produtos_ons/modelo_{nome_modelo.lower()}/{arquivo_ons}",
+                      pasta / 'ONS' / arquivo_ons),
+        Transferencia(BUCKET_TOK, f"Comercializadora/Arquivos/PMEDIA/{modelo_tok}_estat/{modelo_tok}av_precip/"
+                                  f"{data:%Y-%m}/{arquivo_tok}",
+                      pasta / 'TOK' / arquivo_tok),
+    ]
+
+
+def baixar(transferencia: Transferencia, armazenamento, tentativas: int = 4,
+           espera_inicial: float = 1.0) -> Resultado:
+    """Baixa uma transferência para ``destino.part`` e renomeia ao concluir.
+
+    Falhas são repetidas com espera exponencial (com variação aleatória).
+    ``FileNotFoundError`` (objeto inexistente) não é repetido.
+    """
+    destino = Path(transferencia.destino)
+    if destino.exists():
+        return Resultado(transferencia, 'existente', 0, destino.stat().st_size)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    parcial = destino.with_name(destino.name + '.part')
+
+    erro = None
+    for tentativa in range(1, tentativas + 1):
+        try:
+            inicio = parcial.stat().st_size if parcial.exists() else 0
+            if inicio and not armazenamento.retomavel:
+                parcial.unlink()
+                inicio = 0
+            armazenamento.baixar(transferencia.origem, parcial, inicio)
+            esperado = armazenamento.tamanho(transferencia.origem)
+            obtido = parcial.stat().st_size
+            if esperado is not None and obtido != esperado:
+                raise IOError(f"tamanho {obtido} diferente do esperado {esperado}")
+            os.replace(parcial, destino)
+            return Resultado(transferencia, 'baixado', tentativa, obtido)
+        except FileNotFoundError as e:
+            erro = e
+            break
+        except Exception as e:
+            erro = e
+            if tentativa < tentativas:
+                time.sleep(espera_inicial * 2 ** (tentativa - 1) * random.uniform(0.5, 1.5))
+    if not armazenamento.retomavel:
+        parcial.unlink(missing_ok=True)
+    return Resultado(transferencia, 'falha', tentativa, 0, f"{type(erro).__name__}: {erro}")
+
+
+def baixar_todos(transferencias: list[Transferencia], armazenamentos: dict, max_workers: int = 4,
+                 tentativas: int = 4, espera_inicial: float = 1.0) -> list[Resultado]:
+    """Baixa as transferências em paralelo; ``armazenamentos`` mapeia bucket -> armazenamento.
+
+    Os resultados saem na ordem das transferências.
+    """
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as pool:
+        futuros = [pool.submit(baixar, t, armazenamentos[t.bucket], tentativas, espera_inicial)
+                   for t in transferencias]
+        return [futuro.result() for futuro in futuros]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download concorrente dos arquivos ONS e TOK por rodada')
+    parser.add_argument('--modelos', nargs='+', default=['ECMWF'])
+    parser.add_argument('--inicio', required=True, help='Primeira rodada (YYYYMMDD)')
+    parser.add_argument('--fim', default=None, help='Última rodada (YYYYMMDD, padrão: --inicio)')
+    parser.add_argument('--diretorio-base', default='.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--tentativas', type=int, default=4)
+    parser.add_argument('--local', default=None, help='Raiz local que substitui o Google Storage')
+    args = parser.parse_args()
+
+    rodadas = pd.date_range(pd.to_datetime(args.inicio, format='%Y%m%d'),
+                            pd.to_datetime(args.fim or args.inicio, format='%Y%m%d'), freq='D')
+    transferencias = [t for modelo in args.modelos for rodada in rodadas
+                      for t in transferencias_rodada(modelo, f"{rodada:%Y%m%d}", Path(args.diretorio_base))]
+
+    if args.local:
+        armazenamentos = {b: ArmazenamentoLocal(args.local, b) for b in (BUCKET_ONS, BUCKET_TOK)}
+    else:
+        armazenamentos = {b: ArmazenamentoGoogle(b) for b in (BUCKET_ONS, BUCKET_TOK)}
+
+    print(f"{len(transferencias)} arquivos de {len(args.modelos)} modelo(s) × {len(rodadas)} rodada(s), "
+          f"{args.workers} em paralelo")
+    inicio = time.perf_counter()
+    resultados = baixar_todos(transferencias, armazenamentos, args.workers, args.tentativas)
+    duracao = time.perf_counter() - inicio
+
+    for resultado in resultados:
+        if resultado.status == 'falha':
+            print(f"  ✗ {resultado.transferencia.origem}: {resultado.erro} ({resultado.tentativas} tentativas)")
+    contagem = pd.Series([r.status for r in resultados]).value_counts()
+    total_mb = sum(r.bytes for r in resultados if r.status == 'baixado') / 2**20
+    print(f"Baixados: {contagem.get('baixado', 0)}, já existentes: {contagem.get('existente', 0)}, "
+          f"falhas: {contagem.get('falha', 0)} — {total_mb:.1f} MB em {duracao:.1f} s")
+    if contagem.get('falha', 0):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Escrita dos arquivos de saída: gravação atômica e escritores por formato."""
+from __future__ import annotations
+
+from pathlib import Path
+import contextlib
+import os
+import uuid
+
+from importacao_tardia import modulo_tardio
+
+pd = modulo_tardio('pandas')
+
+
+def _temporario(destino: Path) -> Path:
+    """Nome temporário único ao lado de ``destino`` (por processo e por chamada, seguro entre threads).
+
+    Só o nome: o arquivo é criado pelo escritor com as permissões normais
+    (``tempfile.mkstemp`` o criaria com 0600).
+    """
+    return destino.with_name(f".{destino.name}.{os.getpid()}.{uuid.uuid4().hex[:12]}.tmp")
+
+
+def escrever_atomico(destino: Path, escrever) -> None:
+    """Grava via ``escrever(caminho_temporario)`` e renomeia para ``destino`` ao final.
+
+    Leitores nunca veem um arquivo pela metade, mesmo com vários processos ou
+    threads gravando na mesma pasta (ou no mesmo destino).
+    """
+    tmp = _temporario(destino)
+    try:
+        escrever(tmp)
+        os.replace(tmp, destino)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+@contextlib.contextmanager
+def abrir_atomico(destino: Path, modo: str = 'w'):
+    """Como ``escrever_atomico``, mas entrega o arquivo aberto para gravações em partes."""
+    tmp = _temporario(destino)
+    try:
+        texto = {} if 'b' in modo else {'encoding': 'utf-8', 'newline': ''}
+        with open(tmp, modo, **texto) as f:
+            yield f
+        os.replace(tmp, destino)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+FORMATOS_SAIDA = ('csv', 'parquet', 'feather', 'arrow')
+EXTENSOES = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather', 'arrow': '.arrows'}
+COMPRESSAO_PADRAO = {'parquet': 'zstd', 'feather': 'lz4', 'arrow': 'zstd'}
+
+
+def nome_saida(base: str, formato: str = 'csv') -> str:
+    """Nome do arquivo de saída ``base`` com a extensão do formato."""
+    return base + EXTENSOES[formato]
+
+
+class EscritorTabela:
+    """Grava um DataFrame em partes no arquivo já aberto, no formato escolhido.
+
+    - ``csv``: texto em fluxo; cada parte é formatada direto no arquivo
+      (``float_format`` e cabeçalho só na primeira parte)
+    - ``parquet``: ``ParquetWriter`` com um row group por parte
+    - ``feather``: Arrow IPC em formato de arquivo (Feather v2)
+    - ``arrow``: Arrow IPC em formato de fluxo (``.arrows``)
+
+    Nos formatos colunares os valores são gravados sem arredondamento, com
+    compressão (``COMPRESSAO_PADRAO``), o índice vira coluna quando
+    ``index=True`` e rótulos de coluna não textuais (datas da matriz) são
+    convertidos para texto, como no cabeçalho do CSV. O esquema é fixado pela
+    primeira parte. Normalmente usado via ``abrir_tabela``.
+    """
+
+    def __init__(self, arquivo, formato: str = 'csv', index: bool = False,
+                 float_format: str | None = '%.2f', compressao: str | None = None):
+        if formato not in FORMATOS_SAIDA:
+            raise ValueError(f"Formato de saída desconhecido: {formato!r} (use um de {', '.join(FORMATOS_SAIDA)})")
+        self.arquivo = arquivo
+        self.formato = formato
+        self.index = index
+        self.float_format = float_format
+        self.compressao = compressao or COMPRESSAO_PADRAO.get(formato)
+        self._escritor = None
+        self._esquema = None
+
+    def escrever(self, df: pd.DataFrame) -> None:
+        if self.formato == 'csv':
+            df.to_csv(self.arquivo, index=self.index, float_format=self.float_format,
+                      header=self._esquema is None)
+            self._esquema = True
+            return
+
+        import pyarrow as pa
+
+        tabela = pa.Table.from_pandas(self._colunar(df), schema=self._esquema, preserve_index=False)
+        if self._escritor is None:
+            self._esquema = tabela.schema
+            self._escritor = self._abrir_colunar(tabela.schema)
+        self._escritor.write_table(tabela)
+
+    def fechar(self) -> None:
+        if self._escritor is not None:
+            self._escritor.close()
+            self._escritor = None
+
+    def _colunar(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.index:
+            df = df.reset_index()
+        df = df.rename(columns=lambda c: c.strftime('%Y-%m-%d') if isinstance(c, pd.Timestamp) else str(c))
+        # Texto sempre como string (uma parte vazia não pode virar coluna nula)
+        texto = [c for c in df.columns if df[c].dtype == object or isinstance(df[c].dtype, pd.CategoricalDtype)]
+        return df.astype({c: 'string' for c in texto}) if texto else df
+
+    def _abrir_colunar(self, esquema):
+        import pyarrow as pa
+
+        if self.formato == 'parquet':
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(self.arquivo, esquema, compression=self.compressao)
+        opcoes = pa.ipc.IpcWriteOptions(compression=self.compressao)
+        if self.formato == 'feather':
+            return pa.ipc.new_file(self.arquivo, esquema, options=opcoes)
+        return pa.ipc.new_stream(self.arquivo, esquema, options=opcoes)
+
+
+@contextlib.contextmanager
+def abrir_tabela(destino: Path, formato: str = 'csv', index: bool = False,
+                 float_format: str | None = '%.2f'):
+    """Abre ``destino`` atomicamente e entrega um ``EscritorTabela`` para gravar em partes.
+
+    O arquivo só aparece no destino se todas as partes forem gravadas e o
+    escritor fechado sem erro.
+    """
+    modo = 'w' if formato == 'csv' else 'wb'
+    with abrir_atomico(Path(destino), modo) as f:
+        escritor = EscritorTabela(f, formato, index=index, float_format=float_format)
+        try:
+            yield escritor
+        finally:
+            escritor.fechar()
+
+
+def escrever_tabela(df: pd.DataFrame, destino: Path, formato: str = 'csv', index: bool = False,
+                    float_format: str | None = '%.2f') -> None:
+    """Grava ``df`` inteiro em ``destino`` (ver ``EscritorTabela``)."""
+    with abrir_tabela(destino, formato, index=index, float_format=float_format) as escritor:
+        escritor.escrever(df)
@@ -0,0 +1,24 @@
+"""Importação tardia dos módulos pesados (pandas, NumPy, SciPy e os módulos do pipeline).
+
+``modulo_tardio(nome)`` devolve o módulo sem executá-lo: o import de verdade
+acontece no primeiro acesso a um atributo (``importlib.util.LazyLoader``).
+Assim ``--help`` e execuções em que nada mudou não pagam o import de pandas
+e companhia. Quem usa precisa de ``from __future__ import annotations`` para
+que anotações como ``pd.DataFrame`` não disparem o import na definição.
+"""
+import importlib.util
+import sys
+
+
+def modulo_tardio(nome: str):
+    """Módulo ``nome`` carregado só no primeiro uso (ou o já importado, se houver)."""
+    if nome in sys.modules:
+        return sys.modules[nome]
+    spec = importlib.util.find_spec(nome)
+    if spec is None:
+        raise ModuleNotFoundError(f"Módulo não encontrado: {nome}", name=nome)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nome] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
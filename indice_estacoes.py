@@ -0,0 +1,129 @@
+"""Índice de estações por coordenada quantizada em inteiros.
+
+Cada par (lat, lon) é arredondado para a grade ``1 / escala`` grau (0,01° por
+padrão, o mesmo ``round(2)`` usado antes) e empacotado em um único int64. A
+busca de um arquivo inteiro é um ``searchsorted`` vetorizado sobre as chaves
+ordenadas das estações, e o resultado é guardado por assinatura de grade para
+que arquivos seguintes da mesma grade (ECMWF, ETA40, ...) reutilizem o mapeamento.
+"""
+from collections import OrderedDict
+from itertools import product
+import hashlib
+
+import numpy as np
+
+
+ESCALA_PADRAO = 100
+_BASE = np.int64(1 << 32)
+_DESLOCAMENTO = np.int64(1 << 31)
+
+
+def quantizar(lat: np.ndarray, lon: np.ndarray, escala: int = ESCALA_PADRAO) -> tuple[np.ndarray, np.ndarray]:
+    """Converte lat/lon em inteiros na grade ``1 / escala`` grau."""
+    lat_q = np.rint(np.asarray(lat, dtype=np.float64) * escala).astype(np.int64)
+    lon_q = np.rint(np.asarray(lon, dtype=np.float64) * escala).astype(np.int64)
+    return lat_q, lon_q
+
+
+def empacotar(lat_q: np.ndarray, lon_q: np.ndarray) -> np.ndarray:
+    """Empacota lat/lon quantizadas em uma chave int64 que preserva a ordem."""
+    return (lat_q + _DESLOCAMENTO) * _BASE + (lon_q + _DESLOCAMENTO)
+
+
+class IndiceEstacoes:
+    """Mapeia pontos de grade para rótulos de estação via chaves inteiras.
+
+    ``tolerancia`` é dada em graus: um ponto casa com a estação mais próxima
+    (em passos de grade) cuja diferença em lat e em lon não passa dela.
+    Com ``tolerancia=0`` o comportamento é o do arredondamento exato.
+    """
+
+    def __init__(self, pontos, lat, lon, escala: int = ESCALA_PADRAO,
+                 tolerancia: float = 0.0, max_grades_cache: int = 8):
+        self.escala = escala
+        self.passos_tolerancia = int(np.ceil(round(tolerancia * escala, 9)))
+        self.max_grades_cache = max_grades_cache
+        self._cache: OrderedDict[str, np.ndarray] = OrderedDict()
+
+        chaves = empacotar(*quantizar(lat, lon, escala))
+        # Coordenadas repetidas ficam com a primeira estação do arquivo.
+        self._chaves, primeira = np.unique(chaves, return_index=True)
+        self._rotulos = np.asarray(pontos, dtype=object)[primeira]
+        self._categorias: list[str] = self._rotulos.tolist()
+        self._codigo_extra: dict[int, int] = {}
+
+        deslocamentos = product(range(-self.passos_tolerancia, self.passos_tolerancia + 1), repeat=2)
+        self._deslocamentos = sorted(deslocamentos, key=lambda d: (abs(d[0]) + abs(d[1]), d))
+
+    def __len__(self) -> int:
+        return len(self._chaves)
+
+    def localizar(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Posição da estação de cada ponto em ``rotulos`` (-1 se não houver)."""
+        return self._localizar_quantizado(*quantizar(lat, lon, self.escala))
+
+    @property
+    def rotulos(self) -> np.ndarray:
+        return self._rotulos
+
+    def _localizar_quantizado(self, lat_q: np.ndarray, lon_q: np.ndarray) -> np.ndarray:
+        posicoes = np.full(len(lat_q), -1, dtype=np.int64)
+        if len(self._chaves) == 0:
+            return posicoes
+        pendentes = np.arange(len(lat_q))
+        for d_lat, d_lon in self._deslocamentos:
+            chaves = empacotar(lat_q[pendentes] + d_lat, lon_q[pendentes] + d_lon)
+            pos = np.minimum(np.searchsorted(self._chaves, chaves), len(self._chaves) - 1)
+            achou = self._chaves[pos] == chaves
+            posicoes[pendentes[achou]] = pos[achou]
+            pendentes = pendentes[~achou]
+            if len(pendentes) == 0:
+                break
+        return posicoes
+
+    @property
+    def categorias(self) -> np.ndarray:
+        """Registro de rótulos: as estações seguidas dos pontos sem estação já vistos."""
+        return np.array(self._categorias, dtype=object)
+
+    def codificar(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Código int32 (posição em ``categorias``) de cada ponto.
+
+        Pontos sem estação ganham o rótulo ``"lat,lon"`` arredondado, registrado
+        uma única vez. O resultado é guardado pela assinatura da grade (as chaves
+        quantizadas dos pontos, na ordem do arquivo); como o registro só cresce,
+        os códigos guardados continuam válidos.
+        """
+        lat_q, lon_q = quantizar(lat, lon, self.escala)
+        chaves = empacotar(lat_q, lon_q)
+        assinatura = hashlib.blake2b(chaves.tobytes(), digest_size=16).hexdigest()
+        if assinatura in self._cache:
+            self._cache.move_to_end(assinatura)
+            return self._cache[assinatura]
+
+        codigos = self._localizar_quantizado(lat_q, lon_q).astype(np.int32)
+        sem_estacao = codigos < 0
+        if sem_estacao.any():
+            # Rótulos de texto só para as coordenadas distintas sem estação.
+            unicas, primeira, inverso = np.unique(chaves[sem_estacao], return_index=True, return_inverse=True)
+            primeira = np.flatnonzero(sem_estacao)[primeira]
+            novos = np.empty(len(unicas), dtype=np.int32)
+            for j, (chave, la, lo) in enumerate(zip(unicas.tolist(), lat_q[primeira].tolist(),
+                                                    lon_q[primeira].tolist())):
+                codigo = self._codigo_extra.get(chave)
+                if codigo is None:
+                    codigo = len(self._categorias)
+                    self._categorias.append(f"{la / self.escala!r},{lo / self.escala!r}")
+                    self._codigo_extra[chave] = codigo
+                novos[j] = codigo
+            codigos[sem_estacao] = novos[inverso]
+
+        self._cache[assinatura] = codigos
+        if len(self._cache) > self.max_grades_cache:
+            self._cache.popitem(last=False)
+        return codigos
+
+    def rotular(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Rótulo de estação para cada ponto; sem estação, ``"lat,lon"`` arredondado."""
+        codigos = self.codificar(lat, lon)
+        return self.categorias[codigos]
@@ -0,0 +1,194 @@
+"""Leitura em bloco dos arquivos .dat (lon lat precipitação) de uma pasta.
+
+Todos os arquivos são interpretados pelo parser em C do NumPy e copiados para
+um único array estruturado pré-alocado, com a data de cada arquivo guardada
+como inteiro (dias desde 1970-01-01). A associação com as estações é feita
+uma única vez sobre o bloco inteiro e o resultado sai na forma compacta de
+``tipos_compactos``.
+
+Os .dat também podem ser lidos direto de dentro de um .zip ou .tar.gz, membro
+a membro a partir do fluxo descompactado, sem extrair nada para o disco.
+"""
+from pathlib import Path
+from typing import IO, Iterator
+import fnmatch
+import shutil
+import tarfile
+import warnings
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from cache_ingestao import CacheIngestao, ler_com_cache
+from indice_estacoes import IndiceEstacoes
+from tipos_compactos import montar_compacto
+
+
+DTYPE_BLOCO_DAT = np.dtype([
+    ('lon', np.float64),
+    ('lat', np.float64),
+    ('precipitacao_mm', np.float64),
+    ('data', np.int32),
+])
+EXTENSOES_COMPACTADAS = ('.zip', '.tar.gz', '.tgz')
+# Versões dos leitores no cache de entradas: incrementar quando a interpretação mudar
+VERSAO_LEITOR_DAT = 1
+VERSAO_LEITOR_COMPACTADO = 1
+
+
+def extrair_data_arquivo(nome_arquivo: str) -> pd.Timestamp | None:
+    base = Path(nome_arquivo).stem
+    try:
+        token = base.split('_')[-1].split('a')[-1].split('.')[0]
+        if len(token) != 6:
+            return None
+        return pd.to_datetime(token, format='%d%m%y')
+    except Exception:
+        return None
+
+
+def ler_valores_dat(origem) -> np.ndarray:
+    """Lê um .dat (caminho ou objeto de arquivo) como array (n, 3) de float64."""
+    with warnings.catch_warnings():
+        # Arquivo vazio gera apenas um aviso; tratamos como zero linhas.
+        warnings.simplefilter('ignore', UserWarning)
+        valores = np.loadtxt(origem, dtype=np.float64, usecols=(0, 1, 2), ndmin=2)
+    return valores.reshape(-1, 3)
+
+
+def ler_tabela_dat(caminho: Path) -> pd.DataFrame:
+    """Leitor de um .dat como tabela (lon, lat, precipitacao_mm), usado pelo cache."""
+    return pd.DataFrame(ler_valores_dat(caminho), columns=['lon', 'lat', 'precipitacao_mm'])
+
+
+def ler_bloco_dat(arquivos: list[Path], cache: CacheIngestao | None = None) -> np.ndarray:
+    """Lê vários .dat em um único array estruturado com ``DTYPE_BLOCO_DAT``.
+
+    Arquivos cujo nome não contém uma data válida são ignorados, como na
+    leitura arquivo a arquivo. Com ``cache``, arquivos já interpretados em
+    execuções anteriores são lidos do Parquet guardado.
+    """
+    partes = []
+    for arquivo in arquivos:
+        data_arquivo = extrair_data_arquivo(arquivo.name)
+        if data_arquivo is None:
+            continue
+        if cache is None:
+            valores = ler_valores_dat(arquivo)
+        else:
+            valores = ler_com_cache(arquivo, ler_tabela_dat, cache, VERSAO_LEITOR_DAT).to_numpy(dtype=np.float64)
+        partes.append((valores, data_arquivo))
+    return _montar_bloco(partes)
+
+
+def eh_compactado(caminho: Path) -> bool:
+    nome = Path(caminho).name.lower()
+    return nome.endswith(EXTENSOES_COMPACTADAS)
+
+
+def _selecionado(nome: str, membros) -> bool:
+    base = Path(nome).name
+    if membros is None:
+        return base.lower().endswith('.dat')
+    return any(fnmatch.fnmatch(base, padrao) for padrao in membros)
+
+
+def membros_dat(arquivo: Path, membros=None) -> Iterator[tuple[str, IO[bytes]]]:
+    """Percorre os membros de um .zip ou .tar.gz, entregando ``(nome, fluxo)``.
+
+    Por padrão entram todos os ``.dat``; ``membros`` é uma lista de nomes ou
+    padrões (``fnmatch``, comparados com o nome sem diretórios). O tar é lido
+    em modo sequencial, então cada fluxo só vale até o próximo membro.
+    """
+    arquivo = Path(arquivo)
+    if arquivo.name.lower().endswith('.zip'):
+        with zipfile.ZipFile(arquivo) as zip_ref:
+            for info in zip_ref.infolist():
+                if not info.is_dir() and _selecionado(info.filename, membros):
+                    with zip_ref.open(info) as fluxo:
+                        yield info.filename, fluxo
+        return
+    with tarfile.open(arquivo, 'r|*') as tar_ref:
+        for info in tar_ref:
+            if info.isfile() and _selecionado(info.name, membros):
+                yield info.name, tar_ref.extractfile(info)
+
+
+def ler_bloco_compactado(arquivos: list[Path], membros=None, cache: CacheIngestao | None = None) -> np.ndarray:
+    """Como ``ler_bloco_dat``, mas lendo os .dat de dentro de arquivos .zip/.tar.gz.
+
+    Cada membro é interpretado direto do fluxo descompactado. Com ``cache``
+    (e sem filtro de ``membros``), o conteúdo de cada arquivo compactado vai
+    para o cache como uma única tabela.
+    """
+    blocos = []
+    for arquivo in arquivos:
+        if cache is not None and membros is None:
+            tabela = ler_com_cache(arquivo, ler_tabela_compactada, cache, VERSAO_LEITOR_COMPACTADO)
+            bloco = np.empty(len(tabela), dtype=DTYPE_BLOCO_DAT)
+            for campo in DTYPE_BLOCO_DAT.names:
+                bloco[campo] = tabela[campo].to_numpy()
+            blocos.append(bloco)
+            continue
+        partes = []
+        for nome, fluxo in membros_dat(arquivo, membros):
+            data_arquivo = extrair_data_arquivo(nome)
+            if data_arquivo is not None:
+                partes.append((ler_valores_dat(fluxo), data_arquivo))
+        blocos.append(_montar_bloco(partes))
+    return np.concatenate(blocos) if blocos else np.empty(0, dtype=DTYPE_BLOCO_DAT)
+
+
+def ler_tabela_compactada(caminho: Path) -> pd.DataFrame:
+    """Leitor de um arquivo compactado como tabela (lon, lat, precipitacao_mm, data), usado pelo cache."""
+    return pd.DataFrame(ler_bloco_compactado([caminho]))
+
+
+def extrair_membros(arquivo: Path, destino: Path, membros) -> list[Path]:
+    """Extrai para ``destino`` apenas os membros pedidos (nomes ou padrões ``fnmatch``).
+
+    Os arquivos saem sem os diretórios internos do pacote.
+    """
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    extraidos = []
+    for nome, fluxo in membros_dat(arquivo, membros):
+        caminho = destino / Path(nome).name
+        with open(caminho, 'wb') as saida:
+            shutil.copyfileobj(fluxo, saida, 1 << 20)
+        extraidos.append(caminho)
+    return extraidos
+
+
+def _montar_bloco(partes: list[tuple[np.ndarray, pd.Timestamp]]) -> np.ndarray:
+    total = sum(len(valores) for valores, _ in partes)
+    bloco = np.empty(total, dtype=DTYPE_BLOCO_DAT)
+    inicio = 0
+    for valores, data_arquivo in partes:
+        fim = inicio + len(valores)
+        bloco['lon'][inicio:fim] = valores[:, 0]
+        bloco['lat'][inicio:fim] = valores[:, 1]
+        bloco['precipitacao_mm'][inicio:fim] = valores[:, 2]
+        bloco['data'][inicio:fim] = (data_arquivo - pd.Timestamp(0)).days
+        inicio = fim
+    return bloco
+
+
+def associar_estacoes(bloco: np.ndarray, estacoes: IndiceEstacoes) -> pd.DataFrame:
+    """Associa o bloco lido às estações e devolve o formato longo compacto.
+
+    A busca é feita por trecho de mesma data (um arquivo), de modo que arquivos
+    da mesma grade reaproveitam o mapeamento guardado no índice. O ponto sai
+    como categórico sobre o registro do índice (pontos sem estação recebem o
+    rótulo ``"lat,lon"``) e a data como dias desde a primeira data do bloco.
+    """
+    codigos = np.empty(len(bloco), dtype=np.int32)
+    limites = np.concatenate(([0], np.flatnonzero(np.diff(bloco['data'])) + 1, [len(bloco)]))
+    for inicio, fim in zip(limites[:-1], limites[1:]):
+        trecho = bloco[inicio:fim]
+        codigos[inicio:fim] = estacoes.codificar(trecho['lat'], trecho['lon'])
+
+    primeiro_dia = int(bloco['data'].min()) if len(bloco) else 0
+    return montar_compacto(codigos, estacoes.categorias, bloco['data'] - primeiro_dia,
+                           bloco['precipitacao_mm'], pd.Timestamp(primeiro_dia, unit='D'))
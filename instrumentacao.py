@@ -0,0 +1,186 @@
+"""Instrumentação por estágio dos scripts de comparação.
+
+Cada estágio (leitura, associação de estações, comparação, estatísticas,
+gravação...) é envolvido em ``estagio(nome, **contexto)``. Na saída do bloco
+é gerado um registro com tempo de parede e de CPU, linhas processadas, bytes
+lidos e gravados pelo processo (``/proc/self/io``, quando disponível) e o RSS
+máximo do processo até ali, junto com o contexto (par, membro, bloco...).
+
+Os registros vão como linhas JSON para o arquivo configurado; sem
+configuração, ``estagio`` só mede e nada é gravado. Um estágio escolhido
+pode ainda rodar sob cProfile (``.prof``) ou tracemalloc (``.txt`` com as
+maiores alocações), gravados no diretório de perfis.
+
+A configuração é global por processo (como o ``logging``); workers de um
+pool recebem ``configuracao()`` e chamam ``configurar(**config)``.
+"""
+from pathlib import Path
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import re
+import resource
+import time
+import tracemalloc
+
+
+PERFIS = ('cprofile', 'tracemalloc')
+
+
+def _io_processo() -> tuple[int, int] | None:
+    """(bytes lidos, bytes gravados) pelo processo via chamadas de sistema, se o SO informar."""
+    try:
+        with open('/proc/self/io', 'rb') as f:
+            campos = dict(linha.split(b':') for linha in f.read().splitlines())
+        return int(campos[b'rchar']), int(campos[b'wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _rss_max_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Registro:
+    """Medidas de um estágio; ``linhas`` e os bytes podem ser ajustados dentro do bloco."""
+
+    def __init__(self, estagio: str, contexto: dict):
+        self.estagio = estagio
+        self.contexto = contexto
+        self.linhas: int | None = None
+        self.bytes_lidos: int | None = None
+        self.bytes_gravados: int | None = None
+
+    def como_dict(self, parede_s: float, cpu_s: float, erro: str | None) -> dict:
+        registro = {
+            'ts': datetime.datetime.now().isoformat(timespec='milliseconds'),
+            'estagio': self.estagio,
+            **self.contexto,
+            'parede_s': round(parede_s, 6),
+            'cpu_s': round(cpu_s, 6),
+            'linhas': self.linhas,
+            'bytes_lidos': self.bytes_lidos,
+            'bytes_gravados': self.bytes_gravados,
+            'rss_max_mb': round(_rss_max_mb(), 1),
+            'pid': os.getpid(),
+        }
+        if erro is not None:
+            registro['erro'] = erro
+        return registro
+
+
+class Instrumentacao:
+    """Mede estágios e grava os registros como JSON lines em ``destino``."""
+
+    def __init__(self, destino: Path | None = None, script: str | None = None,
+                 perfil_estagio: str | None = None, perfil: str = 'cprofile',
+                 diretorio_perfis: Path | None = None):
+        if perfil not in PERFIS:
+            raise ValueError(f"Perfil desconhecido: {perfil!r} (use {' ou '.join(PERFIS)})")
+        self.destino = Path(destino) if destino is not None else None
+        if self.destino is not None:
+            self.destino.parent.mkdir(parents=True, exist_ok=True)
+        self.script = script
+        self.perfil_estagio = perfil_estagio
+        self.perfil = perfil
+        if diretorio_perfis is None:
+            diretorio_perfis = self.destino.parent if self.destino is not None else Path('.')
+        self.diretorio_perfis = Path(diretorio_perfis)
+
+    def configuracao(self) -> dict:
+        return {
+            'destino': self.destino,
+            'script': self.script,
+            'perfil_estagio': self.perfil_estagio,
+            'perfil': self.perfil,
+            'diretorio_perfis': self.diretorio_perfis,
+        }
+
+    @contextlib.contextmanager
+    def estagio(self, nome: str, **contexto):
+        registro = Registro(nome, ({'script': self.script} if self.script else {}) | contexto)
+        io_inicio = _io_processo()
+        with self._perfilar(nome, contexto):
+            inicio, inicio_cpu = time.perf_counter(), time.process_time()
+            erro = None
+            try:
+                yield registro
+            except BaseException as e:
+                erro = type(e).__name__
+                raise
+            finally:
+                parede, cpu = time.perf_counter() - inicio, time.process_time() - inicio_cpu
+                io_fim = _io_processo()
+                if io_inicio is not None and io_fim is not None:
+                    if registro.bytes_lidos is None:
+                        registro.bytes_lidos = io_fim[0] - io_inicio[0]
+                    if registro.bytes_gravados is None:
+                        registro.bytes_gravados = io_fim[1] - io_inicio[1]
+                self._emitir(registro.como_dict(parede, cpu, erro))
+
+    def _emitir(self, registro: dict) -> None:
+        if self.destino is None:
+            return
+        # Uma única escrita em modo append por linha: registros de vários
+        # processos não se misturam.
+        linha = json.dumps(registro, ensure_ascii=False, default=str) + '\n'
+        with open(self.destino, 'a', encoding='utf-8') as f:
+            f.write(linha)
+
+    @contextlib.contextmanager
+    def _perfilar(self, nome: str, contexto: dict):
+        if nome != self.perfil_estagio:
+            yield
+            return
+        sufixo = '_'.join(f"{v}" for v in contexto.values())
+        base = re.sub(r'[^\w.-]+', '_', f"perfil_{nome}_{sufixo}_{os.getpid()}".strip('_'))
+        self.diretorio_perfis.mkdir(parents=True, exist_ok=True)
+        if self.perfil == 'cprofile':
+            perfilador = cProfile.Profile()
+            perfilador.enable()
+            try:
+                yield
+            finally:
+                perfilador.disable()
+                perfilador.dump_stats(self.diretorio_perfis / f"{base}.prof")
+            return
+
+        ja_ativo = tracemalloc.is_tracing()
+        if not ja_ativo:
+            tracemalloc.start(25)
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            _, pico = tracemalloc.get_traced_memory()
+            estatisticas = tracemalloc.take_snapshot().statistics('traceback')[:25]
+            if not ja_ativo:
+                tracemalloc.stop()
+            linhas = [f"pico: {pico / 2**20:.2f} MB", '']
+            for estatistica in estatisticas:
+                linhas.append(f"{estatistica.size / 2**20:.2f} MB em {estatistica.count} blocos")
+                linhas.extend(f"    {linha}" for linha in estatistica.traceback.format(limit=8, most_recent_first=True))
+            (self.diretorio_perfis / f"{base}.txt").write_text('\n'.join(linhas) + '\n', encoding='utf-8')
+
+
+_atual = Instrumentacao()
+
+
+def configurar(destino: Path | None = None, script: str | None = None, perfil_estagio: str | None = None,
+               perfil: str = 'cprofile', diretorio_perfis: Path | None = None) -> Instrumentacao:
+    """Troca a instrumentação global do processo."""
+    global _atual
+    _atual = Instrumentacao(destino, script, perfil_estagio, perfil, diretorio_perfis)
+    return _atual
+
+
+def configuracao() -> dict:
+    """Configuração atual, para repassar a workers de um pool."""
+    return _atual.configuracao()
+
+
+def estagio(nome: str, **contexto):
+    """``Instrumentacao.estagio`` na instrumentação global."""
+    return _atual.estagio(nome, **contexto)
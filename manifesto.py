@@ -0,0 +1,52 @@
+"""Manifesto da pasta Output: impressões digitais das entradas de cada par.
+
+Um par (ONS N-1, TOK cN) só é recalculado quando as impressões digitais das
+suas entradas mudaram ou quando algum dos arquivos de saída registrados sumiu.
+A impressão digital de uma pasta usa apenas nome, tamanho e mtime dos
+arquivos (``os.stat``), sem ler o conteúdo.
+"""
+from pathlib import Path
+import hashlib
+import json
+
+from escrita_saida import escrever_atomico
+
+
+ARQUIVO_MANIFESTO = 'manifesto.json'
+
+
+def impressao_digital(caminho: Path) -> str:
+    """Resumo de nome, tamanho e mtime de um arquivo ou dos arquivos de uma pasta."""
+    caminho = Path(caminho)
+    h = hashlib.blake2b(digest_size=16)
+    arquivos = sorted(p for p in caminho.iterdir() if p.is_file()) if caminho.is_dir() else [caminho]
+    for arquivo in arquivos:
+        stat = arquivo.stat()
+        h.update(f"{arquivo.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+class Manifesto:
+    def __init__(self, caminho_output: Path):
+        self.caminho_output = Path(caminho_output)
+        self.arquivo = self.caminho_output / ARQUIVO_MANIFESTO
+        try:
+            self.pares = json.loads(self.arquivo.read_text(encoding='utf-8')).get('pares', {})
+        except (OSError, ValueError):
+            self.pares = {}
+
+    def atualizado(self, rotulo: str, entradas: dict) -> bool:
+        """True se o par já foi processado com estas entradas e as saídas existem."""
+        registro = self.pares.get(rotulo)
+        if registro is None or registro.get('entradas') != entradas:
+            return False
+        return all((self.caminho_output / nome).exists() for nome in registro.get('saidas', []))
+
+    def registrar(self, rotulo: str, entradas: dict, saidas: list[str]) -> None:
+        self.pares[rotulo] = {'entradas': entradas, 'saidas': sorted(saidas)}
+        self.salvar()
+
+    def salvar(self) -> None:
+        self.caminho_output.mkdir(parents=True, exist_ok=True)
+        conteudo = json.dumps({'versao': 1, 'pares': self.pares}, indent=1, sort_keys=True)
+        escrever_atomico(self.arquivo, lambda tmp: tmp.write_text(conteudo, encoding='utf-8'))
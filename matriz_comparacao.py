@@ -0,0 +1,171 @@
+"""Comparação ONS × TOK sobre matrizes densas ponto × data.
+
+As duas fontes são alinhadas uma única vez em arrays ``(pontos, datas)`` com
+máscaras de validade. Todas as saídas (matriz de diferenças, estatísticas por
+ponto, acumulados, diferença percentual e a tabela longa) são reduções NumPy
+sobre esses arrays, sem pivot, merge ou groupby. A verificação categórica
+por limiar de chuva (``verificacao_categorica``) usa os mesmos arrays.
+
+As convenções são as da comparação em formato longo: uma célula existe quando
+qualquer uma das fontes tem valor, a fonte ausente conta como 0 e a matriz de
+diferenças só tem valor quando as duas fontes estão presentes.
+"""
+import numpy as np
+import pandas as pd
+
+from tipos_compactos import alinhar, compactar, datas as datas_de
+from verificacao_categorica import LIMIARES_PADRAO, tabela_categorica
+
+
+class ComparacaoAlinhada:
+    """ONS e TOK alinhados em ``(pontos, datas)``.
+
+    ``diferenca`` escolhe o sentido: ``'tok-ons'`` (script diário) ou
+    ``'ons-tok'`` (notebook). A diferença percentual usa sempre o subtraendo
+    como denominador.
+    """
+
+    def __init__(self, pontos, datas: pd.DatetimeIndex, ons: np.ndarray, tok: np.ndarray,
+                 valido_ons: np.ndarray, valido_tok: np.ndarray, diferenca: str = 'tok-ons'):
+        if diferenca not in ('tok-ons', 'ons-tok'):
+            raise ValueError(f"diferenca deve ser 'tok-ons' ou 'ons-tok', não {diferenca!r}")
+        self.pontos = pd.Index(np.asarray(pontos, dtype=object), name='ponto')
+        self.datas = pd.DatetimeIndex(datas, name='data')
+        self.ons = ons
+        self.tok = tok
+        self.valido_ons = valido_ons
+        self.valido_tok = valido_tok
+        self.sentido = diferenca
+
+        self.presente = valido_ons | valido_tok
+        # Fonte ausente (ou sem valor) conta como 0, como no fillna(0) do merge.
+        self.ons0 = np.where(valido_ons & ~np.isnan(ons), ons, 0).astype(np.float32)
+        self.tok0 = np.where(valido_tok & ~np.isnan(tok), tok, 0).astype(np.float32)
+        if diferenca == 'tok-ons':
+            self.diferenca = self.tok0 - self.ons0
+            self._denominador = self.ons0
+        else:
+            self.diferenca = self.ons0 - self.tok0
+            self._denominador = self.tok0
+        self.n = self.presente.sum(axis=1)
+
+    @classmethod
+    def de_compactos(cls, dados_ons: pd.DataFrame, dados_tok: pd.DataFrame, dias: np.ndarray | None = None,
+                     diferenca: str = 'tok-ons') -> 'ComparacaoAlinhada':
+        """Monta a partir de frames compactos já alinhados (``tipos_compactos.alinhar``)."""
+        codigos = np.union1d(dados_ons['ponto'].cat.codes.to_numpy(), dados_tok['ponto'].cat.codes.to_numpy())
+        if dias is None:
+            dias = np.union1d(dados_ons['dia'].to_numpy(), dados_tok['dia'].to_numpy())
+
+        def espalhar(df):
+            valores = np.full((len(codigos), len(dias)), np.nan, dtype=np.float32)
+            valido = np.zeros(valores.shape, dtype=bool)
+            i = np.searchsorted(codigos, df['ponto'].cat.codes.to_numpy())
+            j = np.searchsorted(dias, df['dia'].to_numpy())
+            valores[i, j] = df['precipitacao_mm'].to_numpy()
+            valido[i, j] = True
+            return valores, valido
+
+        ons, valido_ons = espalhar(dados_ons)
+        tok, valido_tok = espalhar(dados_tok)
+        pontos = dados_ons['ponto'].cat.categories.to_numpy(dtype=object)[codigos]
+        datas = datas_de(dias, dados_ons.attrs['data_base'], dados_ons.attrs['passo'])
+        return cls(pontos, datas, ons, tok, valido_ons, valido_tok, diferenca)
+
+    @classmethod
+    def de_frames(cls, dados_ons: pd.DataFrame, dados_tok: pd.DataFrame,
+                  diferenca: str = 'tok-ons') -> 'ComparacaoAlinhada':
+        """Monta a partir de frames padronizados (ponto, data, precipitacao_mm) ou compactos."""
+        dados_ons, dados_tok = alinhar(compactar(dados_ons), compactar(dados_tok))
+        return cls.de_compactos(dados_ons, dados_tok, diferenca=diferenca)
+
+    def _soma(self, valores: np.ndarray) -> np.ndarray:
+        return np.where(self.presente, valores, 0).sum(axis=1, dtype=np.float64)
+
+    def diferenca_pct(self) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct = self.diferenca / self._denominador * 100
+        return np.where(self._denominador != 0, pct, 0).astype(np.float32)
+
+    def matriz_diferencas(self) -> pd.DataFrame:
+        """Diferença ponto × data; NaN onde uma das fontes não tem valor."""
+        if self.sentido == 'tok-ons':
+            matriz = self.tok - self.ons
+        else:
+            matriz = self.ons - self.tok
+        matriz = np.where(self.valido_ons & self.valido_tok, matriz, np.nan)
+        return pd.DataFrame(matriz, index=self.pontos, columns=self.datas)
+
+    def estatisticas_por_ponto(self) -> pd.DataFrame:
+        """Médias, totais, desvio, extremos e diferença absoluta por ponto (não arredondados)."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ons_total = self._soma(self.ons0)
+            tok_total = self._soma(self.tok0)
+            dif_total = self._soma(self.diferenca)
+            dif_media = dif_total / self.n
+            desvio = np.where(self.presente, self.diferenca - dif_media[:, None], 0)
+            dif_std = np.sqrt((desvio.astype(np.float64) ** 2).sum(axis=1) / (self.n - 1))
+            dif_std = np.where(self.n > 1, dif_std, np.nan)
+            dif_abs = np.abs(self.diferenca)
+            return pd.DataFrame({
+                'ONS_media': ons_total / self.n,
+                'ONS_total': ons_total,
+                'TOK_media': tok_total / self.n,
+                'TOK_total': tok_total,
+                'Dif_media': dif_media,
+                'Dif_total': dif_total,
+                'Dif_std': dif_std,
+                'Dif_min': np.where(self.presente, self.diferenca, np.inf).min(axis=1),
+                'Dif_max': np.where(self.presente, self.diferenca, -np.inf).max(axis=1),
+                'Dif_abs_media': self._soma(dif_abs) / self.n,
+                'Dif_abs_max': np.where(self.presente, dif_abs, 0).max(axis=1),
+            }, index=self.pontos)
+
+    def desvio_por_data(self) -> pd.Series:
+        """Desvio padrão das diferenças de cada data, entre os pontos presentes."""
+        n = self.presente.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            media = np.where(self.presente, self.diferenca, 0).sum(axis=0, dtype=np.float64) / n
+            desvio = np.where(self.presente, self.diferenca - media, 0).astype(np.float64)
+            std = np.sqrt((desvio ** 2).sum(axis=0) / (n - 1))
+        return pd.Series(np.where(n > 1, std, np.nan), index=self.datas, name='diferenca')
+
+    def acumulados(self) -> pd.DataFrame:
+        """Acumulados positivos, negativos e líquidos das diferenças (arredondados em 2 casas).
+
+        Como no groupby das diferenças filtradas, só aparecem pontos com alguma
+        diferença não nula.
+        """
+        positivo = np.where(self.presente & (self.diferenca > 0), self.diferenca, 0)
+        negativo = np.where(self.presente & (self.diferenca < 0), self.diferenca, 0)
+        tem_diferenca = (positivo > 0).any(axis=1) | (negativo < 0).any(axis=1)
+        acumulados = pd.DataFrame({
+            'Acumulado_Positivo_mm': positivo.sum(axis=1, dtype=np.float64),
+            'Acumulado_Negativo_mm': negativo.sum(axis=1, dtype=np.float64),
+        }, index=self.pontos)[tem_diferenca].round(2)
+        acumulados['Total_Liquido_mm'] = acumulados['Acumulado_Positivo_mm'] + acumulados['Acumulado_Negativo_mm']
+        return acumulados
+
+    def categorica(self, limiares=LIMIARES_PADRAO) -> pd.DataFrame:
+        """Contingência e POD/FAR/CSI/ETS/viés por ponto e limiar (ONS como referência).
+
+        Ao contrário das demais saídas, só contam as datas em que as duas
+        fontes têm valor.
+        """
+        ons = np.where(self.valido_ons, self.ons, np.nan)
+        tok = np.where(self.valido_tok, self.tok, np.nan)
+        return tabela_categorica(ons, tok, limiares, eixos=1, grupos={'ponto': self.pontos})
+
+    def tabela_longa(self) -> pd.DataFrame:
+        """Formato longo (uma linha por célula presente), ordenado por ponto e data."""
+        i, j = np.nonzero(self.presente)
+        diferenca = self.diferenca[i, j]
+        return pd.DataFrame({
+            'ponto': self.pontos.to_numpy()[i],
+            'data': self.datas[j],
+            'precipitacao_mm_ons': self.ons0[i, j],
+            'precipitacao_mm_tok': self.tok0[i, j],
+            'diferenca': diferenca,
+            'diferenca_abs': np.abs(diferenca),
+            'diferenca_pct': self.diferenca_pct()[i, j],
+        })
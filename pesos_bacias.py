@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Pesos esparsos grade → bacia a partir dos contornos (``CONTORNOS``).
+
+Para uma grade de modelo (ECMWF, GEFS, ETA40...) dada pelos pontos de um
+.dat, cada célula é o retângulo centrado no ponto com o espaçamento da grade.
+O peso da célula na bacia é a área da interseção com o polígono, corrigida
+por cos(lat), normalizada para somar 1 por bacia. A matriz ``bacia × ponto``
+é esparsa (CSR): a média de um campo em todas as bacias é um único produto
+matriz-vetor, e um array ``(pontos, leads, membros)`` sai em um só produto.
+
+O cálculo das interseções é o passo caro, então a matriz é guardada em
+``<cache>/pesos_bacias/`` com a assinatura da grade (coordenadas dos pontos,
+na ordem do arquivo) e a dos contornos no nome. Outra execução com a mesma
+grade e os mesmos contornos só lê o .npz.
+
+Contornos aceitos: arquivos .bln (como os de ``contornos_scripts``), pastas
+e pacotes .tgz/.zip com .bln, o GeoParquet de
+``CONTORNOS/export_headless.py`` e o CSV/Parquet WKT do ``CONTORNOS/main.py``
+(chave: ``ana_code`` quando houver, senão o nome). ``--bacias`` limita o
+cálculo às bacias pedidas; no GeoParquet só essas geometrias são lidas.
+
+Uso:
+    python pesos_bacias.py --grade ETA40 --dat ETA40_p210126a220126.dat \\
+        --contornos CONTORNOS/contornos_scripts/ETA40/Tocantins/contornos_anteriores/contornos_anteriores.tgz \\
+        --medias ETA40_p210126a*.dat --saida medias_bacias.csv
+"""
+from pathlib import Path
+import argparse
+import hashlib
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import shapely
+
+from cache_ingestao import diretorio_padrao
+from contornos_geoparquet import contornos_por_chave, eh_geoparquet, ler_geoparquet
+from escrita_saida import FORMATOS_SAIDA, escrever_atomico, escrever_tabela, nome_saida
+from ingestao import eh_compactado, extrair_data_arquivo, ler_valores_dat, membros_dat
+
+
+SUBDIRETORIO_CACHE = 'pesos_bacias'
+CASAS_COORDENADAS = 5
+
+
+def ler_bln(origem) -> shapely.Polygon:
+    """Polígono de um .bln (caminho ou arquivo binário): contagem na 1ª linha, depois lon,lat[,z]."""
+    if isinstance(origem, (str, Path)):
+        texto = Path(origem).read_text(encoding='utf-8', errors='replace')
+    else:
+        texto = origem.read().decode('utf-8', errors='replace')
+    linhas = [linha for linha in texto.splitlines() if linha.strip()][1:]
+    coordenadas = []
+    for linha in linhas:
+        partes = linha.split(',')
+        try:
+            coordenadas.append((float(partes[0]), float(partes[1])))
+        except (ValueError, IndexError):
+            continue
+    if len(coordenadas) < 3:
+        raise ValueError(f"Polígono com menos de 3 pontos ({len(coordenadas)})")
+    poligono = shapely.Polygon(coordenadas)
+    return poligono if poligono.is_valid else shapely.make_valid(poligono)
+
+
+def _ler_wkt(caminho: Path, bacias=None) -> dict[str, shapely.Geometry]:
+    """GeoParquet do ``export_headless.py`` ou CSV (;)/Parquet WKT do ``CONTORNOS/main.py``."""
+    if caminho.suffix == '.parquet' and eh_geoparquet(caminho):
+        return contornos_por_chave(ler_geoparquet(caminho, bacias=bacias))
+    if caminho.suffix == '.parquet':
+        tabela = pd.read_parquet(caminho)
+        chaves = tabela['basin_name'].astype(str)
+        if 'ana_code' in tabela:
+            codigos = tabela['ana_code'].fillna('').astype(str)
+            chaves = codigos.where(codigos != '', chaves)
+        return {k: shapely.from_wkt(g) for k, nome, g in zip(chaves, tabela['basin_name'].astype(str), tabela['geometry'])
+                if isinstance(g, str) and g and (bacias is None or k in bacias or nome in bacias)}
+    contornos = {}
+    linhas = caminho.read_text(encoding='utf-8').splitlines()
+    cabecalho = linhas[0].split(';') if linhas else []
+    for linha in linhas[1:]:
+        partes = linha.split(';')
+        if len(partes) < 2 or not partes[-1].strip():
+            continue
+        # O arquivo EC45 tem uma coluna a menos que o cabeçalho; a geometria é sempre a última
+        campos = dict(zip(cabecalho, partes)) if len(partes) == len(cabecalho) else {}
+        chave = campos.get('ana_code') or partes[0]
+        if bacias is None or chave in bacias or partes[0] in bacias:
+            contornos[chave] = shapely.from_wkt(partes[-1])
+    return contornos
+
+
+def carregar_contornos(*origens, bacias=None) -> dict[str, shapely.Geometry]:
+    """Contornos por chave (nome do .bln ou código), na ordem de leitura.
+
+    Cada origem pode ser um .bln, uma pasta (busca recursiva de .bln), um
+    pacote .tgz/.tar.gz/.zip com .bln, um GeoParquet ou um CSV/Parquet WKT.
+    Com ``bacias``, só são lidos os contornos com essas chaves ou nomes.
+    """
+    pedidas = None if bacias is None else {str(b) for b in bacias}
+
+    def pedido(*chaves):
+        return pedidas is None or any(chave in pedidas for chave in chaves)
+
+    contornos = {}
+    for origem in origens:
+        origem = Path(origem)
+        if origem.is_dir():
+            for arquivo in sorted(origem.rglob('*.bln')):
+                if pedido(arquivo.stem):
+                    contornos[arquivo.stem] = ler_bln(arquivo)
+        elif eh_compactado(origem):
+            for nome, fluxo in membros_dat(origem, ['*.bln']):
+                if pedido(Path(nome).stem):
+                    contornos[Path(nome).stem] = ler_bln(fluxo)
+        elif origem.suffix.lower() == '.bln':
+            if pedido(origem.stem):
+                contornos[origem.stem] = ler_bln(origem)
+        elif origem.suffix.lower() in ('.csv', '.parquet'):
+            contornos.update(_ler_wkt(origem, pedidas))
+        else:
+            raise ValueError(f"Origem de contornos não reconhecida: {origem}")
+    return contornos
+
+
+def assinatura_contornos(contornos: dict) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for chave, geometria in contornos.items():
+        h.update(chave.encode() + b'\0' + shapely.to_wkb(geometria) + b'\n')
+    return h.hexdigest()
+
+
+def _espacamento(valores: np.ndarray) -> float:
+    unicos = np.unique(np.round(valores, CASAS_COORDENADAS))
+    passos = np.diff(unicos)
+    return float(np.median(passos)) if len(passos) else 0.0
+
+
+class Grade:
+    """Pontos de uma grade de modelo na ordem do campo (.dat), com o espaçamento inferido."""
+
+    def __init__(self, nome: str, lon, lat, dlon: float | None = None, dlat: float | None = None):
+        self.nome = nome
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.dlon = _espacamento(self.lon) if dlon is None else float(dlon)
+        self.dlat = _espacamento(self.lat) if dlat is None else float(dlat)
+
+    @classmethod
+    def de_dat(cls, nome: str, caminho: Path) -> 'Grade':
+        valores = ler_valores_dat(caminho)
+        return cls(nome, valores[:, 0], valores[:, 1])
+
+    def __len__(self) -> int:
+        return len(self.lon)
+
+    @property
+    def assinatura(self) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(np.round(self.lon, CASAS_COORDENADAS).tobytes())
+        h.update(np.round(self.lat, CASAS_COORDENADAS).tobytes())
+        h.update(f"{self.dlon:.6f},{self.dlat:.6f}".encode())
+        return h.hexdigest()
+
+    def celulas(self, indices: np.ndarray) -> np.ndarray:
+        """Retângulos (shapely) das células dos pontos ``indices``."""
+        lon, lat = self.lon[indices], self.lat[indices]
+        return shapely.box(lon - self.dlon / 2, lat - self.dlat / 2, lon + self.dlon / 2, lat + self.dlat / 2)
+
+
+def calcular_pesos(grade: Grade, contornos: dict) -> scipy.sparse.csr_matrix:
+    """Matriz ``bacia × ponto`` de pesos por área (cos(lat)), cada linha somando 1.
+
+    Só as células dentro do retângulo envolvente de cada bacia são
+    intersectadas. Bacias sem nenhuma célula ficam com a linha vazia.
+    """
+    linhas, colunas, pesos = [], [], []
+    for i, geometria in enumerate(contornos.values()):
+        xmin, ymin, xmax, ymax = geometria.bounds
+        candidatos = np.flatnonzero((grade.lon + grade.dlon / 2 > xmin) & (grade.lon - grade.dlon / 2 < xmax)
+                                    & (grade.lat + grade.dlat / 2 > ymin) & (grade.lat - grade.dlat / 2 < ymax))
+        if not len(candidatos):
+            continue
+        area = shapely.area(shapely.intersection(grade.celulas(candidatos), geometria))
+        area = area * np.cos(np.radians(grade.lat[candidatos]))
+        usados = area > 0
+        if not usados.any():
+            continue
+        linhas.append(np.full(usados.sum(), i))
+        colunas.append(candidatos[usados])
+        pesos.append(area[usados] / area[usados].sum())
+    forma = (len(contornos), len(grade))
+    if not linhas:
+        return scipy.sparse.csr_matrix(forma)
+    return scipy.sparse.csr_matrix((np.concatenate(pesos), (np.concatenate(linhas), np.concatenate(colunas))),
+                                   shape=forma)
+
+
+class PesosBacias:
+    """Pesos grade → bacia de uma grade e um conjunto de contornos."""
+
+    def __init__(self, bacias, matriz: scipy.sparse.csr_matrix, assinatura_grade: str):
+        self.bacias = pd.Index(np.asarray(bacias, dtype=object), name='bacia')
+        self.matriz = scipy.sparse.csr_matrix(matriz)
+        self.assinatura_grade = assinatura_grade
+
+    def media(self, campo: np.ndarray) -> np.ndarray:
+        """Média por bacia de ``campo`` ``(pontos, ...)``; sai ``(bacias, ...)``.
+
+        Pontos com NaN saem da média e os pesos restantes são renormalizados;
+        bacia sem ponto válido fica NaN.
+        """
+        campo = np.asarray(campo, dtype=np.float64)
+        plano = campo.reshape(len(campo), -1)
+        valido = ~np.isnan(plano)
+        soma = self.matriz @ np.where(valido, plano, 0)
+        peso = self.matriz @ valido.astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            media = np.where(peso > 0, soma / peso, np.nan)
+        return media.reshape((len(self.bacias),) + campo.shape[1:])
+
+    def cobertura(self) -> pd.Series:
+        """Número de células com peso em cada bacia."""
+        return pd.Series(np.diff(self.matriz.indptr), index=self.bacias, name='celulas')
+
+    def salvar(self, caminho: Path) -> None:
+        def gravar(tmp: Path):
+            with open(tmp, 'wb') as f:
+                np.savez_compressed(f, data=self.matriz.data, indices=self.matriz.indices,
+                                    indptr=self.matriz.indptr, forma=np.array(self.matriz.shape),
+                                    bacias=np.asarray(self.bacias, dtype=str),
+                                    assinatura_grade=np.array(self.assinatura_grade))
+        escrever_atomico(caminho, gravar)
+
+    @classmethod
+    def abrir(cls, caminho: Path) -> 'PesosBacias':
+        with np.load(caminho, allow_pickle=False) as dados:
+            matriz = scipy.sparse.csr_matrix((dados['data'], dados['indices'], dados['indptr']),
+                                             shape=tuple(dados['forma']))
+            return cls(dados['bacias'].tolist(), matriz, str(dados['assinatura_grade']))
+
+
+def pesos_bacias(grade: Grade, contornos: dict, cache_dir: Path | None = None) -> PesosBacias:
+    """Pesos da grade, lidos do cache em disco ou calculados e guardados nele."""
+    diretorio = Path(cache_dir or diretorio_padrao()) / SUBDIRETORIO_CACHE
+    caminho = diretorio / f"{grade.nome}_{grade.assinatura}_{assinatura_contornos(contornos)}.npz"
+    if caminho.exists():
+        try:
+            return PesosBacias.abrir(caminho)
+        except (OSError, ValueError, KeyError):
+            pass
+    pesos = PesosBacias(list(contornos), calcular_pesos(grade, contornos), grade.assinatura)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    pesos.salvar(caminho)
+    return pesos
+
+
+def medias_arquivos(arquivos, nome_grade: str, contornos: dict, cache_dir: Path | None = None) -> pd.DataFrame:
+    """Média por bacia de cada .dat (bacia, data, precipitacao_mm).
+
+    Arquivos com a mesma grade reaproveitam os pesos já carregados.
+    """
+    carregados = {}
+    partes = []
+    for arquivo in arquivos:
+        valores = ler_valores_dat(arquivo)
+        grade = Grade(nome_grade, valores[:, 0], valores[:, 1])
+        if grade.assinatura not in carregados:
+            carregados[grade.assinatura] = pesos_bacias(grade, contornos, cache_dir)
+        pesos = carregados[grade.assinatura]
+        partes.append(pd.DataFrame({
+            'bacia': pesos.bacias,
+            'data': extrair_data_arquivo(Path(arquivo).name),
+            'precipitacao_mm': pesos.media(valores[:, 2]),
+        }))
+    if not partes:
+        return pd.DataFrame(columns=['bacia', 'data', 'precipitacao_mm'])
+    return pd.concat(partes, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pesos esparsos grade → bacia e médias de precipitação por bacia')
+    parser.add_argument('--grade', required=True, help='Nome da grade (ECMWF, GEFS, ETA40...)')
+    parser.add_argument('--dat', required=True, help='.dat de referência com os pontos da grade')
+    parser.add_argument('--contornos', nargs='+', required=True,
+                        help='.bln, pastas ou pacotes com .bln, GeoParquet do CONTORNOS/export_headless.py '
+                             'ou CSV/Parquet WKT do CONTORNOS/main.py')
+    parser.add_argument('--bacias', nargs='+', default=None, help='Só estas bacias (chave, nome ou ana_code)')
+    parser.add_argument('--cache-dir', default=None, help='Diretório do cache (padrão: o do cache de entradas)')
+    parser.add_argument('--medias', nargs='*', default=None, help='.dat cujas médias por bacia calcular')
+    parser.add_argument('--saida', default=None, help='Arquivo das médias por bacia')
+    parser.add_argument('--output-format', choices=FORMATOS_SAIDA, default='csv')
+    args = parser.parse_args()
+
+    contornos = carregar_contornos(*args.contornos, bacias=args.bacias)
+    grade = Grade.de_dat(args.grade, Path(args.dat))
+    print(f"Grade {grade.nome}: {len(grade)} pontos, {grade.dlon:g}° × {grade.dlat:g}° "
+          f"(assinatura {grade.assinatura[:12]})")
+    pesos = pesos_bacias(grade, contornos, args.cache_dir)
+    cobertura = pesos.cobertura()
+    print(f"{len(pesos.bacias)} bacias, {pesos.matriz.nnz} pesos não nulos")
+    for bacia, celulas in cobertura[cobertura == 0].items():
+        print(f"  Aviso: bacia sem células da grade: {bacia}")
+
+    if args.medias:
+        medias = medias_arquivos([Path(a) for a in args.medias], args.grade, contornos, args.cache_dir)
+        if args.saida:
+            saida = Path(args.saida)
+            saida = saida.with_name(nome_saida(saida.stem, args.output_format))
+            escrever_tabela(medias, saida, args.output_format)
+            print(f"Médias por bacia salvas em: {saida}")
+        else:
+            print(medias.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
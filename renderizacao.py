@@ -0,0 +1,261 @@
+"""Figuras da comparação (heatmaps, acumulados, histograma e boxplots) em PNG.
+
+Cada figura é dividida em partes (um bloco de pontos por parte, como nos
+subplots do notebook) e cada parte é desenhada em uma ``Figure`` própria do
+backend Agg, sem ``pyplot``. As partes podem rodar em um pool de processos
+(os pixels de cada parte passam por um .npy temporário, não pelo pickle de
+volta ao processo pai); as imagens de uma figura são empilhadas na ordem e
+gravadas direto no PNG de destino.
+
+Os heatmaps usam ``imshow`` (uma única imagem rasterizada por bloco) em vez de
+um retângulo por célula, e os valores só são escritos nas células quando elas
+têm espaço para o texto.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import math
+import tempfile
+
+import numpy as np
+from matplotlib import cbook, colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+from PIL import Image
+
+from escrita_saida import escrever_atomico
+
+
+DPI_PADRAO = 300
+PONTOS_POR_BLOCO_HEATMAP = 27
+PONTOS_POR_BLOCO_BOXPLOT = 20
+FONTE_ANOTACAO = 8
+# zlib rápido: as figuras têm grandes áreas lisas e o nível padrão (6) custa
+# várias vezes mais tempo para poucos por cento de tamanho.
+COMPRESSAO_PNG = 1
+
+
+def _blocos(pontos: list, tamanho: int) -> list[slice]:
+    return [slice(i, i + tamanho) for i in range(0, len(pontos), max(tamanho, 1))]
+
+
+def _imagem(fig: Figure) -> np.ndarray:
+    """Desenha a figura e devolve os pixels RGB."""
+    canvas = FigureCanvasAgg(fig)
+    fig.tight_layout()
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[..., :3].copy()
+
+
+def _rotulos(ax, eixo: str, rotulos: list, espaco_pt: float) -> None:
+    """Marca todos os rótulos que cabem no eixo (no máximo um a cada ~12 pt)."""
+    passo = max(1, math.ceil(len(rotulos) / max(espaco_pt / 12, 1)))
+    posicoes = np.arange(0, len(rotulos), passo)
+    if eixo == 'x':
+        ax.set_xticks(posicoes, [rotulos[i] for i in posicoes], rotation=45, ha='right')
+    else:
+        ax.set_yticks(posicoes, [rotulos[i] for i in posicoes])
+
+
+def parte_heatmap(valores: np.ndarray, pontos: list, datas: list, titulo: str, rotulo: str, cmap: str,
+                  vmin: float, vmax: float, dpi: int = DPI_PADRAO) -> np.ndarray:
+    """Um bloco de heatmap ponto × data (14 × 8 polegadas, como no notebook)."""
+    fig = Figure(figsize=(14, 8), dpi=dpi)
+    ax = fig.add_subplot()
+    norma = Normalize(vmin=vmin, vmax=vmax)
+    mapa = colormaps[cmap]
+    im = ax.imshow(valores, cmap=mapa, norm=norma, aspect='auto', interpolation='nearest')
+    fig.colorbar(im, ax=ax, label=rotulo)
+    ax.set_title(titulo, fontsize=14, fontweight='bold', pad=20)
+    ax.set_xlabel('Data', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Ponto de Interesse', fontsize=12, fontweight='bold')
+    for lado in ax.spines.values():
+        lado.set_visible(False)
+
+    # Tamanho aproximado da área do gráfico (antes do ajuste de margens)
+    largura_fig, altura_fig = fig.get_size_inches()
+    caixa = ax.get_position()
+    largura_pt, altura_pt = caixa.width * largura_fig * 72, caixa.height * altura_fig * 72
+    n_pontos, n_datas = valores.shape
+    celula_x, celula_y = largura_pt / max(n_datas, 1), altura_pt / max(n_pontos, 1)
+    _rotulos(ax, 'x', list(datas), largura_pt)
+    _rotulos(ax, 'y', list(pontos), altura_pt)
+    ax.tick_params(length=0)
+
+    if min(celula_x, celula_y) >= 3:
+        ax.hlines(np.arange(n_pontos + 1) - 0.5, -0.5, n_datas - 0.5, colors='white', linewidth=0.5)
+        ax.vlines(np.arange(n_datas + 1) - 0.5, -0.5, n_pontos - 0.5, colors='white', linewidth=0.5)
+    if celula_x >= 3.2 * FONTE_ANOTACAO and celula_y >= 1.4 * FONTE_ANOTACAO:
+        # Cor do texto pela luminância do fundo (mesmo critério do seaborn)
+        cores = mapa(norma(valores))
+        luminancia = cores[..., :3] @ np.array([0.2126, 0.7152, 0.0722])
+        for (i, j), valor in np.ndenumerate(valores):
+            ax.text(j, i, f"{valor:.1f}", ha='center', va='center', fontsize=FONTE_ANOTACAO,
+                    color='black' if luminancia[i, j] > 0.408 else 'white')
+    return _imagem(fig)
+
+
+def partes_heatmap(matriz, titulo: str, rotulo: str, cmap: str, vmin: float, vmax: float,
+                   dpi: int = DPI_PADRAO) -> list[tuple]:
+    """Partes de um heatmap de ``matriz`` (DataFrame ponto × data), em blocos de 27 pontos."""
+    pontos = [str(p) for p in matriz.index]
+    datas = [str(d) for d in matriz.columns]
+    valores = matriz.to_numpy(dtype=np.float64)
+    return [(parte_heatmap, dict(valores=valores[bloco], pontos=pontos[bloco], datas=datas,
+                                 titulo=f'{titulo} | Parte {i}', rotulo=rotulo, cmap=cmap,
+                                 vmin=vmin, vmax=vmax, dpi=dpi))
+            for i, bloco in enumerate(_blocos(pontos, PONTOS_POR_BLOCO_HEATMAP), start=1)]
+
+
+def parte_acumulados(pontos: list, positivo: np.ndarray, negativo: np.ndarray, desvio: np.ndarray,
+                     parte: int, subtitulo: str, dpi: int = DPI_PADRAO) -> np.ndarray:
+    """Uma linha da figura de acumulados: barras positivas/negativas e desvio padrão por ponto."""
+    fig = Figure(figsize=(16, 6), dpi=dpi)
+    ax1, ax2 = fig.subplots(1, 2)
+    x = np.arange(len(pontos))
+    ax1.bar(x - 0.125, positivo, width=0.25, color='green', alpha=0.7, label='Positivas (ONS > TOK)')
+    ax1.bar(x + 0.125, negativo, width=0.25, color='red', alpha=0.7, label='Negativas (ONS < TOK)')
+    ax1.set_title(f'Acumulado de Diferenças por Ponto (Parte {parte})\n{subtitulo}', fontsize=12, fontweight='bold')
+    ax1.set_xlabel('Ponto de Interesse', fontsize=10, fontweight='bold')
+    ax1.set_ylabel('Precipitação Acumulada (mm)', fontsize=10, fontweight='bold')
+    ax1.legend()
+    ax1.grid(axis='y', alpha=0.3)
+    ax1.axhline(y=0, color='black', linestyle='-', linewidth=0.8)
+
+    ax2.bar(x, desvio, width=0.5, color='orange', alpha=0.7)
+    ax2.set_title(f'Desvio Padrão das Diferenças por Ponto (Parte {parte})\n{subtitulo}',
+                  fontsize=12, fontweight='bold')
+    ax2.set_xlabel('Ponto de Interesse', fontsize=10, fontweight='bold')
+    ax2.set_ylabel('Desvio Padrão (mm)', fontsize=10, fontweight='bold')
+    ax2.grid(axis='y', alpha=0.3)
+    for ax in (ax1, ax2):
+        ax.set_xticks(x, pontos, rotation=45, ha='right')
+    return _imagem(fig)
+
+
+def partes_acumulados(acumulados, desvios, subtitulo: str, dpi: int = DPI_PADRAO) -> list[tuple]:
+    """Partes da figura de acumulados: os pontos em três blocos, como no notebook."""
+    pontos = [str(p) for p in acumulados.index]
+    desvio = desvios.reindex(acumulados.index).to_numpy(dtype=np.float64)
+    positivo = acumulados['Acumulado_Positivo_mm'].to_numpy(dtype=np.float64)
+    negativo = acumulados['Acumulado_Negativo_mm'].to_numpy(dtype=np.float64)
+    tamanho = len(pontos) // 3 + len(pontos) % 3
+    return [(parte_acumulados, dict(pontos=pontos[bloco], positivo=positivo[bloco], negativo=negativo[bloco],
+                                    desvio=desvio[bloco], parte=i, subtitulo=subtitulo, dpi=dpi))
+            for i, bloco in enumerate(_blocos(pontos, tamanho), start=1)]
+
+
+def parte_histograma(diferencas: np.ndarray, subtitulo: str, dpi: int = DPI_PADRAO) -> np.ndarray:
+    fig = Figure(figsize=(14, 6), dpi=dpi)
+    ax = fig.add_subplot()
+    ax.hist(diferencas, bins=30, color='steelblue', alpha=0.7, edgecolor='black')
+    ax.axvline(x=0, color='red', linestyle='--', linewidth=2, label='Zero')
+    ax.axvline(x=diferencas.mean(), color='green', linestyle='--', linewidth=2, label='Média')
+    ax.set_title(f'Distribuição das Diferenças\n{subtitulo}', fontsize=12, fontweight='bold')
+    ax.set_xlabel('Diferença (mm)', fontsize=10, fontweight='bold')
+    ax.set_ylabel('Frequência', fontsize=10, fontweight='bold')
+    ax.legend()
+    ax.grid(axis='y', alpha=0.3)
+    return _imagem(fig)
+
+
+def parte_boxplot(pontos: list, series: list[np.ndarray], parte: int, subtitulo: str,
+                  dpi: int = DPI_PADRAO) -> np.ndarray:
+    """Boxplots das diferenças de um bloco de pontos (estatísticas calculadas direto dos arrays)."""
+    fig = Figure(figsize=(14, 6), dpi=dpi)
+    ax = fig.add_subplot()
+    ax.bxp(cbook.boxplot_stats(series, labels=pontos), patch_artist=True,
+           boxprops=dict(facecolor='lightblue', edgecolor='steelblue'),
+           medianprops=dict(color='darkblue', linewidth=1.5),
+           whiskerprops=dict(color='steelblue'),
+           capprops=dict(color='steelblue'))
+    ax.set_title(f'Boxplot das Diferenças por Ponto (Parte {parte})\n{subtitulo}', fontsize=12, fontweight='bold')
+    ax.set_xlabel('Ponto de Interesse', fontsize=10, fontweight='bold')
+    ax.set_ylabel('Diferença (mm)', fontsize=10, fontweight='bold')
+    ax.axhline(y=0, color='red', linestyle='--', linewidth=1, alpha=0.5)
+    ax.grid(True)
+    for rotulo in ax.get_xticklabels():
+        rotulo.set_rotation(45)
+        rotulo.set_horizontalalignment('right')
+    return _imagem(fig)
+
+
+def partes_histograma_boxplot(dados_comparacao, subtitulo: str, dpi: int = DPI_PADRAO) -> list[tuple]:
+    """Histograma de todas as diferenças seguido dos boxplots por ponto em blocos de 20."""
+    ordem = dados_comparacao.sort_values('ponto', kind='stable')
+    pontos, inicio = np.unique(ordem['ponto'].astype(str).to_numpy(), return_index=True)
+    series = np.split(ordem['diferenca'].to_numpy(dtype=np.float64), inicio[1:])
+    partes = [(parte_histograma, dict(diferencas=dados_comparacao['diferenca'].to_numpy(dtype=np.float64),
+                                      subtitulo=subtitulo, dpi=dpi))]
+    for i, bloco in enumerate(_blocos(list(pontos), PONTOS_POR_BLOCO_BOXPLOT), start=1):
+        partes.append((parte_boxplot, dict(pontos=list(pontos[bloco]), series=series[bloco], parte=i,
+                                           subtitulo=subtitulo, dpi=dpi)))
+    return partes
+
+
+def empilhar(imagens: list[np.ndarray]) -> np.ndarray:
+    """Empilha as partes na vertical, completando com branco as mais estreitas."""
+    if not imagens:
+        raise ValueError("Figura sem partes para empilhar (matriz vazia?)")
+    largura = max(imagem.shape[1] for imagem in imagens)
+    return np.vstack([np.pad(imagem, ((0, 0), (0, largura - imagem.shape[1]), (0, 0)), constant_values=255)
+                      for imagem in imagens])
+
+
+def salvar_png(imagem: np.ndarray, arquivo: Path, dpi: int = DPI_PADRAO) -> None:
+    escrever_atomico(Path(arquivo), lambda tmp: Image.fromarray(imagem).save(
+        tmp, format='png', compress_level=COMPRESSAO_PNG, dpi=(dpi, dpi)))
+
+
+def gravar_figura(imagens: list[np.ndarray], arquivo: Path, dpi: int = DPI_PADRAO) -> Path:
+    salvar_png(empilhar(imagens), arquivo, dpi)
+    return Path(arquivo)
+
+
+def desenhar_parte(funcao, argumentos: dict, destino: Path) -> Path:
+    """Desenha uma parte e grava os pixels em ``destino`` (.npy), para o processo pai não recebê-los."""
+    np.save(destino, funcao(**argumentos), allow_pickle=False)
+    return destino
+
+
+def gravar_figura_partes(caminhos: list[Path], arquivo: Path, dpi: int = DPI_PADRAO) -> Path:
+    """Como ``gravar_figura``, com as partes lidas dos .npy de ``desenhar_parte`` (que são removidos)."""
+    imagens = [np.load(caminho) for caminho in caminhos]
+    for caminho in caminhos:
+        Path(caminho).unlink()
+    return gravar_figura(imagens, arquivo, dpi)
+
+
+def renderizar(figuras: dict[Path, list[tuple]], workers: int = 1, dpi: int = DPI_PADRAO) -> list[Path]:
+    """Desenha as partes de cada figura (em paralelo com ``workers`` > 1) e grava os PNGs.
+
+    ``figuras`` mapeia o PNG de destino para a lista de partes ``(funcao,
+    argumentos)`` de ``partes_*``; figuras sem partes (matriz vazia) não são
+    gravadas. Devolve os PNGs gravados na ordem de ``figuras``.
+
+    Com pool, cada processo grava sua parte em um .npy temporário e devolve só
+    o caminho; o PNG de cada figura é montado, também no pool, assim que todas
+    as suas partes ficam prontas.
+    """
+    figuras = {arquivo: partes for arquivo, partes in figuras.items() if partes}
+    tarefas = [(arquivo, i, funcao, argumentos) for arquivo, partes in figuras.items()
+               for i, (funcao, argumentos) in enumerate(partes)]
+
+    if workers <= 1 or len(tarefas) <= 1:
+        return [gravar_figura([funcao(**argumentos) for funcao, argumentos in partes], arquivo, dpi)
+                for arquivo, partes in figuras.items()]
+
+    caminhos = {arquivo: [None] * len(partes) for arquivo, partes in figuras.items()}
+    faltando = {arquivo: len(partes) for arquivo, partes in figuras.items()}
+    with tempfile.TemporaryDirectory(prefix='renderizacao-') as pasta, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        partes = {pool.submit(desenhar_parte, funcao, argumentos, Path(pasta) / f'{n}.npy'): (arquivo, i)
+                  for n, (arquivo, i, funcao, argumentos) in enumerate(tarefas)}
+        gravacoes = {}
+        for futuro in as_completed(partes):
+            arquivo, i = partes[futuro]
+            caminhos[arquivo][i] = futuro.result()
+            faltando[arquivo] -= 1
+            if faltando[arquivo] == 0:
+                gravacoes[arquivo] = pool.submit(gravar_figura_partes, caminhos.pop(arquivo), arquivo, dpi)
+        return [gravacoes[arquivo].result() for arquivo in figuras]
@@ -11,10 +11,6 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Backend não-interativo
-import matplotlib.pyplot as plt
-import seaborn as sns
 
 print("=" * 80)
 print("TESTE DO NOTEBOOK DE COMPARAÇÃO DE PRECIPITAÇÃO")
@@ -152,7 +148,12 @@ arquivo_stats = caminho_output / f"estatisticas_por_ponto_{data_rodada}.csv"
 stats_por_ponto.to_csv(arquivo_stats)
 print(f"\n✓ Estatísticas salvas: {arquivo_stats.name}")
 
-# Gerar heatmap
+# Gerar heatmap (matplotlib/seaborn importados só aqui, onde há figura)
+import matplotlib
+matplotlib.use('Agg')  # Backend não-interativo
+import matplotlib.pyplot as plt
+import seaborn as sns
+
 matriz_diferencas = dados_comparacao.pivot_table(
     index='ponto',
     columns='data',
@@ -0,0 +1,145 @@
+"""Agregador de desempenho: métricas, substituição de contribuições, anel e crescimento dos leads."""
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agregador_desempenho import AgregadorDesempenho, estatisticas_lote, remover, combinar
+from benchmark import gerar_diario
+import compara_chuva_diaria
+
+
+ESTACOES = ['A', 'B', 'C']
+
+
+def _dados(seed, n_leads=4, membros=3):
+    rng = np.random.default_rng(seed)
+    ons = rng.gamma(1.0, 5.0, (len(ESTACOES), n_leads, membros))
+    tok = ons + rng.normal(0, 2, ons.shape)
+    ons[rng.random(ons.shape) < 0.2] = np.nan
+    tok[rng.random(tok.shape) < 0.2] = np.nan
+    return ons, tok
+
+
+def _metricas_diretas(ons, tok):
+    """Viés, MAE, RMSE e correlação por célula, direto das amostras (última dimensão)."""
+    valido = ~np.isnan(ons) & ~np.isnan(tok)
+    n = valido.sum(axis=-1)
+    o, t = np.where(valido, ons, np.nan), np.where(valido, tok, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlacao = np.array([[np.corrcoef(o[i, j][valido[i, j]], t[i, j][valido[i, j]])[0, 1]
+                                if n[i, j] > 1 else np.nan for j in range(ons.shape[1])]
+                               for i in range(ons.shape[0])])
+    return {'n': n, 'vies': np.nanmean(t - o, axis=-1), 'mae': np.nanmean(np.abs(t - o), axis=-1),
+            'rmse': np.sqrt(np.nanmean((t - o) ** 2, axis=-1)), 'correlacao': correlacao}
+
+
+def _conferir(tabela, ons, tok):
+    esperado = _metricas_diretas(ons, tok)
+    completo = tabela.reindex(pd.MultiIndex.from_product([ESTACOES, range(ons.shape[1])]))
+    for nome, valores in esperado.items():
+        obtido = completo[nome].to_numpy(dtype=np.float64).reshape(valores.shape)
+        obtido = np.where(valores == 0, 0, obtido) if nome == 'n' else obtido
+        np.testing.assert_allclose(obtido, valores, rtol=1e-9, atol=1e-9, err_msg=nome)
+
+
+def test_janelas_e_total_batem_com_a_conta_direta(tmp_path):
+    agregador = AgregadorDesempenho(tmp_path, ESTACOES, dias_max=10)
+    dias = pd.date_range('2026-01-01', periods=5)
+    lotes = [_dados(i) for i in range(len(dias))]
+    for dia, (ons, tok) in zip(dias, lotes):
+        assert agregador.acumular(dia, ESTACOES, ons, tok, chave='par')
+
+    _conferir(agregador.desempenho(), np.concatenate([o for o, _ in lotes], axis=-1),
+              np.concatenate([t for _, t in lotes], axis=-1))
+    _conferir(agregador.desempenho(2), np.concatenate([o for o, _ in lotes[-2:]], axis=-1),
+              np.concatenate([t for _, t in lotes[-2:]], axis=-1))
+
+
+def test_remover_desfaz_combinar():
+    a = estatisticas_lote(*_dados(1))
+    b = estatisticas_lote(*_dados(2))
+    np.testing.assert_allclose(remover(combinar(a, b), b), a, rtol=1e-9, atol=1e-9)
+    np.testing.assert_array_equal(remover(b, b), np.zeros_like(b))
+
+
+def test_chave_repetida_e_ignorada_e_dados_novos_substituem_os_antigos(tmp_path):
+    agregador = AgregadorDesempenho(tmp_path / 'ag', ESTACOES)
+    ons1, tok1 = _dados(1)
+    ons2, tok2 = _dados(2)
+    outro = _dados(3)
+    assert agregador.acumular('2026-01-01', ESTACOES, *outro, chave='outro')
+    assert agregador.acumular('2026-01-01', ESTACOES, ons1, tok1, chave='par')
+    assert not agregador.acumular('2026-01-01', ESTACOES, ons1, tok1, chave='par')
+    assert agregador.acumular('2026-01-01', ESTACOES, ons2, tok2, chave='par')
+
+    # Mesmo resultado de um agregador que só viu os dados atuais de cada chave
+    referencia = AgregadorDesempenho(tmp_path / 'ref', ESTACOES)
+    referencia.acumular('2026-01-01', ESTACOES, *outro, chave='outro')
+    referencia.acumular('2026-01-01', ESTACOES, ons2, tok2, chave='par')
+    for dias in (None, 30):
+        np.testing.assert_allclose(agregador.estatisticas(dias), referencia.estatisticas(dias),
+                                   rtol=1e-9, atol=1e-9)
+
+
+def test_anel_descarta_chaves_do_dia_substituido(tmp_path):
+    agregador = AgregadorDesempenho(tmp_path, ESTACOES, dias_max=3)
+    ons, tok = _dados(1)
+    agregador.acumular('2026-01-01', ESTACOES, ons, tok, chave='par')
+    agregador.acumular('2026-01-04', ESTACOES, ons, tok, chave='par')  # mesma posição do anel
+
+    meta = json.loads((tmp_path / 'meta.json').read_text())
+    assert list(meta['chaves']) == ['2026-01-04']
+    assert [p.name for p in (tmp_path / 'contribuicoes').iterdir()] == ['2026-01-04']
+    assert list(agregador.rodadas) == [pd.Timestamp('2026-01-04')]
+    # O total continua com os dois dias; um dia mais antigo que o ocupante não entra
+    assert agregador.estatisticas()[..., 0].sum() == 2 * (~np.isnan(ons) & ~np.isnan(tok)).sum()
+    assert not agregador.acumular('2026-01-01', ESTACOES, ons, tok, chave='par')
+
+
+def test_blocos_esparsos_e_leads_crescem_com_os_dados(tmp_path):
+    agregador = AgregadorDesempenho(tmp_path, ESTACOES)
+    assert agregador.n_leads is None and agregador.desempenho().empty
+    ons, tok = _dados(1, n_leads=4)
+    agregador.acumular('2026-01-01', ESTACOES, ons, tok)
+    antes = agregador.estatisticas(30)
+
+    longo = _dados(2, n_leads=2)
+    agregador.acumular('2026-01-02', ESTACOES, *longo, leads=[40, 44])
+    assert agregador.n_leads == 45
+    depois = AgregadorDesempenho(tmp_path).estatisticas(30)
+    assert depois.shape == (3, 45, 7)
+    np.testing.assert_allclose(depois[:, :4], antes)
+    assert depois[:, 40, 0].sum() == (~np.isnan(longo[0][:, 0]) & ~np.isnan(longo[1][:, 0])).sum()
+
+    # Só as páginas dos dias gravados ocupam disco
+    blocos = next(tmp_path.glob('blocos*.f64'))
+    assert blocos.stat().st_size == 366 * 3 * 45 * 7 * 8
+    assert blocos.stat().st_blocks * 512 < blocos.stat().st_size / 10
+    assert sorted(p.name for p in tmp_path.glob('*.f64')) == ['blocos.g2.f64', 'total.g2.f64']
+
+
+def _executar(monkeypatch, capsys, *args):
+    monkeypatch.setattr(sys, 'argv', ['compara_chuva_diaria.py', *args, '--sem-cache'])
+    compara_chuva_diaria.main()
+    return capsys.readouterr().out
+
+
+def test_par_nao_agregado_nao_entra_no_manifesto(tmp_path, monkeypatch, capsys):
+    base, diretorio = tmp_path / 'base', tmp_path / 'agregador'
+    gerar_diario(base, n_pontos=20, horizonte=45, n_pastas=1)
+
+    def falhar(*args, **kwargs):
+        raise ValueError("falha simulada")
+    monkeypatch.setattr(AgregadorDesempenho, 'acumular', falhar)
+    saida = _executar(monkeypatch, capsys, '--base-dir', str(base), '--agregador', str(diretorio))
+    assert 'não registrado no manifesto' in saida
+
+    monkeypatch.undo()
+    saida = _executar(monkeypatch, capsys, '--base-dir', str(base), '--agregador', str(diretorio))
+    assert 'Aviso' not in saida
+    assert AgregadorDesempenho(diretorio).n_leads == 45
+    saida = _executar(monkeypatch, capsys, '--base-dir', str(base), '--agregador', str(diretorio))
+    assert 'Sem alterações desde a última execução' in saida
@@ -0,0 +1,107 @@
+"""Arquivo histórico: gravação, consulta, crescimento dos eixos e integração com o manifesto."""
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from arquivo_historico import ArquivoHistorico, gravar_compacto
+from benchmark import gerar_diario
+import compara_chuva_diaria
+from tipos_compactos import compactar
+
+
+ESTACOES = ['A', 'B', 'C']
+
+
+def test_grava_e_consulta_por_rodada_estacao_lead_e_membro(tmp_path):
+    arquivo = ArquivoHistorico(tmp_path, ESTACOES, n_membros=2)
+    arquivo.gravar('2026-01-02', 'ons', ['B', 'X', 'A'], [[1, 2], [9, 9], [3, 4]], membro=1)
+    arquivo.gravar('2026-01-01', 'tok', ['C'], [[5, 6, 7]], membro=0)
+
+    # Reaberto do disco: rodadas em ordem de data, NaN onde não há dado, estação X ignorada
+    fatia = ArquivoHistorico(tmp_path).consultar()
+    assert list(fatia['rodadas']) == [pd.Timestamp('2026-01-01'), pd.Timestamp('2026-01-02')]
+    assert fatia['ons'].shape == (2, 3, 3, 2)
+    np.testing.assert_array_equal(fatia['ons'][1, :, :2, 1], [[3, 4], [1, 2], [np.nan, np.nan]])
+    np.testing.assert_array_equal(fatia['tok'][0, 2, :, 0], [5, 6, 7])
+    assert np.isnan(fatia['ons'][0]).all()
+
+    tabela = arquivo.consultar_tabela(estacoes=['B'], ultimas=1)
+    assert tabela[['lead', 'membro', 'ons']].values.tolist() == [[0, 1, 1.0], [1, 1, 2.0]]
+
+
+def test_leads_e_membros_crescem_preservando_os_dados(tmp_path):
+    arquivo = ArquivoHistorico(tmp_path, ESTACOES, n_membros=2, n_leads=3)
+    arquivo.gravar('2026-01-01', 'ons', ['A'], [[1, 2, 3]], membro=0)
+    arquivo.gravar('2026-01-01', 'tok', ['B'], [[4, 5, 6]], membro=1)
+
+    # Lead 44 e membro 4 além dos eixos: o arquivo cresce em vez de recusar
+    arquivo.gravar('2026-01-02', 'ons', ['C'], np.arange(45, dtype=float)[None, :], membro=4)
+    assert arquivo.forma_rodada == (3, 45, 5)
+
+    fatia = ArquivoHistorico(tmp_path).consultar()
+    np.testing.assert_array_equal(fatia['ons'][0, 0, :3, 0], [1, 2, 3])
+    np.testing.assert_array_equal(fatia['tok'][0, 1, :3, 1], [4, 5, 6])
+    assert np.isnan(fatia['ons'][0, 0, 3:, 0]).all() and np.isnan(fatia['ons'][0, :, :, 4]).all()
+    np.testing.assert_array_equal(fatia['ons'][1, 2, :, 4], np.arange(45))
+    # Só a geração atual fica no disco
+    assert sorted(p.name for p in tmp_path.glob('*.f32')) == ['ons.g1.f32', 'tok.g1.f32']
+
+    with pytest.raises(ValueError):
+        arquivo.gravar('2026-01-02', 'ons', ['A'], [[1.0]], membro=-1)
+
+
+def test_gravar_compacto_usa_o_dia_como_lead(tmp_path):
+    dados = compactar(pd.DataFrame({
+        'ponto': ['A', 'A', 'B'],
+        'data': pd.to_datetime(['2026-01-05', '2026-01-07', '2026-01-06']),
+        'precipitacao_mm': [1.0, 3.0, 2.0],
+    }))
+    arquivo = ArquivoHistorico(tmp_path, ESTACOES, n_membros=1)
+    gravar_compacto(arquivo, dados, 'ons', membro=0, rodada='2026-01-04')
+    fatia = arquivo.consultar()
+    np.testing.assert_array_equal(fatia['ons'][0, :2, :, 0], [[np.nan, 1, np.nan, 3], [np.nan, np.nan, 2, np.nan]])
+
+
+def _executar(monkeypatch, capsys, *args):
+    monkeypatch.setattr(sys, 'argv', ['compara_chuva_diaria.py', *args, '--sem-cache'])
+    compara_chuva_diaria.main()
+    return capsys.readouterr().out
+
+
+def test_par_de_45_dias_entra_no_arquivo_e_no_manifesto(tmp_path, monkeypatch, capsys):
+    base, historico = tmp_path / 'base', tmp_path / 'historico'
+    gerar_diario(base, n_pontos=30, horizonte=45, n_pastas=1)
+
+    saida = _executar(monkeypatch, capsys, '--base-dir', str(base), '--arquivo-historico', str(historico))
+    assert 'Aviso' not in saida
+    arquivo = ArquivoHistorico(historico)
+    assert arquivo.forma_rodada[1] == 45
+    assert not np.isnan(arquivo.consultar()['ons'][0, :, 44, 2]).all()
+
+    saida = _executar(monkeypatch, capsys, '--base-dir', str(base), '--arquivo-historico', str(historico))
+    assert 'Sem alterações desde a última execução' in saida
+
+    # Um membro além dos criados no arquivo também entra
+    (base / 'TOK' / 'ECENS_c2').rename(base / 'TOK' / 'ECENS_c6')
+    (base / 'ONS' / 'rodada_1').rename(base / 'ONS' / 'rodada_5')
+    saida = _executar(monkeypatch, capsys, '--base-dir', str(base), '--arquivo-historico', str(historico))
+    assert 'Aviso' not in saida
+    assert ArquivoHistorico(historico).forma_rodada[2] == 7
+
+
+def test_par_nao_arquivado_nao_entra_no_manifesto(tmp_path, monkeypatch, capsys):
+    base, historico = tmp_path / 'base', tmp_path / 'historico'
+    gerar_diario(base, n_pontos=10, horizonte=3, n_pastas=1)
+
+    def falhar(*args, **kwargs):
+        raise ValueError("falha simulada")
+    monkeypatch.setattr(ArquivoHistorico, 'gravar', falhar)
+    saida = _executar(monkeypatch, capsys, '--base-dir', str(base), '--arquivo-historico', str(historico))
+    assert 'não registrado no manifesto' in saida
+
+    monkeypatch.undo()
+    saida = _executar(monkeypatch, capsys, '--base-dir', str(base), '--arquivo-historico', str(historico))
+    assert 'Sem alterações' not in saida and 'Aviso' not in saida
+    assert len(ArquivoHistorico(historico).rodadas) == 1
@@ -0,0 +1,76 @@
+"""Cache de entradas: acerto, invalidação por conteúdo e por versão do leitor, impressão antes da leitura."""
+import os
+
+import pandas as pd
+
+from cache_ingestao import CacheIngestao
+
+
+def _contador():
+    chamadas = []
+
+    def leitor(caminho):
+        chamadas.append(caminho)
+        return pd.read_csv(caminho)
+    return leitor, chamadas
+
+
+def test_reaproveita_e_invalida_por_conteudo(tmp_path):
+    entrada = tmp_path / 'entrada.csv'
+    entrada.write_text('a,b\n1,2\n')
+    cache = CacheIngestao(tmp_path / 'cache')
+    leitor, chamadas = _contador()
+
+    assert cache.ler(entrada, leitor).to_dict('list') == {'a': [1], 'b': [2]}
+    assert cache.ler(entrada, leitor).to_dict('list') == {'a': [1], 'b': [2]}
+    assert len(chamadas) == 1
+
+    # touch (mesmo conteúdo) não invalida; conteúdo novo do mesmo tamanho invalida
+    os.utime(entrada, ns=(0, 10**18))
+    cache.ler(entrada, leitor)
+    assert len(chamadas) == 1
+    entrada.write_text('a,b\n3,4\n')
+    assert cache.ler(entrada, leitor).to_dict('list') == {'a': [3], 'b': [4]}
+    assert len(chamadas) == 2
+
+
+def test_versao_do_leitor_invalida(tmp_path):
+    entrada = tmp_path / 'entrada.csv'
+    entrada.write_text('a\n1\n')
+    cache = CacheIngestao(tmp_path / 'cache')
+    leitor, chamadas = _contador()
+    cache.ler(entrada, leitor, versao=1)
+    cache.ler(entrada, leitor, versao=2)
+    cache.ler(entrada, leitor, versao=2)
+    assert len(chamadas) == 2
+
+
+def test_arquivo_alterado_durante_a_leitura_e_relido(tmp_path):
+    entrada = tmp_path / 'entrada.csv'
+    entrada.write_text('a\n1\n')
+    cache = CacheIngestao(tmp_path / 'cache')
+    chamadas = []
+
+    def leitor(caminho):
+        tabela = pd.read_csv(caminho)
+        if not chamadas:
+            # Outro processo grava (mesmo tamanho, outro mtime) logo depois da leitura
+            caminho.write_text('a\n2\n')
+            os.utime(caminho, ns=(0, 10**18))
+        chamadas.append(caminho)
+        return tabela
+
+    assert cache.ler(entrada, leitor)['a'].tolist() == [1]
+    assert cache.ler(entrada, leitor)['a'].tolist() == [2]
+    assert len(chamadas) == 2
+
+
+def test_limite_remove_as_menos_usadas(tmp_path):
+    cache = CacheIngestao(tmp_path / 'cache', tamanho_max_mb=0)
+    entrada = tmp_path / 'entrada.csv'
+    entrada.write_text('a\n1\n')
+    leitor, chamadas = _contador()
+    cache.ler(entrada, leitor)
+    cache.ler(entrada, leitor)
+    assert len(chamadas) == 2
+    assert not list((tmp_path / 'cache').glob('*.parquet'))
@@ -0,0 +1,68 @@
+"""Agendador do compara_hindcast: uma data com erro não interrompe as demais nem entra no manifesto."""
+import sys
+
+import pytest
+
+from benchmark import DATA_RODADA, gerar_hindcast
+import compara_hindcast
+
+
+DATAS = ['210126', '220126', '230126']
+
+
+@pytest.fixture
+def hindcast(tmp_path):
+    gerar_hindcast(tmp_path, n_pontos=20, horizonte=10, n_membros=2)
+    original = f"{DATA_RODADA:%d%m%y}"
+    for arquivo in list((tmp_path / 'ONS').glob('*.dat')):
+        for data in DATAS:
+            if data != original:
+                (tmp_path / 'ONS' / arquivo.name.replace(original, data)).write_bytes(arquivo.read_bytes())
+    return tmp_path
+
+
+def _executar(monkeypatch, capsys, base, *args):
+    monkeypatch.setattr(sys, 'argv', ['compara_hindcast.py', '--modo', 'cubo', '--membros', '0-1',
+                                      '--ons-dir', str(base / 'ONS'), '--tok-dir', str(base / 'TOK'),
+                                      '--output-dir', str(base / 'saida'), *args])
+    compara_hindcast.main()
+    return capsys.readouterr().out
+
+
+def _falhar_em(monkeypatch, nome, data_com_erro):
+    original = getattr(compara_hindcast, nome)
+
+    def talvez_falhar(*args, **kwargs):
+        # A data chega como texto (load_ensemble_cube) ou dentro da Tarefa (run_task)
+        if any(isinstance(a, (str, compara_hindcast.Tarefa)) and getattr(a, 'data', a) == data_com_erro
+               for a in args):
+            raise ValueError(f"arquivo corrompido em {data_com_erro}")
+        return original(*args, **kwargs)
+    monkeypatch.setattr(compara_hindcast, nome, talvez_falhar)
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_cubo_com_erro_e_relatado_e_refeito(hindcast, monkeypatch, capsys, workers):
+    _falhar_em(monkeypatch, 'load_ensemble_cube', '220126')
+    saida = _executar(monkeypatch, capsys, hindcast, '--workers', workers)
+    assert '✗ Erro ao processar cubo 220126: arquivo corrompido em 220126' in saida
+    cubos = [linha for linha in saida.splitlines() if linha.startswith('=== Cubo')]
+    assert cubos == [f'=== Cubo {data} ===' for data in DATAS]
+    assert saida.rstrip().splitlines()[-2] == '=== Comparação Concluída ==='
+
+    monkeypatch.undo()
+    saida = _executar(monkeypatch, capsys, hindcast, '--workers', workers)
+    assert '2 tarefa(s) já concluída(s) com as mesmas entradas; 1 pendente(s)' in saida
+
+
+def test_falha_fora_da_tarefa_nao_interrompe_o_pool(hindcast, monkeypatch, capsys):
+    _falhar_em(monkeypatch, 'run_task', '210126')
+    saida = _executar(monkeypatch, capsys, hindcast, '--workers', '2')
+    assert '✗ Erro na tarefa 210126 ensemble: arquivo corrompido em 210126' in saida
+    # A falha é a primeira tarefa; as seguintes ainda são impressas, em ordem
+    assert [linha for linha in saida.splitlines() if linha.startswith('=== Cubo')] == [
+        '=== Cubo 220126 ===', '=== Cubo 230126 ===']
+
+    monkeypatch.undo()
+    saida = _executar(monkeypatch, capsys, hindcast, '--workers', '2')
+    assert '2 tarefa(s) já concluída(s) com as mesmas entradas; 1 pendente(s)' in saida
@@ -0,0 +1,97 @@
+"""Comparação ONS × TOK contra a implementação original (merge em formato longo), com células faltantes."""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from compara_chuva_diaria import comparar
+
+
+def _comparar_original(dados_ons: pd.DataFrame, dados_tok: pd.DataFrame, caminho_output: Path, data_label: str):
+    """``comparar`` da versão original do compara_chuva_diaria.py, como referência."""
+    dados_comparados = (dados_tok.pivot(index='ponto', columns="data", values="precipitacao_mm")
+                        - dados_ons.pivot(index='ponto', columns="data", values="precipitacao_mm"))
+
+    dados = pd.merge(dados_ons, dados_tok, on=['ponto', 'data'], how='outer', suffixes=('_ons', '_tok'))
+    dados = dados.fillna(0)
+    dados['diferenca'] = dados['precipitacao_mm_tok'] - dados['precipitacao_mm_ons']
+    dados['diferenca_abs'] = dados['diferenca'].abs()
+    dados['diferenca_pct'] = np.where(dados['precipitacao_mm_ons'] != 0,
+                                      dados['diferenca'] / dados['precipitacao_mm_ons'] * 100, 0)
+
+    caminho_output.mkdir(parents=True, exist_ok=True)
+    (caminho_output / f"comparacao_{data_label}.csv").write_text(dados.to_csv(index=False, float_format='%.2f'))
+
+    stats = dados.groupby('ponto').agg({
+        'precipitacao_mm_ons': ['mean', 'sum'],
+        'precipitacao_mm_tok': ['mean', 'sum'],
+        'diferenca': ['mean', 'sum', 'std']
+    }).round(2)
+    stats.columns = ['ONS_media', 'ONS_total', 'TOK_media', 'TOK_total', 'Dif_media', 'Dif_total', 'Dif_std']
+    stats.to_csv(caminho_output / f"estatisticas_por_ponto_{data_label}.csv")
+
+    dif_pos = dados[dados['diferenca'] > 0].groupby('ponto')['diferenca'].sum()
+    dif_neg = dados[dados['diferenca'] < 0].groupby('ponto')['diferenca'].sum()
+    acumulados = pd.DataFrame({
+        'Acumulado_Positivo_mm': dif_pos,
+        'Acumulado_Negativo_mm': dif_neg,
+    }).fillna(0).round(2)
+    acumulados['Total_Liquido_mm'] = acumulados['Acumulado_Positivo_mm'] + acumulados['Acumulado_Negativo_mm']
+    acumulados.to_csv(caminho_output / f"acumulados_{data_label}.csv", float_format='%.2f')
+    dados_comparados.to_csv(caminho_output / f"comparacao_matriz_{data_label}.csv", float_format='%.2f')
+
+
+@pytest.fixture
+def fontes():
+    """Duas fontes com 12 pontos × 10 dias, buracos diferentes em cada uma e pontos exclusivos."""
+    rng = np.random.default_rng(7)
+    pontos = [f"P{i:02d}" for i in range(12)]
+    datas = pd.date_range('2026-01-20', periods=10, freq='D')
+    completo = pd.MultiIndex.from_product([pontos, datas], names=['ponto', 'data']).to_frame(index=False)
+
+    def fonte(fracao_faltante, excluidos):
+        # Valores em décimos de mm, como nos .dat, e alguns zeros
+        tabela = completo.assign(precipitacao_mm=np.round(rng.gamma(1.5, 8, len(completo)), 1))
+        tabela.loc[rng.random(len(tabela)) < 0.2, 'precipitacao_mm'] = 0.0
+        tabela = tabela[rng.random(len(tabela)) >= fracao_faltante]
+        return tabela[~tabela['ponto'].isin(excluidos)].reset_index(drop=True)
+
+    return fonte(0.15, ['P03']), fonte(0.1, ['P07', 'P08'])
+
+
+ARQUIVOS = ('comparacao', 'estatisticas_por_ponto', 'acumulados', 'comparacao_matriz')
+
+
+def _ler(pasta: Path, nome: str) -> pd.DataFrame:
+    tabela = pd.read_csv(pasta / f"{nome}_par.csv")
+    chaves = [c for c in ('ponto', 'data') if c in tabela.columns]
+    return tabela.sort_values(chaves).reset_index(drop=True) if chaves else tabela
+
+
+def test_saidas_iguais_as_da_implementacao_original(tmp_path, fontes):
+    dados_ons, dados_tok = fontes
+    _comparar_original(dados_ons.copy(), dados_tok.copy(), tmp_path / 'original', 'par')
+    comparar(dados_ons.copy(), dados_tok.copy(), tmp_path / 'novo', 'par')
+
+    for nome in ARQUIVOS:
+        original, novo = _ler(tmp_path / 'original', nome), _ler(tmp_path / 'novo', nome)
+        assert list(novo.columns) == list(original.columns), nome
+        # float32 na comparação: só empates de arredondamento na 2ª casa podem mudar
+        pd.testing.assert_frame_equal(novo, original, check_dtype=False, atol=0.0101, rtol=0)
+
+
+@pytest.mark.parametrize('formato', ['csv', 'parquet'])
+def test_blocos_identicos_a_passada_unica(tmp_path, fontes, formato):
+    dados_ons, dados_tok = fontes
+    unica = comparar(dados_ons.copy(), dados_tok.copy(), tmp_path / 'unica', 'par', formato=formato)
+    # Orçamento minúsculo: um ponto por bloco
+    blocos = comparar(dados_ons.copy(), dados_tok.copy(), tmp_path / 'blocos', 'par', memoria_max_mb=0.0001,
+                      formato=formato)
+    assert unica == blocos
+    for arquivo in unica:
+        if formato == 'csv':
+            assert (tmp_path / 'blocos' / arquivo).read_bytes() == (tmp_path / 'unica' / arquivo).read_bytes()
+        else:
+            pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / 'blocos' / arquivo),
+                                          pd.read_parquet(tmp_path / 'unica' / arquivo))
@@ -0,0 +1,50 @@
+"""Gravação atômica e escritores em partes."""
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import pandas as pd
+import pytest
+
+from escrita_saida import abrir_atomico, abrir_tabela, escrever_atomico, nome_saida
+
+
+def test_threads_gravando_o_mesmo_destino(tmp_path):
+    destino = tmp_path / 'saida.txt'
+    conteudos = [f"{i}\n" * 1000 for i in range(8)]
+
+    def gravar(conteudo):
+        def escrever(tmp):
+            tmp.write_text(conteudo[:len(conteudo) // 2])
+            time.sleep(0.01)  # as threads se sobrepõem entre abrir e renomear
+            with open(tmp, 'a') as f:
+                f.write(conteudo[len(conteudo) // 2:])
+        escrever_atomico(destino, escrever)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(gravar, conteudos))
+    assert destino.read_text() in conteudos
+    assert [p.name for p in tmp_path.iterdir()] == ['saida.txt']
+
+
+def test_falha_nao_deixa_destino_nem_temporario(tmp_path):
+    destino = tmp_path / 'saida.txt'
+    with pytest.raises(RuntimeError):
+        with abrir_atomico(destino) as f:
+            f.write('parcial')
+            raise RuntimeError
+    assert list(tmp_path.iterdir()) == []
+
+
+LEITORES = {'csv': pd.read_csv, 'parquet': pd.read_parquet, 'feather': pd.read_feather}
+
+
+@pytest.mark.parametrize('formato', list(LEITORES))
+def test_partes_equivalem_a_uma_gravacao(tmp_path, formato):
+    tabela = pd.DataFrame({'ponto': list('abcdef'), 'valor': [1.234, 2.0, 3.5, 4.25, 5.0, 6.125]})
+    destino = tmp_path / nome_saida('saida', formato)
+    with abrir_tabela(destino, formato, float_format='%.2f') as escritor:
+        escritor.escrever(tabela.iloc[:2])
+        escritor.escrever(tabela.iloc[2:])
+    lido = LEITORES[formato](destino)
+    esperado = tabela.assign(valor=tabela['valor'].round(2)) if formato == 'csv' else tabela
+    pd.testing.assert_frame_equal(lido.reset_index(drop=True), esperado, check_exact=False)
@@ -0,0 +1,124 @@
+"""Exportação headless dos contornos: QLR de exemplo com camadas delimitedtext e ogr."""
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from CONTORNOS import export_headless
+from contornos_geoparquet import ler_geoparquet
+import pesos_bacias
+
+
+def _maior_parte(geometria):
+    """Referência em laço do to_single_polygon do main.py."""
+    if geometria.geom_type != 'MultiPolygon':
+        return geometria
+    return max(geometria.geoms, key=lambda parte: parte.area)
+
+
+def _qlr(pasta, camadas):
+    """QLR com o grupo REMVIES; ``camadas`` é {bacia: [(id, nome, provider, datasource)]}."""
+    arvore, mapas = '', ''
+    for bacia, itens in camadas.items():
+        arvore += f'<layer-tree-group name="{bacia}">'
+        for camada_id, nome, provider, fonte in itens:
+            arvore += f'<layer-tree-layer id="{camada_id}" name="{nome}" providerKey="{provider}"/>'
+            mapas += (f'<maplayer><id>{camada_id}</id><datasource>{fonte}</datasource>'
+                      f'<layername>{nome}</layername><provider>{provider}</provider></maplayer>')
+        arvore += '</layer-tree-group>'
+    qlr = pasta / 'projeto.qlr'
+    qlr.write_text('<!DOCTYPE qgis-layer-definition><qlr><layer-tree-group name="">'
+                   '<layer-tree-group name="OUTRO"/>'
+                   f'<layer-tree-group name="REMVIES">{arvore}</layer-tree-group></layer-tree-group>'
+                   f'<maplayers>{mapas}</maplayers></qlr>'.replace('&', '&amp;'), encoding='utf-8')
+    return qlr
+
+
+def _csv_wkt(pasta, nome, geometrias):
+    caminho = pasta / f'{nome}.csv'
+    pd.DataFrame({'id': range(len(geometrias)), 'geometry': shapely.to_wkt(geometrias)}).to_csv(
+        caminho, sep=';', index=False)
+    return f'file://{caminho}?delimiter=;&wktField=geometry'
+
+
+def test_exporta_o_grupo_em_geoparquet_e_wkt(tmp_path, monkeypatch):
+    serra = shapely.box(0, 0, 1, 1)
+    # Duas feições disjuntas: a união é MultiPolygon e fica a maior parte
+    lajeado = [shapely.box(2, 0, 4, 2), shapely.box(10, 0, 10.5, 0.5)]
+    ec45 = [shapely.box(2, 0, 3, 1), shapely.box(2.5, 0.5, 3.5, 1.5)]
+    qlr = _qlr(tmp_path, {
+        'Bacia A': [('l1', 'Serra', 'delimitedtext', _csv_wkt(tmp_path, 'l1', [serra])),
+                    ('l2', 'Lajeado', 'delimitedtext', _csv_wkt(tmp_path, 'l2', lajeado)),
+                    ('l3', 'EC45-Lajeado', 'delimitedtext', _csv_wkt(tmp_path, 'l3', ec45))],
+        'Bacia B': [('l4', 'Vazio', 'delimitedtext', _csv_wkt(tmp_path, 'l4', [])),
+                    ('l5', 'Satelite', 'wms', 'url=https://exemplo')],
+    })
+    codigos = tmp_path / 'codigos.json'
+    codigos.write_text(json.dumps({'bacias': [{'nome': 'Bacia A', 'items': [
+        {'nome': 'Serra', 'codigo': 'PSATSERR', 'id': '7'},
+        {'nome': 'EC45-Lajeado', 'codigo': 'PSATLAJE', 'id': '9'}]}]}))
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['export_headless.py', '--qlr', str(qlr), '--codigos', str(codigos),
+                                      '--formato', 'ambos', '--workers', '2'])
+    export_headless.main()
+
+    contornos = ler_geoparquet(tmp_path / 'contornos.parquet')
+    assert contornos['basin_name'].tolist() == ['Serra', 'Lajeado', 'EC45-Lajeado']
+    assert contornos['grupo'].tolist() == ['Bacia A'] * 3
+    assert contornos['ana_code'].tolist() == ['PSATSERR', '', 'PSATLAJE']
+    esperadas = [serra, _maior_parte(shapely.union_all(lajeado)), _maior_parte(shapely.union_all(ec45))]
+    for obtida, esperada in zip(contornos['geometry'], esperadas):
+        assert shapely.equals(obtida, esperada)
+    assert len(ler_geoparquet(tmp_path / 'contornos.parquet', bacias=['PSATLAJE'])) == 1
+
+    outros = pd.read_csv(tmp_path / 'contornos_wkt_outros.csv', sep=';', dtype=str).fillna('')
+    assert outros['basin_name'].tolist() == ['Serra', 'Lajeado', 'Vazio', 'Satelite']
+    assert outros['geometry'].tolist()[2:] == ['', '']
+    assert shapely.equals(shapely.from_wkt(outros['geometry'][1]), esperadas[1])
+    parquet_wkt = pd.read_parquet(tmp_path / 'contornos_wkt_outros.parquet')
+    assert parquet_wkt['ana_code'].fillna('').tolist() == ['PSATSERR', '', '', '']
+    # pesos_bacias usa o ana_code como chave, igual ao caminho do CSV
+    assert sorted(pesos_bacias._ler_wkt(tmp_path / 'contornos_wkt_outros.parquet')) == ['Lajeado', 'PSATSERR']
+    assert parquet_wkt['smap_basin_id'].tolist()[0] == 7
+    assert outros['ana_code'].tolist() == ['PSATSERR', '', '', '']
+    ec45_csv = pd.read_csv(tmp_path / 'contornos_wkt_ec45.csv', sep=';', dtype=str)
+    assert shapely.equals(shapely.from_wkt(ec45_csv.iloc[0, 2]), esperadas[2])
+    listagem = (tmp_path / 'exported_layers.txt').read_text(encoding='utf-8').splitlines()
+    assert listagem[:3] == ['Grupos no root:', '- OUTRO', '- REMVIES']
+    assert '  - Serra\tPSATSERR' in listagem
+
+
+def test_maior_parte_vetorizada_igual_ao_laco():
+    rng = np.random.default_rng(0)
+    geometrias = [shapely.union_all([shapely.box(x, y, x + w, y + w) for x, y, w in rng.random((4, 3)) * 10])
+                  for _ in range(30)]
+    geometrias += [None, shapely.LineString([(0, 0), (1, 1)]), shapely.Point(0, 0)]
+    obtidas = export_headless.largest_parts(geometrias)
+    for obtida, geometria in zip(obtidas, geometrias):
+        assert obtida is None if geometria is None else shapely.equals(obtida, _maior_parte(geometria))
+
+
+def test_camada_ogr_com_caminho_relativo_e_subset(tmp_path):
+    pytest.importorskip('pyogrio')
+    feicoes = [shapely.box(0, 0, 1, 1), shapely.box(1, 0, 2, 1), shapely.box(5, 5, 6, 6)]
+    (tmp_path / 'dados').mkdir()
+    (tmp_path / 'dados' / 'bacias.geojson').write_text(json.dumps({
+        'type': 'FeatureCollection',
+        'features': [{'type': 'Feature', 'properties': {'id': i},
+                      'geometry': json.loads(shapely.to_geojson(g))} for i, g in enumerate(feicoes)],
+    }))
+    qlr = _qlr(tmp_path, {'Bacia A': [
+        ('l1', 'Todas', 'ogr', 'dados/bacias.geojson|layername=bacias'),
+        ('l2', 'Primeiras', 'ogr', 'dados/bacias.geojson|layername=bacias|subset="id" < 2'),
+    ]})
+    raiz, fontes, base = export_headless.parse_qlr(qlr)
+    camadas = export_headless.walk_layers(export_headless.find_group(raiz, 'REMVIES'), fontes, base=base)
+    _, geometrias = export_headless.group_contornos(camadas, {}, workers=2)
+    assert shapely.equals(geometrias[0], shapely.box(0, 0, 2, 1))
+    assert shapely.equals(geometrias[1], shapely.box(0, 0, 2, 1))
+    assert shapely.equals(export_headless.read_ogr(camadas[0].fonte)[2], feicoes[2])
+    assert len(export_headless.read_ogr(camadas[1].fonte)) == 2
@@ -0,0 +1,68 @@
+"""Casamento de pontos de grade com estações (exato e com tolerância) contra uma busca por força bruta."""
+import numpy as np
+
+from indice_estacoes import IndiceEstacoes
+
+
+def _estacoes(rng, n=60):
+    lat = np.round(rng.uniform(-30, 5, n), 2)
+    lon = np.round(rng.uniform(-70, -35, n), 2)
+    return np.array([f"E{i:03d}" for i in range(n)], dtype=object), lat, lon
+
+
+def _forca_bruta(rotulos, lat_e, lon_e, lat, lon, passos):
+    """Estação mais próxima em passos de 0,01° (|dlat| + |dlon|, depois (dlat, dlon)); primeira em empates de coordenada."""
+    lat_e_q, lon_e_q = np.rint(lat_e * 100).astype(int), np.rint(lon_e * 100).astype(int)
+    resultado = []
+    for la, lo in zip(np.rint(lat * 100).astype(int), np.rint(lon * 100).astype(int)):
+        candidatos = []
+        for i, (le, oe) in enumerate(zip(lat_e_q, lon_e_q)):
+            d = (le - la, oe - lo)
+            if abs(d[0]) <= passos and abs(d[1]) <= passos:
+                candidatos.append(((abs(d[0]) + abs(d[1]), d), i))
+        resultado.append(rotulos[min(candidatos)[1]] if candidatos else None)
+    return resultado
+
+
+def test_casamento_exato_igual_ao_arredondamento():
+    rng = np.random.default_rng(1)
+    rotulos, lat_e, lon_e = _estacoes(rng)
+    indice = IndiceEstacoes(rotulos, lat_e, lon_e)
+    # Metade dos pontos sobre estações (com ruído de ponto flutuante), metade em lugar nenhum
+    lat = np.concatenate([lat_e + rng.uniform(-0.004, 0.004, len(lat_e)), rng.uniform(-30, 5, 40)])
+    lon = np.concatenate([lon_e + rng.uniform(-0.004, 0.004, len(lon_e)), rng.uniform(-70, -35, 40)])
+
+    posicoes = indice.localizar(lat, lon)
+    obtido = [indice.rotulos[p] if p >= 0 else None for p in posicoes]
+    esperado = {(round(a, 2), round(o, 2)): r for r, a, o in zip(rotulos[::-1], lat_e[::-1], lon_e[::-1])}
+    assert obtido == [esperado.get((round(a, 2), round(o, 2))) for a, o in zip(lat, lon)]
+
+
+def test_tolerancia_escolhe_a_estacao_mais_proxima():
+    rng = np.random.default_rng(2)
+    rotulos, lat_e, lon_e = _estacoes(rng, 200)
+    # Estações vizinhas para criar disputas dentro da tolerância
+    lat_e[1::4], lon_e[1::4] = lat_e[::4][:len(lat_e[1::4])] + 0.02, lon_e[::4][:len(lon_e[1::4])] - 0.01
+    lat = np.concatenate([lat_e + rng.uniform(-0.03, 0.03, len(lat_e)), rng.uniform(-30, 5, 50)])
+    lon = np.concatenate([lon_e + rng.uniform(-0.03, 0.03, len(lon_e)), rng.uniform(-70, -35, 50)])
+
+    for tolerancia in (0.0, 0.01, 0.02, 0.03):
+        indice = IndiceEstacoes(rotulos, lat_e, lon_e, tolerancia=tolerancia)
+        posicoes = indice.localizar(lat, lon)
+        obtido = [indice.rotulos[p] if p >= 0 else None for p in posicoes]
+        assert obtido == _forca_bruta(rotulos, lat_e, lon_e, lat, lon, round(tolerancia * 100))
+
+
+def test_coordenada_repetida_fica_com_a_primeira_estacao():
+    indice = IndiceEstacoes(['A', 'B'], [-10.0, -10.0], [-50.0, -50.0])
+    assert indice.rotular(np.array([-10.001]), np.array([-49.999])).tolist() == ['A']
+
+
+def test_pontos_sem_estacao_ganham_rotulo_estavel():
+    indice = IndiceEstacoes(['A'], [-10.0], [-50.0])
+    lat, lon = np.array([-10.0, -11.234, -11.2341]), np.array([-50.0, -51.5, -51.5])
+    assert indice.rotular(lat, lon).tolist() == ['A', '-11.23,-51.5', '-11.23,-51.5']
+    # Outra grade com o mesmo ponto sem estação reaproveita o código
+    codigos = indice.codificar(np.array([-11.23, -12.0]), np.array([-51.5, -52.0]))
+    assert codigos[0] == indice.codificar(lat, lon)[1]
+    assert indice.categorias[codigos].tolist() == ['-11.23,-51.5', '-12.0,-52.0']
@@ -0,0 +1,49 @@
+"""Manifesto da pasta Output: pares inalterados são pulados, mudanças nas entradas ou saídas ausentes não."""
+import os
+
+from manifesto import Manifesto, impressao_digital
+
+
+def test_impressao_digital_muda_com_tamanho_mtime_e_arquivos(tmp_path):
+    pasta = tmp_path / 'ONS'
+    pasta.mkdir()
+    arquivo = pasta / 'a.dat'
+    arquivo.write_text('1 2 3\n')
+    inicial = impressao_digital(pasta)
+    assert impressao_digital(pasta) == inicial
+
+    os.utime(arquivo, ns=(0, 10**18))
+    tocada = impressao_digital(pasta)
+    assert tocada != inicial
+    (pasta / 'b.dat').write_text('4 5 6\n')
+    assert impressao_digital(pasta) != tocada
+    assert impressao_digital(arquivo) != impressao_digital(pasta)
+
+
+def test_atualizado_depende_das_entradas_e_das_saidas(tmp_path):
+    saida = tmp_path / 'Output'
+    entradas = {'ons': 'x', 'tok': 'y', 'formato': 'csv'}
+    manifesto = Manifesto(saida)
+    assert not manifesto.atualizado('p', entradas)
+
+    saida.mkdir()
+    (saida / 'comparacao_p.csv').write_text('')
+    manifesto.registrar('p', entradas, ['comparacao_p.csv'])
+
+    # Relido do disco em outra execução
+    manifesto = Manifesto(saida)
+    assert manifesto.atualizado('p', dict(entradas))
+    assert not manifesto.atualizado('p', {**entradas, 'tok': 'z'})
+    assert not manifesto.atualizado('p', {**entradas, 'limiares': [1.0]})
+    assert not manifesto.atualizado('outro', entradas)
+
+    (saida / 'comparacao_p.csv').unlink()
+    assert not manifesto.atualizado('p', entradas)
+
+
+def test_manifesto_corrompido_e_tratado_como_vazio(tmp_path):
+    (tmp_path / 'manifesto.json').write_text('{nao e json')
+    manifesto = Manifesto(tmp_path)
+    assert manifesto.pares == {}
+    manifesto.registrar('p', {'a': 1}, [])
+    assert Manifesto(tmp_path).atualizado('p', {'a': 1})
@@ -0,0 +1,37 @@
+"""Forma compacta: ida e volta das datas, inclusive além do limite de int16."""
+import numpy as np
+import pandas as pd
+
+from tipos_compactos import alinhar, compactar, expandir
+
+
+def _serie(datas):
+    return pd.DataFrame({'ponto': 'A', 'data': datas, 'precipitacao_mm': np.arange(len(datas), dtype=float)})
+
+
+def test_diario_usa_int16_e_volta_as_mesmas_datas():
+    original = _serie(pd.date_range('2026-01-01', periods=45, freq='D'))
+    compacto = compactar(original)
+    assert compacto['dia'].dtype == np.int16
+    pd.testing.assert_series_equal(expandir(compacto)['data'], original['data'], check_names=False)
+
+
+def test_serie_horaria_longa_nao_estoura():
+    # 5 anos de dados horários: ~43800 passos, além de 32767
+    original = _serie(pd.date_range('2021-01-01', periods=5 * 8760, freq='h'))
+    compacto = compactar(original)
+    assert compacto['dia'].dtype == np.int32
+    assert compacto['dia'].iloc[-1] == len(original) - 1
+    pd.testing.assert_series_equal(expandir(compacto)['data'], original['data'], check_names=False)
+
+
+def test_alinhar_diario_com_horario_converte_sem_estouro():
+    diario = compactar(_serie(pd.date_range('2022-01-01', periods=1500, freq='D')))
+    horario = compactar(_serie(pd.date_range('2022-01-01', periods=3, freq='h')))
+    assert diario['dia'].dtype == np.int16
+    alinhado_diario, alinhado_horario = alinhar(diario, horario)
+    assert alinhado_diario.attrs['passo'] == pd.Timedelta(hours=1)
+    assert alinhado_diario['dia'].dtype == np.int32
+    assert alinhado_diario['dia'].iloc[-1] == 1499 * 24
+    assert alinhado_horario['dia'].dtype == np.int16
+    pd.testing.assert_series_equal(expandir(alinhado_diario)['data'], expandir(diario)['data'])
@@ -0,0 +1,62 @@
+"""Verificação categórica: contagens por limiar contra a contagem direta com broadcast."""
+import numpy as np
+import pytest
+
+from verificacao_categorica import CONTAGENS, contingencia, indices, tabela_categorica
+
+
+def _contingencia_direta(observado, previsto, limiares, eixos):
+    """Valores × limiares materializado, como a forma óbvia de contar."""
+    valido = (~np.isnan(observado) & ~np.isnan(previsto))[..., None]
+    limiares = np.sort(np.asarray(limiares, dtype=np.float64))
+    evento_obs = observado[..., None] >= limiares
+    evento_prev = previsto[..., None] >= limiares
+    return {
+        'acertos': (valido & evento_obs & evento_prev).sum(axis=eixos),
+        'perdas': (valido & evento_obs & ~evento_prev).sum(axis=eixos),
+        'falsos_alarmes': (valido & ~evento_obs & evento_prev).sum(axis=eixos),
+        'negativos_corretos': (valido & ~evento_obs & ~evento_prev).sum(axis=eixos),
+    }
+
+
+@pytest.mark.parametrize('eixos', [None, 1, (0, 2), 2])
+def test_contagens_batem_com_a_contagem_direta(eixos):
+    rng = np.random.default_rng(0)
+    forma = (6, 5, 40)
+    limiares = [25.0, 1.0, 5.0, 10.0, 0.0]
+    # Valores inteiros para cair exatamente nos limiares, e NaN nas duas fontes
+    observado = rng.integers(0, 30, forma).astype(np.float64)
+    previsto = rng.integers(0, 30, forma).astype(np.float64)
+    observado[rng.random(forma) < 0.15] = np.nan
+    previsto[rng.random(forma) < 0.15] = np.nan
+
+    obtido = contingencia(observado, previsto, limiares, eixos)
+    eixos_diretos = tuple(range(3)) if eixos is None else tuple(np.atleast_1d(eixos))
+    esperado = _contingencia_direta(observado, previsto, limiares, eixos_diretos)
+    for nome in CONTAGENS:
+        np.testing.assert_array_equal(obtido[nome], esperado[nome], err_msg=nome)
+
+
+def test_valor_igual_ao_limiar_e_evento_e_nan_fica_de_fora():
+    observado = np.array([1.0, 0.999, 5.0, np.nan, 10.0])
+    previsto = np.array([1.0, 1.0, 4.999, 10.0, np.nan])
+    contagens = contingencia(observado, previsto, [1.0, 5.0])
+    assert {nome: v.tolist() for nome, v in contagens.items()} == {
+        'acertos': [2, 0],
+        'perdas': [0, 1],
+        'falsos_alarmes': [1, 0],
+        'negativos_corretos': [0, 2],
+    }
+
+
+def test_indices_e_tabela_longa():
+    observado = np.array([[10.0, 0.0, 10.0, 0.0], [np.nan, np.nan, np.nan, np.nan]])
+    previsto = np.array([[10.0, 10.0, 0.0, 0.0], [1.0, 1.0, 1.0, 1.0]])
+    tabela = tabela_categorica(observado, previsto, [5.0], eixos=1, grupos={'ponto': ['A', 'B']})
+    a = tabela.loc[('A', 5.0)]
+    assert (a['acertos'], a['perdas'], a['falsos_alarmes'], a['negativos_corretos']) == (1, 1, 1, 1)
+    assert a['POD'] == 0.5 and a['FAR'] == 0.5 and a['CSI'] == pytest.approx(1 / 3)
+    assert a['ETS'] == 0 and a['vies_frequencia'] == 1
+    # Sem posições válidas: contagens zero e índices NaN, não divisão por zero
+    assert tabela.loc[('B', 5.0), list(CONTAGENS)].sum() == 0
+    assert np.isnan(indices({n: np.zeros(1) for n in CONTAGENS})['POD']).all()
@@ -0,0 +1,104 @@
+"""Representação compacta do formato longo (ponto, data, precipitação).
+
+- ``ponto``: categórico (códigos inteiros sobre o registro de estações)
+- ``dia``: int16, passos (dias, ou horas para dados sub-diários) desde a data
+  base guardada em ``df.attrs['data_base']``, com o passo em ``df.attrs['passo']``;
+  int32 quando os passos não cabem em int16 (séries horárias ou longas)
+- ``precipitacao_mm``: float32
+
+Os rótulos e as datas legíveis só são reconstruídos na hora de gravar a saída.
+"""
+import numpy as np
+import pandas as pd
+
+
+COLUNAS_COMPACTAS = ['ponto', 'dia', 'precipitacao_mm']
+PASSO_DIARIO = pd.Timedelta(days=1)
+PASSO_HORARIO = pd.Timedelta(hours=1)
+
+
+def eh_compacto(df: pd.DataFrame) -> bool:
+    return 'dia' in df.columns and 'data_base' in df.attrs
+
+
+def tipo_dia(dias: np.ndarray) -> np.dtype:
+    """int16 se todos os passos cabem nele, senão int32 (sem estouro silencioso)."""
+    if len(dias) == 0:
+        return np.dtype(np.int16)
+    limites = np.iinfo(np.int16)
+    if dias.min() >= limites.min and dias.max() <= limites.max:
+        return np.dtype(np.int16)
+    limites = np.iinfo(np.int32)
+    if dias.min() < limites.min or dias.max() > limites.max:
+        raise OverflowError(f"Passos fora do intervalo de int32: {dias.min()}..{dias.max()}")
+    return np.dtype(np.int32)
+
+
+def montar_compacto(codigos: np.ndarray, categorias, dias: np.ndarray, precipitacao: np.ndarray,
+                    data_base: pd.Timestamp, passo: pd.Timedelta = PASSO_DIARIO) -> pd.DataFrame:
+    dias = np.asarray(dias, dtype=np.int64)
+    df = pd.DataFrame({
+        'ponto': pd.Categorical.from_codes(codigos, categories=categorias),
+        'dia': dias.astype(tipo_dia(dias)),
+        'precipitacao_mm': np.asarray(precipitacao, dtype=np.float32),
+    })
+    df.attrs['data_base'] = pd.Timestamp(data_base)
+    df.attrs['passo'] = pd.Timedelta(passo)
+    return df
+
+
+def compactar(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte um DataFrame padronizado (ponto, data, precipitacao_mm) para a forma compacta."""
+    if eh_compacto(df):
+        return df
+    datas = pd.to_datetime(df['data'])
+    data_base = datas.min().normalize() if len(datas) else pd.Timestamp(0)
+    desde_base = datas - data_base
+    passo = PASSO_DIARIO if (desde_base % PASSO_DIARIO == pd.Timedelta(0)).all() else PASSO_HORARIO
+    ponto = df['ponto'].astype('category')
+    return montar_compacto(ponto.cat.codes.to_numpy(), ponto.cat.categories,
+                           (desde_base // passo).to_numpy(), df['precipitacao_mm'].to_numpy(),
+                           data_base, passo)
+
+
+def alinhar(*frames: pd.DataFrame) -> list[pd.DataFrame]:
+    """Coloca frames compactos na mesma base, passo e categorias (em ordem lexicográfica).
+
+    Depois disso os códigos de ``ponto`` e os valores de ``dia`` são diretamente
+    comparáveis entre os frames.
+    """
+    passo = min(df.attrs['passo'] for df in frames)
+    data_base = min(df.attrs['data_base'] for df in frames)
+    usadas = [df['ponto'].cat.remove_unused_categories().cat.categories.to_numpy(dtype=object) for df in frames]
+    categorias = np.sort(pd.unique(np.concatenate(usadas))) if usadas else np.array([], dtype=object)
+
+    alinhados = []
+    for df in frames:
+        deslocamento = (df.attrs['data_base'] - data_base) // passo
+        fator = df.attrs['passo'] // passo
+        dias = df['dia'].to_numpy(dtype=np.int64) * fator + deslocamento
+        novo = pd.DataFrame({
+            'ponto': df['ponto'].cat.set_categories(categorias),
+            'dia': dias.astype(tipo_dia(dias)),
+            'precipitacao_mm': df['precipitacao_mm'].astype(np.float32),
+        })
+        novo.attrs['data_base'] = data_base
+        novo.attrs['passo'] = passo
+        alinhados.append(novo)
+    return alinhados
+
+
+def datas(dias, data_base: pd.Timestamp, passo: pd.Timedelta = PASSO_DIARIO) -> pd.DatetimeIndex:
+    """Converte passos ``dia`` de volta para datas."""
+    return pd.DatetimeIndex(data_base + np.asarray(dias, dtype=np.int64) * passo, name='data')
+
+
+def expandir(df: pd.DataFrame) -> pd.DataFrame:
+    """Volta à forma legível (ponto texto, data datetime, precipitação float64)."""
+    if not eh_compacto(df):
+        return df
+    return pd.DataFrame({
+        'ponto': df['ponto'].astype(object),
+        'data': datas(df['dia'], df.attrs['data_base'], df.attrs['passo']),
+        'precipitacao_mm': df['precipitacao_mm'].astype(np.float64),
+    })
@@ -0,0 +1,105 @@
+"""Verificação categórica TOK × ONS para vários limiares de chuva de uma vez.
+
+Para cada limiar, um evento é precipitação ``>= limiar``. ONS é a
+referência (observado) e TOK a previsão, como no sentido ``TOK - ONS`` das
+diferenças. A tabela de contingência tem acertos (os dois com evento),
+perdas (só ONS), falsos alarmes (só TOK) e negativos corretos; dela saem
+POD, FAR, CSI, ETS e o viés de frequência.
+
+Todos os limiares são contados em uma única passada: cada valor vira o número
+de limiares que ele atinge (``searchsorted``), a contagem é feita por
+``bincount`` e a soma acumulada de trás para frente dá o total por limiar.
+Nada tem forma ``valores × limiares``, então cubos membro × estação × lead
+com dezenas de membros cabem na memória.
+"""
+import numpy as np
+import pandas as pd
+
+
+LIMIARES_PADRAO = (1.0, 5.0, 10.0, 25.0, 50.0)
+CONTAGENS = ('acertos', 'perdas', 'falsos_alarmes', 'negativos_corretos')
+INDICES = ('POD', 'FAR', 'CSI', 'ETS', 'vies_frequencia')
+
+
+def contingencia(observado: np.ndarray, previsto: np.ndarray, limiares=LIMIARES_PADRAO,
+                 eixos=None) -> dict[str, np.ndarray]:
+    """Contagens da tabela de contingência por limiar.
+
+    ``eixos`` são os eixos reduzidos (padrão: todos); os demais ficam como
+    grupos, e cada contagem tem forma ``(grupos..., len(limiares))``. Só entram
+    posições em que as duas fontes têm valor (não NaN).
+    """
+    observado = np.asarray(observado, dtype=np.float64)
+    previsto = np.asarray(previsto, dtype=np.float64)
+    limiares = np.sort(np.asarray(limiares, dtype=np.float64))
+    if eixos is None:
+        eixos = tuple(range(observado.ndim))
+    eixos = tuple(np.atleast_1d(eixos) % max(observado.ndim, 1))
+    mantidos = tuple(e for e in range(observado.ndim) if e not in eixos)
+    forma_grupos = tuple(observado.shape[e] for e in mantidos)
+    n_grupos = int(np.prod(forma_grupos, dtype=np.int64))
+    n_limiares = len(limiares)
+
+    # Grupos nas linhas, posições reduzidas nas colunas
+    observado = np.transpose(observado, mantidos + eixos).reshape(n_grupos, -1)
+    previsto = np.transpose(previsto, mantidos + eixos).reshape(n_grupos, -1)
+    valido = ~np.isnan(observado) & ~np.isnan(previsto)
+    grupo = np.broadcast_to(np.arange(n_grupos)[:, None], observado.shape)[valido]
+
+    # Quantos limiares cada valor atinge (>=): 0..n_limiares
+    nivel_obs = np.searchsorted(limiares, observado[valido], side='right')
+    nivel_prev = np.searchsorted(limiares, previsto[valido], side='right')
+
+    def acima(niveis):
+        """Por grupo e limiar k, quantos valores atingem o limiar k (nível > k)."""
+        contagem = np.bincount(grupo * (n_limiares + 1) + niveis, minlength=n_grupos * (n_limiares + 1))
+        contagem = contagem.reshape(n_grupos, n_limiares + 1)
+        return np.cumsum(contagem[:, ::-1], axis=1)[:, ::-1][:, 1:]
+
+    eventos_obs = acima(nivel_obs)
+    eventos_prev = acima(nivel_prev)
+    acertos = acima(np.minimum(nivel_obs, nivel_prev))
+    total = np.bincount(grupo, minlength=n_grupos)[:, None]
+    contagens = {
+        'acertos': acertos,
+        'perdas': eventos_obs - acertos,
+        'falsos_alarmes': eventos_prev - acertos,
+        'negativos_corretos': total - eventos_obs - eventos_prev + acertos,
+    }
+    return {nome: valores.reshape(forma_grupos + (n_limiares,)) for nome, valores in contagens.items()}
+
+
+def indices(contagens: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """POD, FAR, CSI, ETS e viés de frequência (NaN quando o denominador é zero)."""
+    a = contagens['acertos'].astype(np.float64)
+    b = contagens['falsos_alarmes'].astype(np.float64)
+    c = contagens['perdas'].astype(np.float64)
+    d = contagens['negativos_corretos'].astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        aleatorios = (a + b) * (a + c) / (a + b + c + d)
+        resultado = {
+            'POD': a / (a + c),
+            'FAR': b / (a + b),
+            'CSI': a / (a + b + c),
+            'ETS': (a - aleatorios) / (a + b + c - aleatorios),
+            'vies_frequencia': (a + b) / (a + c),
+        }
+    return {nome: np.where(np.isfinite(valores), valores, np.nan) for nome, valores in resultado.items()}
+
+
+def tabela_categorica(observado: np.ndarray, previsto: np.ndarray, limiares=LIMIARES_PADRAO, eixos=None,
+                      grupos: dict | None = None) -> pd.DataFrame:
+    """Contagens e índices em formato longo: uma linha por grupo e limiar.
+
+    ``grupos`` dá nome e rótulos de cada eixo mantido, na ordem dos eixos
+    (por exemplo ``{'ponto': pontos}``); sem ele, os grupos são numerados.
+    """
+    limiares = np.sort(np.asarray(limiares, dtype=np.float64))
+    contagens = contingencia(observado, previsto, limiares, eixos)
+    forma = contagens['acertos'].shape[:-1]
+    if grupos is None:
+        grupos = {f"grupo_{i}": np.arange(n) for i, n in enumerate(forma)}
+    indice = pd.MultiIndex.from_product([np.asarray(v) for v in grupos.values()] + [limiares],
+                                        names=list(grupos) + ['limiar_mm'])
+    colunas = {**contagens, **indices(contagens)}
+    return pd.DataFrame({nome: valores.ravel() for nome, valores in colunas.items()}, index=indice)